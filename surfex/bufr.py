@@ -3,6 +3,7 @@ from math import exp
 import sys
 import surfex
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 try:
     import eccodes
 except ImportError:
@@ -18,226 +19,28 @@ except:
 
 
 class BufrObservationSet(surfex.obs.ObservationSet):
-    def __init__(self, bufrfile, variables, valid_dtg, valid_range, lonrange=None, latrange=None, label=""):
-
-        if lonrange is None:
-            lonrange = [-180, 180]
-        if latrange is None:
-            latrange = [-90, 90]
-
-        if eccodes is None:
-            raise Exception("ECCODES not found. Needed for bufr reading")
-
-        # open bufr file
-        f = open(bufrfile)
-
-        # define the keys to be printed
-        keys = [
-            # 'blockNumber',
-            # 'stationNumber',
-            'latitude',
-            'longitude',
-            'year',
-            'month',
-            'day',
-            'hour',
-            'minute',
-            'heightOfStationGroundAboveMeanSeaLevel',
-            'heightOfStation',
-            'stationNumber',
-            'blockNumber'
-        ]
-        nerror = {}
-        ntime = {}
-        nundef = {}
-        ndomain = {}
-        nobs = {}
-        for var in variables:
-            if var == "relativeHumidityAt2M":
-                keys.append("airTemperatureAt2M")
-                keys.append("dewpointTemperatureAt2M")
-            else:
-                keys.append(var)
-            nerror.update({var: 0})
-            ntime.update({var: 0})
-            nundef.update({var: 0})
-            ndomain.update({var: 0})
-            nobs.update({var: 0})
-
-        # The cloud information is stored in several blocks in the
-        # SYNOP message and the same key means a different thing in different
-        # parts of the message. In this example we will read the first
-        # cloud block introduced by the key
-        # verticalSignificanceSurfaceObservations=1.
-        # We know that this is the first occurrence of the keys we want to
-        # read so in the list above we used the # (occurrence) operator
-        # accordingly.
-
-        print("Reading " + bufrfile)
-        print("Looking for keys: " + str(keys))
-        cnt = 0
-        observations = list()
-
-        # loop for the messages in the file
-        # nerror = 0
-        # ndomain = 0
-        # nundef = 0
-        # ntime = 0
-        not_decoded = 0
-        # removed = 0
-        while 1:
-            # get handle for message
-            bufr = eccodes.codes_bufr_new_from_file(f)
-            if bufr is None:
-                break
-
-            # print("message: %s" % cnt)
-
-            # we need to instruct ecCodes to expand all the descriptors
-            # i.e. unpack the data values
-            try:
-                eccodes.codes_set(bufr, 'unpack', 1)
-                decoded = True
-            except eccodes.CodesInternalError as err:
-                not_decoded = not_decoded + 1
-                print('Error with key="unpack" : %s' % err.msg)
-                decoded = False
-
-            # print the values for the selected keys from the message
-            if decoded:
-                lat = np.nan
-                lon = np.nan
-                value = np.nan
-                elev = np.nan
-                year = -1
-                month = -1
-                day = -1
-                hour = -1
-                minute = -1
-                stid = "NA"
-                station_number = -1
-                block_number = -1
-                t2m = np.nan
-                td2m = np.nan
-                # rh2m = np.nan
-                sd = np.nan
-                # all_found = True
-                for key in keys:
-                    try:
-                        val = eccodes.codes_get(bufr, key)
-                        # if val != CODES_MISSING_DOUBLE:
-                        #    print('  %s: %s' % (key,val))
-                        if val == eccodes.CODES_MISSING_DOUBLE or val == eccodes.CODES_MISSING_LONG:
-                            val = np.nan
-                        if key == "latitude":
-                            lat = val
-                        if key == "longitude":
-                            lon = val
-                        if key == "year":
-                            year = val
-                        if key == "month":
-                            month = val
-                        if key == "day":
-                            day = val
-                        if key == "hour":
-                            hour = val
-                        if key == "minute":
-                            minute = val
-                        if key == "heightOfStation":
-                            elev = val
-                        if key == "heightOfStationGroundAboveMeanSeaLevel":
-                            elev = val
-                        if key == "stationNumber":
-                            station_number = val
-                        if key == "blockNumber":
-                            block_number = val
-                        if key == "airTemperatureAt2M":
-                            t2m = val
-                        if key == "dewpointTemperatureAt2M":
-                            td2m = val
-                        if key == "totalSnowDepth":
-                            sd = val
-
-                    except eccodes.CodesInternalError:
-                        pass
-                        # all_found = False
-                        # print('Report does not contain key="%s" : %s' % (key, err.msg))
-
-                # Assign value to var
-                for var in variables:
-                    if var == "relativeHumidityAt2M":
-                        if not np.isnan(t2m) and not np.isnan(td2m):
-                            value = self.td2rh(td2m, t2m)
-                        value = value * 0.01
-                    elif var == "airTemperatureAt2M":
-                        value = t2m
-                    elif var == "totalSnowDepth":
-                        value = sd
-                    else:
-                        raise NotImplementedError("Var " + var + " is not coded! Please do it!")
-
-                    all_found = True
-                    if np.isnan(lat):
-                        all_found = False
-                    if np.isnan(lon):
-                        all_found = False
-                    if year == -1:
-                        all_found = False
-                    if month == -1:
-                        all_found = False
-                    if day == -1:
-                        all_found = False
-                    if hour == -1:
-                        all_found = False
-                    if minute == -1:
-                        all_found = False
-                    if np.isnan(elev):
-                        all_found = False
-                    if np.isnan(value):
-                        all_found = False
-
-                    if not all_found:
-                        nerror.update({var: nerror[var] + 1})
-
-                    # print(lon, lonrange[0], lonrange[1], lat, latrange[0],latrange[1])
-                    if latrange[0] <= lat <= latrange[1] and lonrange[0] <= lon <= lonrange[1]:
-                        obs_dtg = datetime(year=year, month=month, day=day, hour=hour, minute=minute)
-                        # print(value)
-                        if not np.isnan(value):
-                            if self.inside_window(obs_dtg, valid_dtg, valid_range):
-                                # print(valid_dtg, lon, lat, value, elev, stid)
-                                if station_number > 0 and block_number > 0:
-                                    stid = str((block_number * 1000) + station_number)
-                                observations.append(surfex.obs.Observation(obs_dtg, lon, lat, value,
-                                                                           elev=elev, stid=stid, varname=var))
-                                nobs.update({var: nobs[var] + 1})
-                            else:
-                                ntime.update({var: ntime[var] + 1})
-                        else:
-                            nundef.update({var: nundef[var] + 1})
-                    else:
-                        ndomain.update({var: ndomain[var] + 1})
-
-                cnt += 1
-
-                if (cnt % 1000) == 0:
-                    print('.', end='')
-                    sys.stdout.flush()
-
-            # delete handle
-            eccodes.codes_release(bufr)
-
-        print("\nFound " + str(len(observations)) + "/" + str(cnt))
-        print("Not decoded: " + str(not_decoded))
-        for var in variables:
-            print("\nObservations for var=" + var + ": " + str(nobs[var]))
-            print("Observations removed because of domain check: " + str(ndomain[var]))
-            print("Observations removed because of not being defined/found: " + str(nundef[var]))
-            print("Observations removed because of time window: " + str(ntime[var]))
-            print("Messages not containing information on all keys: " + str(nerror[var]))
-        # close the file
-        f.close()
+    def __init__(self, bufrfile, variables, valid_dtg, valid_range, lonrange=None, latrange=None, label="",
+                 max_workers=None, decoded=None, cache_dir=None):
+        """
+        Arguments:
+            bufrfile (str, list): Bufr file or list of bufr files
+            variables (list): Bufr variable names
+            valid_dtg (datetime): Centre of the time window. All times are accepted if None
+            valid_range (timedelta): Half width of the time window
+            lonrange (list): Longitude range
+            latrange (list): Latitude range
+            label (str): Label of the set
+            max_workers (int): Decode the files in a process pool with this number of processes.
+                               The files are decoded serially if None
+            decoded (surfex.ObservationColumns): Observations already decoded by read_bufr for the same files,
+                                                 time window and domain. Used instead of decoding the files again
+            cache_dir (str): Directory with observation sidecars. The files are decoded every time if None
+        """
 
+        if decoded is None:
+            decoded = read_bufr(bufrfile, variables, valid_dtg, valid_range, lonrange=lonrange, latrange=latrange,
+                                max_workers=max_workers, cache_dir=cache_dir)
+        observations = decoded[np.isin(decoded.varnames, variables)]
         surfex.obs.ObservationSet.__init__(self, observations, label=label)
 
     @staticmethod
@@ -262,3 +65,284 @@ class BufrObservationSet(surfex.obs.ObservationSet):
                 return True
             else:
                 return False
+
+
+def get_bufr_value(bufr, key):
+    """
+    Arguments:
+        bufr (int): Handle to an unpacked bufr message
+        key (str): Key
+
+    Returns:
+        The value. np.nan if missing or not found
+
+    """
+    try:
+        val = eccodes.codes_get(bufr, key)
+    except eccodes.CodesInternalError:
+        return np.nan
+    if val == eccodes.CODES_MISSING_DOUBLE or val == eccodes.CODES_MISSING_LONG:
+        val = np.nan
+    return val
+
+
+# Bufr keys needed for each variable
+bufr_keys = {
+    "airTemperatureAt2M": ["airTemperatureAt2M"],
+    "relativeHumidityAt2M": ["airTemperatureAt2M", "dewpointTemperatureAt2M"],
+    "totalSnowDepth": ["totalSnowDepth"]
+}
+
+
+def decode_bufr_file(bufrfile, keys, lonrange=None, latrange=None):
+    """
+    Decode position, time, elevation, station and the given keys of each message in a bufr file
+
+    With a domain, messages where the local section gives a position outside the domain are skipped before they
+    are unpacked. Unpacked messages outside the domain are skipped before the keys are read.
+
+    Arguments:
+        bufrfile (str): Bufr file
+        keys (list): Bufr keys to read for each message
+        lonrange (list): Longitude range. All messages are kept if None
+        latrange (list): Latitude range. All messages are kept if None
+
+    Returns:
+        dict: Arrays for each message and the number of messages, of messages not decoded and of
+              messages skipped because of the domain
+
+    """
+    if eccodes is None:
+        raise Exception("ECCODES not found. Needed for bufr reading")
+
+    check_domain = lonrange is not None and latrange is not None
+    messages = {"times": [], "lons": [], "lats": [], "elevs": [], "stids": []}
+    for key in keys:
+        messages.update({key: []})
+    cnt = 0
+    not_decoded = 0
+    ndomain = 0
+
+    print("Reading " + bufrfile)
+    with open(bufrfile, "rb") as f:
+        while 1:
+            # get handle for message
+            bufr = eccodes.codes_bufr_new_from_file(f)
+            if bufr is None:
+                break
+
+            try:
+                # The local section holds the position of single station messages. Skip before unpacking.
+                if check_domain and eccodes.codes_is_defined(bufr, "localLatitude") and \
+                        eccodes.codes_is_defined(bufr, "localLongitude"):
+                    lat = get_bufr_value(bufr, "localLatitude")
+                    lon = get_bufr_value(bufr, "localLongitude")
+                    if not (latrange[0] <= lat <= latrange[1] and lonrange[0] <= lon <= lonrange[1]):
+                        ndomain += 1
+                        cnt += 1
+                        continue
+
+                # we need to instruct ecCodes to expand all the descriptors
+                # i.e. unpack the data values
+                try:
+                    eccodes.codes_set(bufr, 'unpack', 1)
+                except eccodes.CodesInternalError as err:
+                    not_decoded = not_decoded + 1
+                    print('Error with key="unpack" : %s' % err.msg)
+                    continue
+
+                cnt += 1
+                if (cnt % 1000) == 0:
+                    print('.', end='')
+                    sys.stdout.flush()
+
+                lat = get_bufr_value(bufr, "latitude")
+                lon = get_bufr_value(bufr, "longitude")
+                if check_domain and not (latrange[0] <= lat <= latrange[1] and lonrange[0] <= lon <= lonrange[1]):
+                    ndomain += 1
+                    continue
+
+                year = get_bufr_value(bufr, "year")
+                month = get_bufr_value(bufr, "month")
+                day = get_bufr_value(bufr, "day")
+                hour = get_bufr_value(bufr, "hour")
+                minute = get_bufr_value(bufr, "minute")
+                obs_dtg = None
+                if not np.isnan([year, month, day, hour, minute]).any():
+                    obs_dtg = datetime(year=year, month=month, day=day, hour=hour, minute=minute)
+                elev = get_bufr_value(bufr, "heightOfStationGroundAboveMeanSeaLevel")
+                if eccodes.codes_is_defined(bufr, "heightOfStation"):
+                    elev = get_bufr_value(bufr, "heightOfStation")
+                stid = "NA"
+                station_number = get_bufr_value(bufr, "stationNumber")
+                block_number = get_bufr_value(bufr, "blockNumber")
+                if station_number > 0 and block_number > 0:
+                    stid = str((block_number * 1000) + station_number)
+
+                messages["times"].append(obs_dtg)
+                messages["lons"].append(lon)
+                messages["lats"].append(lat)
+                messages["elevs"].append(elev)
+                messages["stids"].append(stid)
+                for key in keys:
+                    messages[key].append(get_bufr_value(bufr, key))
+            finally:
+                # delete handle
+                eccodes.codes_release(bufr)
+
+    messages["times"] = np.array([np.datetime64("NaT") if obs_dtg is None else obs_dtg
+                                  for obs_dtg in messages["times"]], dtype="datetime64[s]")
+    messages["stids"] = np.array(messages["stids"], dtype=object)
+    for key in ["lons", "lats", "elevs"] + keys:
+        messages[key] = np.array(messages[key], dtype=float)
+    messages.update({"messages": np.array(cnt), "not_decoded": np.array(not_decoded), "ndomain": np.array(ndomain)})
+    return messages
+
+
+def read_bufr_file(bufrfile, variables, valid_dtg, valid_range, lonrange, latrange, cache_dir=None):
+    """
+    Decode the observations of all variables from a bufr file in one pass
+
+    Without a cache, messages outside the domain are skipped while decoding, see decode_bufr_file. With a
+    cache, all messages are decoded once for all variables and stored as a sidecar. The domain and time window
+    are then applied to the decoded messages.
+
+    A message in the domain is counted as not defined if the variable is missing, else as outside the time
+    window if it is, else as an observation. Messages in the domain missing the time, the elevation or the
+    variable are counted as errors.
+
+    Arguments:
+        bufrfile (str): Bufr file
+        variables (list): Bufr variable names
+        valid_dtg (datetime): Centre of the time window. All times are accepted if None
+        valid_range (timedelta): Half width of the time window
+        lonrange (list): Longitude range
+        latrange (list): Latitude range
+        cache_dir (str): Directory with observation sidecars. Not used if None
+
+    Returns:
+        surfex.ObservationColumns: Observations in message order
+        dict: Counters for each variable
+        int: Number of decoded messages
+        int: Number of messages not decoded
+
+    """
+    for var in variables:
+        if var not in bufr_keys:
+            raise NotImplementedError("Var " + var + " is not coded! Please do it!")
+
+    if cache_dir is None:
+        keys = []
+        for var in variables:
+            keys = keys + [key for key in bufr_keys[var] if key not in keys]
+        messages = decode_bufr_file(bufrfile, keys, lonrange=lonrange, latrange=latrange)
+    else:
+        cache = surfex.obs.ObservationCache(cache_dir)
+        messages = cache.load(bufrfile, "bufr")
+        if messages is None:
+            keys = []
+            for var in bufr_keys:
+                keys = keys + [key for key in bufr_keys[var] if key not in keys]
+            messages = decode_bufr_file(bufrfile, keys)
+            cache.save(bufrfile, "bufr", messages)
+
+    lons = messages["lons"]
+    lats = messages["lats"]
+    times = messages["times"]
+    inside = (latrange[0] <= lats) & (lats <= latrange[1]) & (lonrange[0] <= lons) & (lons <= lonrange[1])
+    valid = ~np.isnat(times)
+    if valid_dtg is not None:
+        valid = valid & (times >= np.datetime64(valid_dtg - valid_range)) & \
+            (times <= np.datetime64(valid_dtg + valid_range))
+    ndomain = int(messages["ndomain"]) + int(np.sum(~inside))
+    index = np.where(inside)[0]
+    valid = valid[index]
+
+    counters = {}
+    observations = []
+    order = []
+    for v in range(0, len(variables)):
+        var = variables[v]
+        if var == "relativeHumidityAt2M":
+            t2m = messages["airTemperatureAt2M"][index]
+            td2m = messages["dewpointTemperatureAt2M"][index]
+            values = np.full(len(index), np.nan)
+            for i in np.where(~np.isnan(t2m) & ~np.isnan(td2m))[0]:
+                values[i] = BufrObservationSet.td2rh(td2m[i], t2m[i]) * 0.01
+        else:
+            values = messages[var][index]
+
+        defined = ~np.isnan(values)
+        counters.update({var: {
+            "nobs": int(np.sum(defined & valid)),
+            "ndomain": ndomain,
+            "nundef": int(np.sum(~defined)),
+            "ntime": int(np.sum(defined & ~valid)),
+            "nerror": int(np.sum(np.isnat(times[index]) | np.isnan(messages["elevs"][index]) | ~defined))
+        }})
+        keep = defined & valid
+        ind = index[keep]
+        observations.append(surfex.obs.ObservationColumns(times[ind], lons[ind], lats[ind], values[keep],
+                                                          elevs=messages["elevs"][ind], stids=messages["stids"][ind],
+                                                          varnames=np.full(len(ind), var, dtype=object)))
+        order.append(np.column_stack((ind, np.full(len(ind), v))))
+
+    # Observations in message order and then in the order of the variables
+    observations = surfex.obs.ObservationColumns.concatenate(observations)
+    order = np.concatenate([np.empty([0, 2], dtype=int)] + order)
+    observations = observations[np.lexsort((order[:, 1], order[:, 0]))]
+    return observations, counters, int(messages["messages"]), int(messages["not_decoded"])
+
+
+def read_bufr(bufrfiles, variables, valid_dtg, valid_range, lonrange=None, latrange=None, max_workers=None,
+              cache_dir=None):
+    """
+    Decode the observations of all variables from bufr files with one pass over each file
+
+    Arguments:
+        bufrfiles (str, list): Bufr file or list of bufr files
+        variables (list): Bufr variable names
+        valid_dtg (datetime): Centre of the time window. All times are accepted if None
+        valid_range (timedelta): Half width of the time window
+        lonrange (list): Longitude range
+        latrange (list): Latitude range
+        max_workers (int): Decode the files in a process pool with this number of processes.
+                           The files are decoded serially if None
+        cache_dir (str): Directory with observation sidecars. The files are decoded every time if None
+
+    Returns:
+        surfex.ObservationColumns: Observations for all variables, with the variable name set for each
+
+    """
+    if lonrange is None:
+        lonrange = [-180, 180]
+    if latrange is None:
+        latrange = [-90, 90]
+    if isinstance(bufrfiles, str):
+        bufrfiles = [bufrfiles]
+
+    if max_workers is None or len(bufrfiles) < 2:
+        results = [read_bufr_file(bufrfile, variables, valid_dtg, valid_range, lonrange, latrange,
+                                  cache_dir=cache_dir) for bufrfile in bufrfiles]
+    else:
+        surfex.util.info("Decoding " + str(len(bufrfiles)) + " bufr files in parallel")
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(read_bufr_file, bufrfile, variables, valid_dtg, valid_range, lonrange,
+                                       latrange, cache_dir=cache_dir) for bufrfile in bufrfiles]
+            results = [future.result() for future in futures]
+
+    observations = surfex.obs.ObservationColumns.concatenate([result[0] for result in results])
+    cnt = sum([result[2] for result in results])
+    not_decoded = sum([result[3] for result in results])
+    print("\nFound " + str(len(observations)) + "/" + str(cnt))
+    print("Not decoded: " + str(not_decoded))
+    for var in variables:
+        counters = {}
+        for key in ["nobs", "ndomain", "nundef", "ntime", "nerror"]:
+            counters.update({key: sum([result[1][var][key] for result in results])})
+        print("\nObservations for var=" + var + ": " + str(counters["nobs"]))
+        print("Observations removed because of domain check: " + str(counters["ndomain"]))
+        print("Observations removed because of not being defined/found: " + str(counters["nundef"]))
+        print("Observations removed because of time window: " + str(counters["ntime"]))
+        print("Messages not containing information on all keys: " + str(counters["nerror"]))
+    return observations
@@ -35,6 +35,10 @@ def parse_args_create_forcing(argv):
     parser.add_argument('-t', '--timestep', type=int, help="Surfex time step", default=3600, nargs="?")
     parser.add_argument('-ci', '--cache_interval', type=int, help="clear cached fields after..", default=3600,
                         nargs="?")
+    parser.add_argument('--workers', type=int, help="Decode GRIB input in parallel with this number of processes",
+                        default=None)
+    parser.add_argument('--plan', action="store_true", default=False,
+                        help="Only list the input files and fields to read and check that the files exist")
     parser.add_argument('-i', '--input_format', type=str, help="Default input file format", default="netcdf",
                         choices=["netcdf", "grib1", "grib2", "surfex"])
     parser.add_argument('-o', '--output_format', type=str, help="Output file format", default="netcdf", nargs="?")
@@ -51,87 +55,87 @@ def parse_args_create_forcing(argv):
     group_ta.add_argument("--ta", type=str, help="Input format", default="default",
                           choices=["default", "netcdf", "grib1", "grib2", "surfex"])
     group_ta.add_argument("--ta_converter", type=str, help="Converter function to air temperature",
-                          default="none", choices=["none"])
+                          default="none", choices=["none", "expr"])
 
     group_qa = parser.add_argument_group('QA', description="Specific humidity")
     group_qa.add_argument("--qa", type=str, help="Input format", default="default",
                           choices=["default", "netcdf", "grib1", "grib2", "surfex"])
     group_qa.add_argument("--qa_converter", type=str, help="Converter function to specific humidity",
-                          default="none", choices=["none", "rh2q"])
+                          default="none", choices=["none", "rh2q", "expr"])
 
     group_ps = parser.add_argument_group('PS', description="Surface air pressure [Pa]")
     group_ps.add_argument('--ps', type=str, help="Surface air pressure input format",
                           default="default", choices=["default", "netcdf", "grib1",  "grib2", "surfex", "constant"])
     group_ps.add_argument("--ps_converter", type=str, help="Converter function to surface air pressure",
-                          default="none", choices=["none"])
+                          default="none", choices=["none", "expr"])
 
     group_dir_sw = parser.add_argument_group('DIR_SW', description="Direct shortwave radiation")
     group_dir_sw.add_argument('--dir_sw', type=str, help="Direct short wave radiation input format",
                               default="default", choices=["default", "netcdf", "grib1",  "grib2", "surfex", "constant"])
     group_dir_sw.add_argument("--dir_sw_converter", type=str,
                               help="Converter function to direct short wave radiation",
-                              default="none", choices=["none"])
+                              default="none", choices=["none", "expr"])
 
     group_sca_sw = parser.add_argument_group('SCA_SW', description="Scattered short wave radiation flux")
     group_sca_sw.add_argument('--sca_sw', type=str, help="Scattered short wave radiation input format",
                               default="default", choices=["netcdf", "grib1",  "grib2", "surfex", "constant"])
     group_sca_sw.add_argument("--sca_sw_converter", type=str,
                               help="Converter function to scattered shortwave radiation flux",
-                              default="none", choices=["none"])
+                              default="none", choices=["none", "expr"])
 
     group_lw = parser.add_argument_group('LW', description="Long wave radiation flux")
     group_lw.add_argument('--lw', type=str, help="Long wave radiation input format", default="default",
                           choices=["netcdf", "grib1",  "grib2", "surfex", "constant"])
     group_lw.add_argument("--lw_converter", type=str, help="Converter function to long wave radiation flux",
-                          default="none", choices=["none"])
+                          default="none", choices=["none", "expr"])
 
     group_rain = parser.add_argument_group('RAIN', description="Rainfall rate")
     group_rain.add_argument("--rain", type=str, help="Input format", default="default",
                             choices=["default", "netcdf", "grib1",  "grib2", "surfex"])
     group_rain.add_argument("--rain_converter", type=str, help="Converter function to rainfall rate",
-                            default="totalprec", choices=["none", "totalprec", "calcrain"])
+                            default="totalprec", choices=["none", "totalprec", "calcrain", "expr"])
 
     group_snow = parser.add_argument_group('SNOW', description="Snowfall rate")
     group_snow.add_argument("--snow", type=str, help="Input format", default="default",
                             choices=["default", "netcdf", "grib1",  "grib2", "surfex"])
     group_snow.add_argument("--snow_converter", type=str, help="Converter function to snowfall rate", default="none",
-                            choices=["none", "calcsnow"])
+                            choices=["none", "calcsnow", "expr"])
 
     group_wind = parser.add_argument_group('WIND', description="Wind speed")
     group_wind.add_argument("--wind", type=str, help="Input format", default="default",
                             choices=["default", "netcdf", "grib1",  "grib2", "surfex"])
     group_wind.add_argument("--wind_converter", type=str, help="Converter function to windspeed",
-                            default="windspeed", choices=["none", "windspeed"])
+                            default="windspeed", choices=["none", "windspeed", "expr"])
 
     group_wind_dir = parser.add_argument_group('WIND_DIR', description="Wind direction")
     group_wind_dir.add_argument("--wind_dir", type=str, help="Input format", default="default",
                                 choices=["default", "netcdf", "grib1",  "grib2", "surfex"])
     group_wind_dir.add_argument("--wind_dir_converter", type=str, help="Converter function to wind direction",
-                                default="winddir", choices=["none", "winddir"])
+                                default="winddir", choices=["none", "winddir", "expr"])
 
     group_co2 = parser.add_argument_group('CO2', description="Carbon dioxide")
     group_co2.add_argument('--co2', type=str, help="CO2 input format", default="default",
                            choices=["netcdf", "grib1", "constant",  "grib2", "surfex"])
     group_co2.add_argument("--co2_converter", type=str, help="Converter function to carbon dioxide", default="none",
-                           choices=["none"])
+                           choices=["none", "expr"])
 
     group_zs = parser.add_argument_group('ZS', description="Surface geopotential")
     group_zs.add_argument('--zsoro', type=str, help="ZS input format", default="default",
                           choices=["netcdf", "grib1", "grib2", "surfex", "constant"])
     group_zs.add_argument("--zsoro_converter", type=str, help="Converter function to ZS", default="none",
-                          choices=["none", "phi2m"])
+                          choices=["none", "phi2m", "expr"])
 
     group_zval = parser.add_argument_group('ZREF', description="Reference height for temperature and humidity")
     group_zval.add_argument('--zval', type=str, help="ZREF input format", default="default",
                             choices=["netcdf", "grib1", "grib2", "surfex", "constant"])
     group_zval.add_argument("--zval_converter", type=str, help="Converter function to ZREF", default="none",
-                            choices=["none"])
+                            choices=["none", "expr"])
 
     group_uval = parser.add_argument_group('UREF', description="Reference height for wind")
     group_uval.add_argument('--uval', type=str, help="UREF input format", default="default",
                             choices=["netcdf", "grib1", "grib2", "surfex", "constant"])
     group_uval.add_argument("--uval_converter", type=str, help="Converter function to UREF", default="none",
-                            choices=["none"])
+                            choices=["none", "expr"])
 
     if len(argv) < 4:
         parser.print_help()
@@ -808,6 +812,8 @@ def parse_args_titan(argv):
     parser.add_argument('-v', '--variable', type=str, required=True, help="Observation variable")
     parser.add_argument('--indent', type=int, default=None, help="Indent")
     parser.add_argument('-dtg', type=str, help="Date time group YYYYMMDDHH", required=True)
+    parser.add_argument('--cache_dir', type=str, default=None,
+                        help="Directory to store decoded observation files in and read them from")
     parser.add_argument('tests', nargs='+', type=str, help="Which tests to run and order to run")
 
     if len(sys.argv) == 0:
@@ -838,7 +844,8 @@ def run_titan(args):
     an_time = datetime.strptime(args.dtg, "%Y%m%d%H")
     var = args.variable
 
-    data_set = surfex.TitanDataSet(var, settings[var], tests, test_flags, an_time, debug=True)
+    data_set = surfex.TitanDataSet(var, settings[var], tests, test_flags, an_time, debug=True,
+                                   cache_dir=args.cache_dir)
     data_set.perform_tests()
 
     data_set.write_output(args.output_file, indent=args.indent)
@@ -1,4 +1,3 @@
-import pyproj
 import surfex
 try:
     import epygram
@@ -14,18 +13,104 @@ class Fa(object):
         self.lats = None
         self.nearest = None
         self.linear = None
+        # Open epygram resources and geometries per file name
+        self.resources = {}
+        self.geometries = {}
 
-    def field(self, varname, validtime):
+    def resource(self):
+
+        """
+        Open the file the first time it is used and keep it open
+
+        Returns:
+            epygram resource for the current file name
+        """
 
         if epygram is None:
             raise Exception("You need epygram to read FA files")
 
-        resource = epygram.formats.resource(self.fname, openmode='r')
-        field = resource.readfield(varname)
+        if self.fname not in self.resources:
+            surfex.util.info("Opening FA file " + self.fname, level=2)
+            self.resources.update({self.fname: epygram.formats.resource(self.fname, openmode='r')})
+        return self.resources[self.fname]
+
+    def close(self):
+
+        """
+        Close the open files. They are opened again if the handle is used later.
+        """
+
+        for fname in self.resources:
+            self.resources[fname].close()
+        self.resources = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def field(self, varname, validtime):
+
+        """
+        Read a field
+
+        Arguments:
+            varname (str): FA field name
+            validtime (datetime): Valid time
+
+        Returns:
+            tuple: The field values and the geometry
+
+        """
+
+        fields, geo_out = self.fields([varname], validtime)
+        return fields[0], geo_out
+
+    def fields(self, varnames, validtime):
+
+        """
+        Read several fields from the same file
+
+        Arguments:
+            varnames (list): FA field names
+            validtime (datetime): Valid time
+
+        Returns:
+            tuple: List with the values of each field and the geometry
+
+        """
+
+        resource = self.resource()
 
         # TODO: check time
         print("Not checking validtime at the moment: ", validtime)
 
+        fields = []
+        geo_out = None
+        for varname in varnames:
+            field = resource.readfield(varname)
+            if geo_out is None:
+                geo_out = self.geometry(field)
+            fields.append(field.data)
+        return fields, geo_out
+
+    def geometry(self, field):
+
+        """
+        Set up the geometry of a field. The geometry is only set up once for each file
+
+        Arguments:
+            field: epygram field
+
+        Returns:
+            surfex.geo.ConfProj: Geometry
+
+        """
+
+        if self.fname in self.geometries:
+            return self.geometries[self.fname]
+
         if field.geometry.name == "lambert":
             ny = field.geometry.dimensions["Y_CIzone"]
             nx = field.geometry.dimensions["X_CIzone"]
@@ -40,7 +125,7 @@ class Fa(object):
             proj4 = "+proj=lcc +lat_0=" + str(lat0) + " +lon_0=" + str(lon0) + " +lat_1=" + \
                     str(lat0) + " +lat_2=" + str(lat0) + " +units=m +no_defs +R=" + str(earth)
 
-            proj = pyproj.Proj(proj4)
+            proj = surfex.geo.get_projection(proj4)
             x0, y0 = proj(ll_lon, ll_lat)
             xc = x0 + 0.5 * (nx - 1) * dx
             yc = y0 + 0.5 * (ny - 1) * dy
@@ -66,7 +151,8 @@ class Fa(object):
         else:
             raise NotImplementedError(field.geometry.name + " not implemented yet!")
 
-        return field.data, geo_out
+        self.geometries.update({self.fname: geo_out})
+        return geo_out
 
     def points(self, varname, geo, validtime=None, interpolation="nearest", cache=None):
 
@@ -82,6 +168,12 @@ class Fa(object):
         """
 
         field, geo_in = self.field(varname, validtime)
+        interpolator = self.setup_interpolator(geo_in, geo, interpolation, cache)
+        field = interpolator.interpolate(field)
+        return field, interpolator
+
+    @staticmethod
+    def setup_interpolator(geo_in, geo, interpolation, cache):
         if interpolation == "nearest":
             surfex.util.info("Nearest neighbour", level=2)
             interpolator = surfex.interpolation.NearestNeighbour(geo_in, geo, cache=cache)
@@ -93,6 +185,4 @@ class Fa(object):
             interpolator = surfex.interpolation.NoInterpolation(geo_in, geo, cache=cache)
         else:
             raise NotImplementedError("Interpolation type " + interpolation + " not implemented!")
-
-        field = interpolator.interpolate(field)
-        return field, interpolator
+        return interpolator
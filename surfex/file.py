@@ -6,7 +6,6 @@ from datetime import timedelta, datetime
 from netCDF4 import Dataset, num2date, chartostring
 import re
 import abc
-import pyproj
 
 
 class SurfexIO(object):
@@ -251,6 +250,11 @@ class AsciiSurfexFile(SurfexIO):
     def __init__(self, filename, geo=None):
 
         self.filename = filename
+        # Line numbers of the values for each tile and parameter. Set up at first read
+        self.index = None
+        self.index_filename = None
+        self.lines = None
+        self.file_geo = None
         if geo is None:
             geo = self.get_geo()
 
@@ -263,6 +267,12 @@ class AsciiSurfexFile(SurfexIO):
         if not os.path.isfile(self.filename):
             raise FileNotFoundError("File does not exist: " + str(self.filename))
 
+        if self.file_geo is None or self.index_filename != self.filename:
+            self.file_geo = self.read_geo()
+        return self.file_geo
+
+    def read_geo(self):
+
         grid = self.read("GRID_TYPE", "FULL", "string")
         if len(grid) == 0:
             raise Exception("No grid found")
@@ -320,7 +330,7 @@ class AsciiSurfexFile(SurfexIO):
             proj4 = "+proj=lcc +lat_0=" + str(lat0) + " +lon_0=" + str(lon0) + " +lat_1=" + \
                     str(lat0) + " +lat_2=" + str(lat0) + " +units=m +no_defs +R=" + str(earth)
 
-            proj = pyproj.Proj(proj4)
+            proj = surfex.geo.get_projection(proj4)
             x0, y0 = proj(ll_lon, ll_lat)
             xc = x0 + 0.5 * (nx - 1) * dx
             yc = y0 + 0.5 * (ny - 1) * dy
@@ -347,73 +357,72 @@ class AsciiSurfexFile(SurfexIO):
         else:
             raise NotImplementedError("Grid " + str(grid[0]) + " not implemented!")
 
+    def index_file(self):
+
+        """
+        Scan the file once and index the value lines of each tile and parameter.
+        The line after a "&TILE PARAM" header is the description. The following lines until the next header
+        are the values.
+        """
+
+        print("Indexing " + self.filename)
+        with open(self.filename, mode="r") as file:
+            self.lines = file.read().splitlines()
+
+        self.index = {}
+        key = None
+        start = None
+        for i in range(0, len(self.lines)):
+            if self.lines[i].find('&') < 0:
+                continue
+            words = self.lines[i].split(None, 2)
+            if words[0].find('&') >= 0:
+                if key is not None:
+                    self.index.setdefault(key, []).append((start, i))
+                key = (words[0].strip().lower(), words[1].lower())
+                # Skip the description
+                start = i + 2
+        if key is not None:
+            self.index.setdefault(key, []).append((start, len(self.lines)))
+        self.index_filename = self.filename
+
     def read(self, read_par, read_tile, datatype):
 
         # Add & if not given
         if read_tile.find('&') < 0:
             read_tile = '&' + read_tile
-        # print read_tile,read_par
-        file = open(self.filename, mode="r")
-        read_desc = False
-        read_value = False
-        values = []
-        for line in file:
-            # for line in file.read().splitlines():
-
-            # print "T:"+line
-            words = line.split()
-            if len(words) > 0:
-                # print "Line:",read_desc,read_value,":",line
-                if read_value and not read_desc:
-                    if words[0].find('&') < 0:
-                        # print "Value:", line
-                        try:
-                            if datatype.lower() == "float":
-                                for i in range(0, len(words)):
-                                    val = float(words[i].replace("D", "E"))
-                                    if val == 1e+20:
-                                        val = np.nan
-                                    values.append(val)
-                            elif datatype.lower() == "string":
-                                str_words = []
-                                for i in range(0, len(words)):
-                                    str_words.append(words[i])
-                                values.append(" ".join(str_words))
-                            elif datatype.lower() == "integer" or datatype.lower() == "int":
-                                for i in range(0, len(words)):
-                                    values.append(int(words[i]))
-                            else:
-                                raise NotImplementedError("Type not implemented " + str(datatype))
-                        except ValueError:
-                            raise Exception('Conversion from ' + str(words) + " to " + str(datatype) +
-                                            " does not work! Try a different datatype!")
-
-                if read_desc:
-                    # print "Description: ", words[0]
-                    read_desc = False
-                    read_value = True
-
-                if words[0].find('&') >= 0:
-                    tile = words[0]
-                    par = words[1]
-
-                    read_value = False
-                    if tile.strip().lower() == read_tile.lower() and par.lower() == read_par.lower():
-                        read_desc = True
-                        read_value = False
-                        print("Found:" + str(tile) + " " + str(par))
-
-            # Description could be empty
+
+        if self.index is None or self.index_filename != self.filename:
+            self.index_file()
+
+        key = (read_tile.lower(), read_par.lower())
+        lines = []
+        if key in self.index:
+            print("Found:" + str(read_tile) + " " + str(read_par))
+            for start, end in self.index[key]:
+                lines = lines + self.lines[start:end]
+
+        try:
+            if datatype.lower() == "float":
+                values = np.array(" ".join(lines).replace("D", "E").split(), dtype=float)
+                values[values == 1e+20] = np.nan
+            elif datatype.lower() == "string":
+                values = []
+                for line in lines:
+                    words = line.split()
+                    if len(words) > 0:
+                        values.append(" ".join(words))
+                values = np.asarray(values)
+            elif datatype.lower() == "integer" or datatype.lower() == "int":
+                values = np.array(" ".join(lines).split(), dtype=int)
             else:
-                if read_desc:
-                    # print "Description: ", words[0]
-                    read_desc = False
-                    read_value = True
+                raise NotImplementedError("Type not implemented " + str(datatype))
+        except ValueError:
+            raise Exception('Conversion from ' + str(lines) + " to " + str(datatype) +
+                            " does not work! Try a different datatype!")
 
         if len(values) == 0:
             print("No values found!")
-
-        values = np.asarray(values)
         return values
 
     def field(self, var, validtime=None):
@@ -470,7 +479,7 @@ class NCSurfexFile(SurfexIO):
             proj4 = "+proj=lcc +lat_0=" + str(lat0) + " +lon_0=" + str(lon0) + " +lat_1=" + \
                     str(lat0) + " +lat_2=" + str(lat0) + " +units=m +no_defs +R=" + str(earth)
 
-            proj = pyproj.Proj(proj4)
+            proj = surfex.geo.get_projection(proj4)
             x0, y0 = proj(ll_lon, ll_lat)
             xc = x0 + 0.5 * (nx - 1) * dx
             yc = y0 + 0.5 * (ny - 1) * dy
@@ -600,6 +609,7 @@ class FaSurfexFile(SurfexIO):
 
         SurfexIO.__init__(self, filename, geo, extension)
         self.lfagmap = lfagmap
+        self.fa = surfex.fa.Fa(self.filename)
 
     # def get_geo(self):
     #    # TODO read geo from SURFEX FA file
@@ -608,14 +618,13 @@ class FaSurfexFile(SurfexIO):
 
     def field(self, var, validtime=None):
 
-        fh = surfex.fa.Fa(self.filename)
         if validtime is None:
             pass
         elif type(validtime) != datetime:
             raise Exception("validime must be a datetime object")
 
         geo_in = self.geo
-        field = fh.field(var.varname, validtime)
+        field, geo = self.fa.field(var.varname, validtime)
 
         # Reshape to fortran 2D style
         field = np.reshape(field, [geo_in.nlons, geo_in.nlats], order="F")
@@ -641,6 +650,7 @@ class NetCDFSurfexFile(SurfexIO):
     def __init__(self, filename, geo):
         self.fh = Dataset(filename, "r")
         SurfexIO.__init__(self, filename, geo, "nc")
+        self.gather = {}
 
     def read(self, var, times):
         """
@@ -757,46 +767,47 @@ class NetCDFSurfexFile(SurfexIO):
             npoints = self.geo.npoints * npatch
 
             # Create 2-D array with times and points as for the other formats
-            for t in range(0, field.shape[0]):
-                field2d = np.empty(npoints)
-                i = 0
-                # print t,npatch,npoints,field.shape,field2d.shape
-                for p in range(0, npatch):
-                    if self.geo.mask is not None:
-                        ii = 0
-                        j = 0
-                        # For some reason the NetCDF files have one less dimension in all
-                        # dimensions than the PGD dimension and mask needs x first.
-                        for x in range(-1, field.shape[1] + 1):
-                            for y in range(-1, field.shape[2] + 1):
-                                if x in range(0, field.shape[1]) and y in range(0, field.shape[2]):
-                                    # print i, ii,j, t, x, y, p, self.geo.mask[j]
-                                    if self.geo.mask[j] == ii:
-                                        field2d[i] = np.nan
-                                        if field[t, x, y, p] != np.nan:
-                                            field2d[i] = field[t, x, y, p]
-                                        i = i + 1
-                                        j = j + 1
-                                ii = ii + 1
-                    else:
-                        for y in range(0, field.shape[2]):
-                            for x in range(0, field.shape[1]):
-                                field2d[i] = np.nan
-                                if field[t, x, y, p] != np.nan:
-                                    field2d[i] = field[t, x, y, p]
-                                i = i + 1
-                if i != npoints:
-                    raise Exception("Mismatch in points " + str(i) + "!=" + str(npoints))
-
-                values = np.append(values, field2d)
-            # Re-shape to proper format
-            values = np.reshape(values, [field.shape[0], npoints])
+            field = np.ma.filled(field, np.nan)
+            # Tiles and layers are packed after each other
+            field = np.reshape(field, [field.shape[0], field.shape[1], field.shape[2], -1])
+            if self.geo.mask is not None:
+                x_ind, y_ind = self.gather_indices(field.shape[1], field.shape[2])
+                values = np.transpose(field[:, x_ind, y_ind, :], (0, 2, 1))
+            else:
+                # y before x for each patch
+                values = np.transpose(field, (0, 3, 2, 1))
+            values = np.reshape(values, [field.shape[0], -1])
+            if values.shape[1] != npoints:
+                raise Exception("Mismatch in points " + str(values.shape[1]) + "!=" + str(npoints))
 
         else:
             raise Exception("Variable " + var + " not found!")
 
         return values, self.geo
 
+    def gather_indices(self, nx, ny):
+        """
+        Indices of the masked points in the fields. Computed once for each field dimension.
+
+        For some reason the NetCDF files have one less dimension in all dimensions than the PGD dimension and
+        the mask is counted with x first over the PGD dimensions.
+
+        Arguments:
+            nx (int): x dimension of the field
+            ny (int): y dimension of the field
+
+        Returns:
+            tuple: x and y indices of the points in the mask
+
+        """
+        if (nx, ny) not in self.gather:
+            mask = np.asarray(self.geo.mask, dtype=int)
+            x_ind = np.floor_divide(mask, ny + 2) - 1
+            y_ind = np.mod(mask, ny + 2) - 1
+            inside = (x_ind >= 0) & (x_ind < nx) & (y_ind >= 0) & (y_ind < ny)
+            self.gather.update({(nx, ny): (x_ind[inside], y_ind[inside])})
+        return self.gather[(nx, ny)]
+
     def field(self, var, validtime=None):
 
         if validtime is None:
@@ -828,12 +839,67 @@ class TexteSurfexFile(SurfexIO):
     Reading surfex TEXTE output
     """
 
-    def __init__(self, filename, geo):
+    def __init__(self, filename, geo, sidecar=False):
+        """
+        Arguments:
+            filename (str): TEXTE file name
+            geo (surfex.geo.Geo): Geometry
+            sidecar (bool): Save the parsed values to a .npy file next to the TEXTE file and memory map it
+                            when the file is opened again
+        """
         self.file = None
+        self.sidecar = sidecar
+        # Parsed values in order time,pos for each number of points per time step
+        self.data = {}
         SurfexIO.__init__(self,  filename, geo, "TXT")
 
-    def read(self, variable, times):
+    def parse(self, end_of_line):
+        """
+        Parse all time steps in the file. Each time step has end_of_line values and must end at the end of a line.
+
+        Arguments:
+            end_of_line (int): Number of values in a time step
+
+        Returns:
+            np.array: Values in order time,pos
+
+        """
+
+        if end_of_line in self.data:
+            return self.data[end_of_line]
+
+        sidecar_file = self.filename + ".npy"
+        if self.sidecar and os.path.exists(sidecar_file) and \
+                os.path.getmtime(sidecar_file) >= os.path.getmtime(self.filename):
+            values = np.load(sidecar_file, mmap_mode="r")
+            if len(values.shape) == 2 and values.shape[1] == end_of_line:
+                print("Using parsed values from " + sidecar_file)
+                self.data.update({end_of_line: values})
+                return values
+
         self.file = open(self.filename, mode="r")
+        words = []
+        line_ends = []
+        for line in self.file.read().replace("D", "E").splitlines():
+            words.extend(line.split())
+            line_ends.append(len(words))
+        self.file.close()
+
+        values = np.array(words, dtype=float)
+        ntimes = values.shape[0] // end_of_line
+        time_ends = np.arange(1, ntimes + 1) * end_of_line
+        if not np.all(np.isin(time_ends, line_ends)):
+            raise Exception("Dimension of domain does not match end of line!")
+        values = np.reshape(values[0:ntimes * end_of_line], [ntimes, end_of_line])
+        values[values == 1e+20] = np.nan
+
+        if self.sidecar:
+            print("Saving parsed values to " + sidecar_file)
+            np.save(sidecar_file, values)
+        self.data.update({end_of_line: values})
+        return values
+
+    def read(self, variable, times):
 
         base_time = variable.basetime
         interval = variable.interval
@@ -844,48 +910,28 @@ class TexteSurfexFile(SurfexIO):
         if interval is None:
             raise Exception("Interval must be set for TEXTE")
 
-        if not isinstance(times, (list, tuple)):
+        if times is not None and not isinstance(times, (list, tuple)):
             raise Exception("times must be list or tuple")
 
-        values = np.array([])
-        times_read = np.array([])
-        end_of_line = self.geo.npoints * npatch
-        this_time = np.empty(self.geo.npoints * npatch)
-
-        t = 1
-        col = 0
-        for line in self.file.read().splitlines():
-
-            words = line.split()
-            if len(words) > 0:
-                for i in range(0, len(words)):
-                    val = float(words[i].replace("D", "E"))
-                    if val == 1e+20:
-                        val = np.nan
-                    this_time[col] = val
-
-                    col = col + 1
-                    if col == end_of_line:
-
-                        if times is None or (base_time + timedelta(seconds=(t * interval))) in times:
-                            values = np.append(values, this_time)
-                            times_read = np.append(times_read, base_time + timedelta(seconds=(t * interval)))
-                            # print i, col, base_time + timedelta(seconds=(t * interval)), this_time
-
-                        t = t + 1
-                        col = 0
-                        this_time[:] = np.nan
-                        if i != len(words) - 1:
-                            raise Exception("Dimension of domain does not match end of line! " +
-                                            str(i) + " != " + str(len(words) - 1))
-
-        if times_read.shape[0] > 0:
-            values = np.reshape(values, [times_read.shape[0], this_time.shape[0]])
+        values = self.parse(self.geo.npoints * npatch)
+
+        # The first time step in the file is base_time + interval
+        if times is None:
+            indices = np.arange(0, values.shape[0])
+        else:
+            indices = []
+            for this_time in times:
+                step = (this_time - base_time).total_seconds() / interval
+                if step == int(step) and 1 <= step <= values.shape[0]:
+                    indices.append(int(step) - 1)
+            indices = np.unique(np.asarray(indices, dtype=int))
+
+        if indices.shape[0] > 0:
+            values = np.array(values[indices, :])
         else:
+            values = np.array([])
             print("No data found!")
 
-        # print values.shape
-        self.file.close()
         return values, self.geo
 
     def field(self, var, validtime=None):
@@ -921,10 +967,59 @@ class ForcingFileNetCDF(SurfexIO):
         self.lats = self.fh.variables["LAT"]
         self.nx = self.lons.shape[0]
         self.ny = self.lats.shape[0]
+        self._times = None
         SurfexIO.__init__(self, fname, geo, "nc")
 
+    @property
+    def times(self):
+        """
+        Returns:
+            np.array: Times in the file as datetime64 truncated to the hour
+        """
+
+        if self._times is None:
+            times_for_var = self.fh.variables['time']
+            epochtimes = surfex.netcdf.unit_converter(times_for_var.units, "seconds since 1970-01-01 00:00:00")\
+                .convert(np.asarray(times_for_var[:], dtype=float))
+            epochtimes = np.round(epochtimes).astype("int64")
+            self._times = (epochtimes - epochtimes % 3600).astype("datetime64[s]")
+        return self._times
+
+    def time_indices(self, times):
+        """
+        Find the time indices in the file of the times
+
+        Arguments:
+            times (list): datetime objects
+
+        Returns:
+            list: Time indices in the same order as times. Each time gives all matching indices in file order
+
+        """
+
+        file_times = self.times
+        order = np.argsort(file_times, kind="stable")
+        sorted_times = file_times[order]
+        times = np.array(times, dtype="datetime64[s]")
+        first = np.searchsorted(sorted_times, times, side="left")
+        counts = np.searchsorted(sorted_times, times, side="right") - first
+        offsets = np.arange(np.sum(counts)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return order[np.repeat(first, counts) + offsets].tolist()
+
     def read_field(self, variable, times):
 
+        """
+        Read the values for one or more times
+
+        Arguments:
+            variable: Variable with varname
+            times (list): datetime objects. Not used for variables without a time dimension
+
+        Returns:
+            tuple: Values in order time,pos and the geometry
+
+        """
+
         var = variable.varname
         field = None
         if self.fh.variables[var].shape[0] > 0:
@@ -935,49 +1030,70 @@ class ForcingFileNetCDF(SurfexIO):
                 if len(times) == 0:
                     raise Exception("You must set time!")
 
-                times_read = []
-                ndims = 0
                 npoints = 0
-                for dim in self.fh.variables[var].dimensions:
-                    dimlen = self.fh.variables[var].shape[ndims]
-
-                    if dim == "time":
-                        times_for_var = self.fh.variables['time']
-                        units = times_for_var.units
-                        try:
-                            t_cal = times_for_var.calendar
-                        except AttributeError:  # Attribute doesn't exist
-                            t_cal = u"gregorian"  # or standard
-
-                        indices = []
-                        [indices.append(i) for i in range(0, dimlen)]
-                        times_for_var = num2date(times_for_var[indices], units=units, calendar=t_cal)
-                        # print(times_for_var)
-                        for times_to_read in range(0, len(times)):
-                            # print(times_to_read, times[times_to_read])
-                            for t in range(0, len(times_for_var)):
-                                # print(t, times_for_var[t], times[times_to_read])
-                                test_time = times_for_var[t].strftime("%Y%m%d%H")
-                                test_time = datetime.strptime(test_time, "%Y%m%d%H")
-                                if test_time == times[times_to_read]:
-                                    times_read.append(t)
-                                    print(t, times[times_to_read])
-                    else:
-                        npoints = dimlen
-
-                    ndims = ndims + 1
+                for ndims in range(0, len(self.fh.variables[var].dimensions)):
+                    if self.fh.variables[var].dimensions[ndims] != "time":
+                        npoints = self.fh.variables[var].shape[ndims]
 
                 if npoints == 0:
                     raise Exception("No points found")
 
+                times_read = self.time_indices(times)
                 if len(times_read) == 0 and len(times) > 0:
                     print(times)
                     raise Exception("Valid time not found in file!")
+                surfex.util.info("Time indices read: " + str(times_read), level=2)
 
-                field = self.fh.variables[var][times_read, 0: npoints]
+                field = self.fh.variables[var][surfex.netcdf.Netcdf.hyperslab(times_read), 0: npoints]
 
         return field, self.geo
 
+    def time_chunks(self, variable, chunk_size=24):
+        """
+        Iterate over all times in the file. Each chunk of times is read as one contiguous block,
+        so the whole file is scanned in one pass.
+
+        Arguments:
+            variable: Variable with varname
+            chunk_size (int): Number of times read in each chunk
+
+        Returns:
+            generator: Times and values in order time,pos for each chunk
+
+        """
+
+        var = self.fh.variables[variable.varname]
+        ntimes = self.times.shape[0]
+        for start in range(0, ntimes, chunk_size):
+            end = min(start + chunk_size, ntimes)
+            yield self.times[start:end].astype(datetime).tolist(), var[start:end, :]
+
+    def points_block(self, var, geo_out, validtimes, interpolation="nearest", cache=None):
+        """
+        Read and interpolate several times in one go
+
+        Arguments:
+            var: Variable with varname
+            geo_out (surfex.geo.Geo): Output geometry
+            validtimes (list): datetime objects
+            interpolation (str): Interpolation type
+            cache (surfex.Cache): Cache with interpolators
+
+        Returns:
+            tuple: Values in order time,pos and the interpolator
+
+        """
+
+        fields, geo_in = self.read_field(var, validtimes)
+        values = np.empty([fields.shape[0], geo_out.npoints])
+        interpolator = None
+        for i in range(0, fields.shape[0]):
+            field = np.reshape(fields[i, :], [geo_in.nlons, geo_in.nlats], order="F")
+            points, interpolator = SurfexIO.interpolate_field(self, field, geo_in, geo_out,
+                                                              interpolation=interpolation, cache=cache)
+            values[i, :] = np.reshape(points, [-1], order="F")
+        return values, interpolator
+
     def field(self, var, validtime=None):
         if validtime is None:
             validtime = []
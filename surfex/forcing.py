@@ -323,10 +323,16 @@ def run_time_loop(options, var_objs, att_objs):
     cache = surfex.cache.Cache(options['debug'], options['cache_interval'])
     # Find how many time steps we want to write
     ntimes = 0
+    validtimes = []
     while this_time <= options['stop']:
         ntimes = ntimes+1
+        validtimes.append(this_time)
         this_time = this_time + timedelta(seconds=options['timestep'])
 
+    # Plan or read input ahead of the time loop
+    for obj in var_objs:
+        obj.prefetch(validtimes, cache, max_workers=options['workers'])
+
     # Create output object
     if str.lower(options['output_format']) == "netcdf":
         # Set att_time the same as start
@@ -356,9 +362,85 @@ def run_time_loop(options, var_objs, att_objs):
     # Finalize forcing
     output.finalize()
 
+    # Close the FA files still open
+    for file_handler in cache.file_handler:
+        if isinstance(file_handler, surfex.fa.Fa):
+            file_handler.close()
+
+
+def plan_reads(options, var_objs, att_objs):
+    """
+    Find all fields the time loop will read without reading anything
+
+    :param options: Options from set_forcing_config
+    :param var_objs: Forcing variables
+    :param att_objs: Attributes
+    :return: dict with a list of (variable, validtime) to read for each file name
+    """
+
+    validtimes = []
+    this_time = options['start']
+    while this_time <= options['stop']:
+        validtimes.append(this_time)
+        this_time = this_time + timedelta(seconds=options['timestep'])
+
+    # Variables shared between converters are only planned once, for all the times they are read
+    variables = []
+    variable_times = {}
+    for objs, times in [(att_objs, [options['start']]), (var_objs, validtimes)]:
+        for obj in objs:
+            for var in obj.get_variables():
+                if isinstance(var, surfex.read.PlannedVariable):
+                    var = var.var
+                if id(var) not in variable_times:
+                    variables.append(var)
+                    variable_times.update({id(var): []})
+                for validtime in times:
+                    if validtime not in variable_times[id(var)]:
+                        variable_times[id(var)].append(validtime)
+
+    plan = {}
+    for var in variables:
+        for filename, validtime in var.planned_reads(sorted(variable_times[id(var)])):
+            if filename is not None:
+                plan.setdefault(filename, []).append((var, validtime))
+    return plan
+
+
+def print_read_plan(plan):
+    """
+    Print the number of fields to read from each file and check that the files exist
+
+    :param plan: Plan from plan_reads
+    :return: list of missing files
+    """
+
+    ndecodes = 0
+    nbytes = 0
+    missing = []
+    for filename in sorted(plan):
+        nreads = len(plan[filename])
+        ndecodes = ndecodes + nreads
+        if filename.find("://") > 0:
+            status = "remote"
+        elif os.path.exists(filename):
+            size = os.path.getsize(filename)
+            nbytes = nbytes + size
+            status = str(size) + " bytes"
+        else:
+            status = "MISSING"
+            missing.append(filename)
+        print(filename + ": " + str(nreads) + " fields " + status)
+
+    print("Files: " + str(len(plan)) + " Fields to decode: " + str(ndecodes) + " Bytes in input files: " +
+          str(nbytes))
+    if len(missing) > 0:
+        print("Missing files: " + str(len(missing)))
+    return missing
+
 
 def set_input_object(sfx_var, merged_conf, geo, forcingformat, selected_converter, ref_height, start, first_base_time,
-                     timestep, debug):
+                     timestep, debug, read_plan=None):
     """
     Set the input parameter for a specific SURFEX forcing variable based on input
 
@@ -372,6 +454,7 @@ def set_input_object(sfx_var, merged_conf, geo, forcingformat, selected_converte
     :param first_base_time:
     :param timestep:
     :param debug:
+    :param read_plan: surfex.read.ReadPlan shared by all input objects
     :return:
     """
 
@@ -450,7 +533,7 @@ def set_input_object(sfx_var, merged_conf, geo, forcingformat, selected_converte
         # Construct the converter
         # print sfx_var
         converter = surfex.read.Converter(selected_converter, start, defs, conf_dict, forcingformat,
-                                          first_base_time, debug)
+                                          first_base_time, debug, read_plan=read_plan)
 
         # Construct the input object
         obj = surfex.read.ConvertedInput(geo, sfx_var, converter)
@@ -501,6 +584,9 @@ def set_forcing_config(args):
     if args.pattern:
         merged_conf[fileformat]["filepattern"] = args.pattern
 
+    # Input variables with identical definitions are read once per time step
+    read_plan = surfex.read.ReadPlan()
+
     # Set attributes
     atts = ["ZS", "ZREF", "UREF"]
     att_objs = []
@@ -532,7 +618,7 @@ def set_forcing_config(args):
             raise NotImplementedError
 
         att_objs.append(set_input_object(atts[i], merged_conf, geo_out, cformat, selected_converter, ref_height,
-                                         start, first_base_time, args.timestep, debug))
+                                         start, first_base_time, args.timestep, debug, read_plan=read_plan))
 
     # Set forcing variables (time dependent)
     variables = ["TA", "QA", "PS", "DIR_SW", "SCA_SW", "LW", "RAIN", "SNOW", "WIND", "WIND_DIR", "CO2"]
@@ -594,7 +680,7 @@ def set_forcing_config(args):
         else:
             raise NotImplementedError
         var_objs.append(set_input_object(sfx_var, merged_conf, geo_out, cformat, selected_converter, ref_height,
-                                         start, first_base_time, args.timestep, debug))
+                                         start, first_base_time, args.timestep, debug, read_plan=read_plan))
 
     # Save options
     options = dict()
@@ -606,5 +692,7 @@ def set_forcing_config(args):
     options['geo_out'] = geo_out
     options['debug'] = args.debug
     options['cache_interval'] = args.cache_interval
+    options['workers'] = args.workers
+    options['plan'] = args.plan
 
     return options, var_objs, att_objs
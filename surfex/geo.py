@@ -4,42 +4,240 @@ from pyproj import Proj
 import numpy as np
 import surfex
 import os
+import hashlib
+import tempfile
+
+
+# Projections set up from proj4 strings. Shared by all geometries
+projections = {}
+
+
+def get_projection(proj4):
+    """
+    Get a projection from the registry. The projection is only set up the first time a proj4 string is used.
+
+    Arguments:
+        proj4 (str): proj4 string
+
+    Returns:
+        pyproj.Proj: Projection which transforms arrays of coordinates
+    """
+    if proj4 not in projections:
+        projections.update({proj4: Proj(proj4)})
+    return projections[proj4]
+
+
+class SpatialIndex(object):
+    """
+    KD-tree of positions on the sphere. Distances are great circle distances in metres.
+    """
+
+    radius_of_earth = 6.367e6
+
+    def __init__(self, lons, lats):
+        """
+        Arguments:
+            lons (np.array): Longitudes
+            lats (np.array): Latitudes
+        """
+        from scipy.spatial import cKDTree
+
+        self.lons = np.asarray(lons, dtype=float).flatten()
+        self.lats = np.asarray(lats, dtype=float).flatten()
+        self.tree = cKDTree(self.xyz(self.lons, self.lats))
+
+    @staticmethod
+    def xyz(lons, lats):
+        lons = np.radians(np.asarray(lons, dtype=float).flatten())
+        lats = np.radians(np.asarray(lats, dtype=float).flatten())
+        return np.column_stack((np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons), np.sin(lats)))
+
+    def chord2distance(self, chord):
+        return 2. * self.radius_of_earth * np.arcsin(np.minimum(np.asarray(chord) / 2., 1.))
+
+    def distance2chord(self, distance):
+        return 2. * np.sin(np.minimum(np.asarray(distance) / (2. * self.radius_of_earth), np.pi / 2.))
+
+    def nearest(self, lons, lats):
+        """
+        Nearest position
+
+        Arguments:
+            lons (np.array): Longitudes
+            lats (np.array): Latitudes
+
+        Returns:
+            tuple: Index of the nearest position and the distance to it for each lon/lat
+        """
+        chord, index = self.tree.query(self.xyz(lons, lats))
+        return index, self.chord2distance(chord)
+
+    def k_nearest(self, lons, lats, k):
+        """
+        The k nearest positions
+
+        Returns:
+            tuple: Indices and distances in order lon/lat,k. Missing neighbours have index len(self.lons)
+        """
+        chord, index = self.tree.query(self.xyz(lons, lats), k=k)
+        return np.reshape(index, [-1, k]), np.reshape(self.chord2distance(chord), [-1, k])
+
+    def radius(self, lons, lats, radius):
+        """
+        Positions within a radius
+
+        Arguments:
+            radius (float): Radius in metres
+
+        Returns:
+            list: Indices of the positions within radius for each lon/lat
+        """
+        index = self.tree.query_ball_point(self.xyz(lons, lats), self.distance2chord(radius))
+        return [np.asarray(sorted(ind), dtype=int) for ind in index]
+
+    def bounding_box(self, lonrange, latrange):
+        """
+        Positions inside a lon/lat box
+
+        Arguments:
+            lonrange (list): Minimum and maximum longitude
+            latrange (list): Minimum and maximum latitude
+
+        Returns:
+            np.array: Indices of the positions inside the box
+        """
+        inside = (self.lons >= lonrange[0]) & (self.lons <= lonrange[1]) & \
+                 (self.lats >= latrange[0]) & (self.lats <= latrange[1])
+        return np.nonzero(inside)[0]
+
+    def match(self, lons, lats, max_distance=1.):
+        """
+        Find the positions which are the same as lons/lats
+
+        Arguments:
+            max_distance (float): Positions closer than this in metres are the same
+
+        Returns:
+            np.array: Index of the position for each lon/lat. -1 if not found
+        """
+        index, distance = self.nearest(lons, lats)
+        index[distance > max_distance] = -1
+        return index
 
 
 class Geo(object):
     def __init__(self, npoints, nlons, nlats, lons, lats, proj=None):
-        can_interpolate = False
-        if type(lons) != np.ndarray or type(lats) != np.ndarray:
-            raise Exception("Longitudes and latitudes must be numpy nd arrays")
+        """
+        Arguments:
+            npoints (int): Number of points
+            nlons (int): Number of longitudes
+            nlats (int): Number of latitudes
+            lons (np.array): Longitudes. If None, they are set up by coordinates() when they are first used
+            lats (np.array): Latitudes. If None, they are set up by coordinates() when they are first used
+            proj (pyproj.Proj): Projection
+        """
         self.proj = proj
         self.npoints = npoints
         self.nlons = nlons
         self.nlats = nlats
-        self.lonlist = lons.flatten()
-        self.latlist = lats.flatten()
-        self.lonrange = None
-        self.latrange = None
+        self._lonlist = None
+        self._latlist = None
+        self._lons = None
+        self._lats = None
+        self._lonrange = None
+        self._latrange = None
+        self._spatial_index = None
+        if lons is None and lats is None:
+            # Lazy geometries always have points
+            can_interpolate = self.npoints > 0 and self.npoints != self.nlons and self.npoints != self.nlats
+        else:
+            if type(lons) != np.ndarray or type(lats) != np.ndarray:
+                raise Exception("Longitudes and latitudes must be numpy nd arrays")
+            self.set_coordinates(lons, lats)
+            can_interpolate = self._lons is not None
+        self.can_interpolate = can_interpolate
+
+    def coordinates(self):
+        """
+        Set up the coordinates of a lazy geometry
+
+        Returns:
+            tuple: Longitudes and latitudes
+        """
+        raise NotImplementedError("Coordinates are not defined for this geometry")
+
+    def set_coordinates(self, lons, lats):
+        self._lonlist = lons.flatten()
+        self._latlist = lats.flatten()
         if lons.shape[0] > 0 and lats.shape[0] > 0:
             if self.npoints != self.nlons and self.npoints != self.nlats:
                 # Make 2D array
-                can_interpolate = True
-                self.lons = np.reshape(self.lonlist, [self.nlons, self.nlats])
-                self.lats = np.reshape(self.latlist, [self.nlons, self.nlats])
-            self.lonrange = [np.min(lons), np.max(lons)]
-            self.latrange = [np.min(lats), np.max(lats)]
-        self.can_interpolate = can_interpolate
+                self._lons = np.reshape(self._lonlist, [self.nlons, self.nlats])
+                self._lats = np.reshape(self._latlist, [self.nlons, self.nlats])
+            self._lonrange = [np.min(lons), np.max(lons)]
+            self._latrange = [np.min(lats), np.max(lats)]
+
+    def lazy_coordinates(self):
+        if self._lonlist is None:
+            lons, lats = self.coordinates()
+            self.set_coordinates(lons, lats)
+
+    @property
+    def lonlist(self):
+        self.lazy_coordinates()
+        return self._lonlist
+
+    @property
+    def latlist(self):
+        self.lazy_coordinates()
+        return self._latlist
+
+    @property
+    def lons(self):
+        self.lazy_coordinates()
+        if self._lons is None:
+            raise AttributeError("No 2D longitudes for this geometry")
+        return self._lons
+
+    @property
+    def lats(self):
+        self.lazy_coordinates()
+        if self._lats is None:
+            raise AttributeError("No 2D latitudes for this geometry")
+        return self._lats
+
+    @property
+    def lonrange(self):
+        self.lazy_coordinates()
+        return self._lonrange
+
+    @property
+    def latrange(self):
+        self.lazy_coordinates()
+        return self._latrange
+
+    def spatial_index(self):
+        """
+        Returns:
+            surfex.geo.SpatialIndex: Spatial index of lonlist/latlist. Set up the first time it is used
+        """
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex(self.lonlist, self.latlist)
+        return self._spatial_index
+
+    def first_last(self):
+        """
+        Returns:
+            tuple: First and last longitude and first and last latitude
+        """
+        return self.lonlist[0], self.lonlist[-1], self.latlist[0], self.latlist[-1]
 
     def identifier(self):
-        f_lon = ""
-        l_lon = ""
-        if self.lonlist is not None:
-            f_lon = str(round(float(self.lonlist[0]), 2))
-            l_lon = str(round(float(self.lonlist[-1]), 2))
-        f_lat = ""
-        l_lat = ""
-        if self.latlist is not None:
-            f_lat = str(round(float(self.latlist[0]), 2))
-            l_lat = str(round(float(self.latlist[-1]), 2))
+        first_lon, last_lon, first_lat, last_lat = self.first_last()
+        f_lon = str(round(float(first_lon), 2))
+        l_lon = str(round(float(last_lon), 2))
+        f_lat = str(round(float(first_lat), 2))
+        l_lat = str(round(float(last_lat), 2))
 
         tag = ":" + str(self.npoints) + ":" + str(self.nlons) + ":" + str(self.nlats) + ":" + f_lon + ":" + l_lon +\
               ":" + f_lat + ":" + l_lat + ":"
@@ -53,6 +251,92 @@ class Geo(object):
         else:
             return False
 
+    def tiles(self, nx_tiles, ny_tiles=1, halo=0):
+        """
+        Split the geometry in tiles which can be processed independently
+
+        Geometries with 2D coordinates are split in nx_tiles * ny_tiles tiles in the lon and lat directions.
+        Each tile is extended with halo grid points on each side inside the geometry. Geometries with a list of
+        points are split in nx_tiles * ny_tiles tiles of consecutive points without halo.
+
+        Arguments:
+            nx_tiles (int): Number of tiles in the lon direction
+            ny_tiles (int): Number of tiles in the lat direction
+            halo (int): Number of grid points added on each side of the tiles
+
+        Returns:
+            list: surfex.geo.Tile objects
+
+        """
+
+        tiles = []
+        if self.can_interpolate:
+            for i_ind in np.array_split(np.arange(0, self.nlons), nx_tiles):
+                for j_ind in np.array_split(np.arange(0, self.nlats), ny_tiles):
+                    if len(i_ind) == 0 or len(j_ind) == 0:
+                        continue
+                    i0 = max(i_ind[0] - halo, 0)
+                    i1 = min(i_ind[-1] + halo + 1, self.nlons)
+                    j0 = max(j_ind[0] - halo, 0)
+                    j1 = min(j_ind[-1] + halo + 1, self.nlats)
+                    i, j = np.meshgrid(np.arange(i0, i1), np.arange(j0, j1), indexing="ij")
+                    inner = (i >= i_ind[0]) & (i <= i_ind[-1]) & (j >= j_ind[0]) & (j <= j_ind[-1])
+                    geo = Geo((i1 - i0) * (j1 - j0), i1 - i0, j1 - j0, self.lons[i0:i1, j0:j1],
+                              self.lats[i0:i1, j0:j1], proj=self.proj)
+                    tiles.append(Tile(geo, (i * self.nlats + j).flatten(), inner.flatten()))
+        else:
+            for index in np.array_split(np.arange(0, self.npoints), nx_tiles * ny_tiles):
+                if len(index) == 0:
+                    continue
+                geo = Geo(len(index), len(index), len(index), self.lonlist[index], self.latlist[index],
+                          proj=self.proj)
+                tiles.append(Tile(geo, index, np.ones(len(index), dtype=bool)))
+        return tiles
+
+    def assemble_tiles(self, tiles, values):
+        """
+        Put values computed for each tile back in one array for the geometry. Halo points are skipped.
+
+        Arguments:
+            tiles (list): surfex.geo.Tile objects from tiles()
+            values (list): Values for each tile with the points in the last dimension
+
+        Returns:
+            np.array: Values with self.npoints points in the last dimension
+
+        """
+
+        if len(tiles) != len(values):
+            raise Exception("Mismatch in number of tiles and values " + str(len(tiles)) + " != " + str(len(values)))
+
+        field = None
+        for tile, tile_values in zip(tiles, values):
+            tile_values = np.asarray(tile_values)
+            if tile_values.shape[-1] != tile.geo.npoints:
+                raise Exception("Mismatch in points for tile " + str(tile_values.shape[-1]) + " != " +
+                                str(tile.geo.npoints))
+            if field is None:
+                field = np.full(tile_values.shape[:-1] + (self.npoints,), np.nan)
+            field[..., tile.index[tile.inner]] = tile_values[..., tile.inner]
+        return field
+
+
+class Tile(object):
+    """
+    Part of a geometry
+    """
+
+    def __init__(self, geo, index, inner):
+        """
+        Arguments:
+            geo (surfex.geo.Geo): Geometry of the tile including the halo
+            index (np.array): Index of each tile point in the points of the parent geometry
+            inner (np.array): True for the tile points which are not in the halo
+        """
+        self.geo = geo
+        self.index = index
+        self.inner = inner
+
 
 class SurfexGeo(ABC, Geo):
     def __init__(self, proj, npoints, nlons, nlats, lons, lats):
@@ -102,18 +386,29 @@ class ConfProj(SurfexGeo):
         proj4 = "+proj=lcc +lat_0=" + str(self.xlat0) + " +lon_0=" + str(self.xlon0) + " +lat_1=" + \
                 str(self.xlat0) + " +lat_2=" + str(self.xlat0) + " +units=m +no_defs +R=" + str(earth)
 
-        proj = Proj(proj4)
+        proj = get_projection(proj4)
         xloncen, xlatcen = proj(self.xloncen, self.xlatcen)
-        x0 = xloncen - (0.5 * (float(self.nimax) - 1.) * self.xdx)
-        y0 = xlatcen - (0.5 * (float(self.njmax) - 1.) * self.xdy)
-        x = np.arange(x0, x0 + (self.nimax * self.xdx), self.xdx)
-        y = np.arange(y0, y0 + (self.njmax * self.xdy), self.xdy)
-        xv, yv = np.meshgrid(x, y)
-        lons, lats = proj(xv, yv, inverse=True)
+        self.x0 = xloncen - (0.5 * (float(self.nimax) - 1.) * self.xdx)
+        self.y0 = xlatcen - (0.5 * (float(self.njmax) - 1.) * self.xdy)
 
         npoints = self.nimax * self.njmax
-        SurfexGeo.__init__(self, proj, npoints, self.nimax, self.njmax, np.reshape(lons, [npoints], order="F"),
-                           np.reshape(lats, [npoints], order="F"))
+        SurfexGeo.__init__(self, proj, npoints, self.nimax, self.njmax, None, None)
+
+    def coordinates(self):
+        x = self.x0 + np.arange(0, self.nimax) * self.xdx
+        y = self.y0 + np.arange(0, self.njmax) * self.xdy
+        xv, yv = np.meshgrid(x, y)
+        lons, lats = self.proj(xv, yv, inverse=True)
+        return np.reshape(lons, [self.npoints], order="F"), np.reshape(lats, [self.npoints], order="F")
+
+    def first_last(self):
+        if self._lonlist is not None:
+            return Geo.first_last(self)
+        # Only the corners are needed
+        x = self.x0 + np.array([0, self.nimax - 1]) * self.xdx
+        y = self.y0 + np.array([0, self.njmax - 1]) * self.xdy
+        lons, lats = self.proj(x, y, inverse=True)
+        return lons[0], lons[1], lats[0], lats[1]
 
     def update_namelist(self, nml):
         if self.ilate is None or self.ilate is None:
@@ -171,7 +466,7 @@ class LonLatVal(SurfexGeo):
                 self.xdx = domain_dict["nam_lonlatval"]["xdx"]
                 self.xdy = domain_dict["nam_lonlatval"]["xdy"]
                 proj4 = "+proj=longlat +datum=WGS84 +no_defs +ellps=WGS84"
-                proj = Proj(proj4)
+                proj = get_projection(proj4)
                 SurfexGeo.__init__(self, proj, len(self.xx), len(self.xx), len(self.xy), np.asarray(self.xx),
                                    np.asarray(self.xy))
                 self.can_interpolate = False
@@ -262,22 +557,21 @@ class LonLatReg(SurfexGeo):
             raise KeyError
 
         proj4 = "+proj=longlat +datum=WGS84 +no_defs +ellps=WGS84"
-        proj = Proj(proj4)
-        lons = []
-        lats = []
+        proj = get_projection(proj4)
         if self.nlon == 0 or self.nlat == 0:
             raise ZeroDivisionError
 
-        dlon = (self.xlonmax - self.xlonmin) / (self.nlon - 1)
-        dlat = (self.xlatmax - self.xlatmin) / (self.nlat - 1)
-        print(dlon, dlat)
-        for j in range(0, self.nlat):
-            for i in range(0, self.nlon):
-                lons.append(self.xlonmin + i * dlon)
-                lats.append(self.xlatmin + j * dlat)
+        self.dlon = (self.xlonmax - self.xlonmin) / (self.nlon - 1)
+        self.dlat = (self.xlatmax - self.xlatmin) / (self.nlat - 1)
+        print(self.dlon, self.dlat)
 
         # proj, npoints, nlons, nlats, lons, lats
-        SurfexGeo.__init__(self, proj, self.nlon * self.nlat, self.nlon, self.nlat, np.asarray(lons), np.asarray(lats))
+        SurfexGeo.__init__(self, proj, self.nlon * self.nlat, self.nlon, self.nlat, None, None)
+
+    def coordinates(self):
+        lons = self.xlonmin + np.tile(np.arange(0, self.nlon) * self.dlon, self.nlat)
+        lats = self.xlatmin + np.repeat(np.arange(0, self.nlat) * self.dlat, self.nlon)
+        return lons, lats
 
     def update_namelist(self, nml):
         nml.update({
@@ -297,7 +591,16 @@ class LonLatReg(SurfexGeo):
 
 
 class IGN(SurfexGeo):
-    def __init__(self, from_json, recreate=False):
+    def __init__(self, from_json, recreate=False, cache_dir=None):
+        """
+        The coordinates and the mask derived from the points are cached as .surfex_ign_*.npy files in
+        cache_dir, so they are only computed once for a domain.
+
+        Arguments:
+            from_json (dict): Domain definition
+            recreate (bool): Do not use cached coordinates and mask
+            cache_dir (str): Directory for the cached files. The system temporary directory if None
+        """
         self.cgrid = "IGN"
         domain_dict = surfex.namelist.lower_case_namelist_dict(from_json)
 
@@ -332,135 +635,139 @@ class IGN(SurfexGeo):
         else:
             raise NotImplementedError
 
-        proj = Proj(proj4)
+        proj = get_projection(proj4)
 
-        pxall = self.get_coord(self.xx, self.xdx, "x", recreate)
-        pyall = self.get_coord(self.xy, self.xdy, "y", recreate)
-        self.mask = self.ign_mask(pxall, pyall, self.xx, self.xy, recreate)
+        pxall = self.get_coord(self.xx, self.xdx, "x", recreate, cache_dir=cache_dir)
+        pyall = self.get_coord(self.xy, self.xdy, "y", recreate, cache_dir=cache_dir)
+        self.mask = self.ign_mask(pxall, pyall, self.xx, self.xy, recreate, cache_dir=cache_dir)
 
         # proj, npoints, nlons, nlats, lons, lats
-        lons = []
-        lats = []
-        for i in range(0, npoints):
-            # lon, lat = xy2pos(i * self.xdx, j * self.xdy)
-            lon, lat = proj(self.xx[i], self.xy[i], inverse=True)
-            print(self.xx[i], self.xy[i], lon, lat)
-            lons.append(lon)
-            lats.append(lat)
-
-        SurfexGeo.__init__(self, proj, npoints, npoints, npoints, np.asarray(lons), np.asarray(lats))
+        SurfexGeo.__init__(self, proj, npoints, npoints, npoints, None, None)
         self.can_interpolate = False
 
+    def coordinates(self):
+        lons, lats = self.proj(np.asarray(self.xx[0:self.npoints], dtype=float),
+                               np.asarray(self.xy[0:self.npoints], dtype=float), inverse=True)
+        return np.asarray(lons), np.asarray(lats)
+
     @staticmethod
-    def get_coord(pin, pdin, coord, recreate=False):
+    def cache_file(name, arrays, cache_dir=None):
+        """
+        Cache file for values derived from the domain definition. The file name is a hash of the input values
+        so different domains never share a cached file.
+
+        Arguments:
+            name (str): Name of the cached values
+            arrays (list): Input values the cached values are derived from
+            cache_dir (str): Directory for the file. The system temporary directory if None
+
+        Returns:
+            str: File name
+        """
+        if cache_dir is None:
+            cache_dir = tempfile.gettempdir()
+        sha = hashlib.sha256()
+        for values in arrays:
+            values = np.asarray(values, dtype=float)
+            sha.update(str(values.shape).encode())
+            sha.update(values.tobytes())
+        return os.path.join(cache_dir, ".surfex_ign_" + name + "_" + sha.hexdigest() + ".npy")
 
-        pout = []
-        cache = "/tmp/." + coord + "_cached"
-        if os.path.isfile(cache) and not recreate:
-            f = open(cache)
-            cached_coord = f.read().splitlines()
-            f.close()
-            for i in range(0, len(cached_coord)):
-                pout.append(float(cached_coord[i]))
-            return pout
-
-        zdout = []
-        ksize = 0
-        if len(pin) > 0:
-            zdout.append(float(pdin[0]) / 2.)
-            pout.append(pin[0])
-            ksize = 1
-            if len(pin) > 1:
-                ksize = 2
-                pout.append(pin[0] - pdin[0])
-                zdout.append(0.)
-            if len(pin) > 2:
-                ksize = 3
-                pout.append(pin[0] + pdin[0])
-                zdout.append(0.)
-
-        # print ksize
-        for i in range(0, len(pin)):
-            for j in range(0, ksize):
-                # print i,j,len(pin),ksize,pout[j],pin[i]
-                if pout[j] == pin[i]:
-                    break
-                if j == ksize - 1:
-                    ksize = ksize + 1
-                    pout.append(pin[i])
-                    zdout.append(float(pdin[i]) / 2.)
-
-            # Mesh constrains
-            for j in range(0, ksize):
-                # print i, j, len(pin), ksize, pout[j], pin[i]
-                if pout[j] < pin[i] and (pout[j] + zdout[j]) >= (pin[i] - pdin[i]):
-                    break
-                if j == ksize - 1:
-                    ksize = ksize + 1
-                    pout.append(pin[i] - pdin[i])
-                    zdout.append(0.)
-
-            for j in range(0, ksize):
-                if pout[j] > pin[i] and (pout[j] - zdout[j]) <= (pin[i] + pdin[i]):
-                    break
-                if j == ksize - 1:
-                    ksize = ksize + 1
-                    pout.append(pin[i] + pdin[i])
-                    zdout.append(0.)
-
-        # Sort pout
-        pout = sorted(pout)
-
-        f = open(cache, "w")
-        for i in range(0, len(pout)):
-            f.write(str(pout[i]) + "\n")
-        print("Cached coordinates for : ", coord)
-        f.close()
+    @staticmethod
+    def get_coord(pin, pdin, coord, recreate=False, cache_dir=None):
 
-        return pout
+        """
+        Coordinates of the points and of the neighbour points needed on each side of them
 
-    @staticmethod
-    def ign_mask(pxall, pyall, xx, yy, recreate):
-        mask = []
+        Arguments:
+            pin (list): Coordinate of each point
+            pdin (list): Grid spacing of each point
+            coord (str): Name of the coordinate
+            recreate (bool): Do not use cached values
+            cache_dir (str): Directory for the cached values. The system temporary directory if None
 
-        cache = "/tmp/.mask"
+        Returns:
+            list: Sorted coordinates
+        """
+
+        pin = np.asarray(pin, dtype=float)
+        pdin = np.asarray(pdin, dtype=float)
+        cache = IGN.cache_file(coord, [pin, pdin], cache_dir=cache_dir)
         if os.path.isfile(cache) and not recreate:
-            f = open(cache)
-            cached_mask = f.read().splitlines()
-            f.close()
-            for i in range(0, len(cached_mask)):
-                mask.append(int(cached_mask[i]))
+            return np.load(cache).tolist()
+
+        if len(pin) == 0:
+            return []
+
+        # The points themselves with half the grid spacing
+        pout, first = np.unique(pin, return_index=True)
+        zdout = pdin[first] / 2.
+
+        # A point needs a neighbour to the left which reaches the left edge of the point
+        left = np.searchsorted(pout, pin, side="left")
+        reach = np.maximum.accumulate(pout + zdout)
+        has_left = np.zeros(len(pin), dtype=bool)
+        has_left[left > 0] = reach[left[left > 0] - 1] >= (pin - pdin)[left > 0]
+        left_ghosts = np.setdiff1d(np.unique((pin - pdin)[~has_left]), pout)
+
+        # The same to the right. Neighbours added to the left have no extent
+        pout_right = np.concatenate([pout, left_ghosts])
+        zdout_right = np.concatenate([zdout, np.zeros(len(left_ghosts))])
+        order = np.argsort(pout_right, kind="stable")
+        pout_right = pout_right[order]
+        zdout_right = zdout_right[order]
+        right = np.searchsorted(pout_right, pin, side="right")
+        reach = np.minimum.accumulate((pout_right - zdout_right)[::-1])[::-1]
+        has_right = np.zeros(len(pin), dtype=bool)
+        inside = right < len(pout_right)
+        has_right[inside] = reach[right[inside]] <= (pin + pdin)[inside]
+        right_ghosts = np.unique((pin + pdin)[~has_right])
+
+        pout = np.unique(np.concatenate([pout_right, right_ghosts]))
+
+        np.save(cache, pout)
+        print("Cached coordinates for : ", coord)
+        return pout.tolist()
 
-            if len(mask) != len(xx) or len(mask) != len(yy):
-                raise Exception("Cached mask mismatch! ", len(mask), len(xx), len(yy))
+    @staticmethod
+    def ign_mask(pxall, pyall, xx, yy, recreate, cache_dir=None):
 
-            return mask
+        """
+        Position of each point in the grid spanned by pxall and pyall, counted with y first
 
-        print("Creating mask. This takes time:")
-        count = -1
+        Arguments:
+            pxall (list): Sorted x coordinates
+            pyall (list): Sorted y coordinates
+            xx (list): x coordinate of each point
+            yy (list): y coordinate of each point
+            recreate (bool): Do not use cached values
+            cache_dir (str): Directory for the cached values. The system temporary directory if None
 
-        for i in range(0, len(pxall)):
-            for j in range(0, len(pyall)):
+        Returns:
+            list: Sorted grid positions of the points
+        """
 
-                count = count + 1
-                for k in range(0, len(xx)):
-                    if xx[k] == pxall[i] and yy[k] == pyall[j]:
-                        # print i,j,k,l,xx[k],pxall[i],yy[k],pyall[j]
-                        mask.append(count)
-                        break
+        pxall = np.asarray(pxall, dtype=float)
+        pyall = np.asarray(pyall, dtype=float)
+        xx = np.asarray(xx, dtype=float)
+        yy = np.asarray(yy, dtype=float)
 
-            print(i, "/", len(pxall))
+        cache = IGN.cache_file("mask", [pxall, pyall, xx, yy], cache_dir=cache_dir)
+        if os.path.isfile(cache) and not recreate:
+            mask = np.load(cache).tolist()
+            if len(mask) != len(xx) or len(mask) != len(yy):
+                raise Exception("Cached mask mismatch! ", len(mask), len(xx), len(yy))
+            return mask
 
-        # Cache mask for later use
-        # if len(mask) != len(xx) or len(mask) != len(yy): print "Mask mismatch! ", len(mask), len(xx), len(yy); exit(1)
-        f = open(cache, "w")
-        for i in range(0, len(mask)):
-            f.write(str(mask[i])+"\n")
+        print("Creating mask")
+        ix = np.minimum(np.searchsorted(pxall, xx), len(pxall) - 1)
+        iy = np.minimum(np.searchsorted(pyall, yy), len(pyall) - 1)
+        found = (pxall[ix] == xx) & (pyall[iy] == yy)
+        mask = np.unique(ix[found] * len(pyall) + iy[found])
 
-        # f.write("mask="+str(mask)+"\n")
+        np.save(cache, mask)
         print("Created mask: ", mask)
-        f.close()
-        return mask
+        return mask.tolist()
 
     def update_namelist(self, nml):
         nml.update({
@@ -1,6 +1,7 @@
 import numpy as np
+import copy
 import surfex
-from pyproj import Proj
+from concurrent.futures import ProcessPoolExecutor
 try:
     import eccodes
     import gribapi
@@ -27,35 +28,40 @@ class Grib(object):
         self.linear = None
         # print "Grib constructor "
 
-    def field(self, gribvar, time):
+    geography = ["bitmapPresent",
+                 "Nx",
+                 "Ny",
+                 "latitudeOfFirstGridPointInDegrees",
+                 "longitudeOfFirstGridPointInDegrees",
+                 "LoVInDegrees",
+                 "DxInMetres",
+                 "DyInMetres",
+                 "iScansNegatively",
+                 "jScansPositively",
+                 "jPointsAreConsecutive",
+                 "Latin1InDegrees",
+                 "LaDInDegrees",
+                 "Latin2InDegrees",
+                 "latitudeOfSouthernPoleInDegrees",
+                 "longitudeOfSouthernPoleInDegrees",
+                 "gridType"
+                 ]
+
+    def find_message(self, gribvar):
+        """
+        Find the first message in the file matching gribvar
 
-        if eccodes is None:
-            raise Exception("eccodes not found. Needed for reading grib files")
+        Arguments:
+            gribvar (Grib1Variable/Grib2Variable): Variable to search for
 
+        Returns:
+            gid: Handle to the message. None if not found
+            fh: Open file handle. Must be closed by the caller
         """
 
-        """
+        if eccodes is None:
+            raise Exception("eccodes not found. Needed for reading grib files")
 
-        geography = ["bitmapPresent",
-                     "Nx",
-                     "Ny",
-                     "latitudeOfFirstGridPointInDegrees",
-                     "longitudeOfFirstGridPointInDegrees",
-                     "LoVInDegrees",
-                     "DxInMetres",
-                     "DyInMetres",
-                     "iScansNegatively",
-                     "jScansPositively",
-                     "jPointsAreConsecutive",
-                     "Latin1InDegrees",
-                     "LaDInDegrees",
-                     "Latin2InDegrees",
-                     "latitudeOfSouthernPoleInDegrees",
-                     "longitudeOfSouthernPoleInDegrees",
-                     "gridType"
-                     ]
-
-        geo_out = None
         fh = open(self.fname)
         while 1:
             gid = eccodes.codes_grib_new_from_file(fh)
@@ -63,94 +69,118 @@ class Grib(object):
             if gid is None:
                 print("\nCould not find key")
                 gribvar.print_keys()
-                fh.close()
-                return None
+                return None, fh
             else:
-                # print("\n Next key")
-                # print_grib_id(gid)
                 if gribvar.matches(gid):
-                    # print("Found key")
-                    # gribvar.print_keys()
-
-                    geo = {}
-                    for key in geography:
-                        try:
-                            geo.update({key: eccodes.codes_get(gid, key)})
-                        except eccodes.CodesInternalError as err:
-                            print('Error with key="%s" : %s' % (key, err.msg))
-
-                    # print('There are %d values, average is %f, min is %f, max is %f' % (
-                    #        codes_get_size(gid, 'values'),
-                    #        codes_get(gid, 'average'),
-                    #        codes_get(gid, 'min'),
-                    #        codes_get(gid, 'max')
-                    #    ))
-
-                    if geo["gridType"].lower() == "lambert":
-                        values = eccodes.codes_get_values(gid)
-                        print(values)
-                        nx = geo["Nx"]
-                        ny = geo["Ny"]
-
-                        lon0 = geo["LoVInDegrees"]
-                        lat0 = geo["LaDInDegrees"]
-                        ll_lon = geo["longitudeOfFirstGridPointInDegrees"]
-                        ll_lat = geo["latitudeOfFirstGridPointInDegrees"]
-                        dx = geo["DxInMetres"]
-                        dy = geo["DyInMetres"]
-
-                        # TODO Check time consistency
-                        print("Hopefullly valid for time ", time)
-
-                        earth = 6.37122e+6
-                        proj4 = "+proj=lcc +lat_0=" + str(lat0) + " +lon_0=" + str(lon0) + " +lat_1=" + \
-                                str(lat0) + " +lat_2=" + str(lat0) + " +units=m +no_defs +R=" + str(earth)
-
-                        proj = Proj(proj4)
-                        x0, y0 = proj(ll_lon, ll_lat)
-                        xc = x0 + 0.5 * (nx - 1) * dx
-                        yc = y0 + 0.5 * (ny - 1) * dy
-                        lonc, latc = proj(xc, yc, inverse=True)
-                        field = np.reshape(values, [nx, ny], order="F")
-
-                        if geo_out is None:
-                            domain = {
-                                "nam_conf_proj": {
-                                    "xlon0": lon0,
-                                    "xlat0": lat0
-                                },
-                                "nam_conf_proj_grid": {
-                                    "xloncen": lonc,
-                                    "xlatcen": latc,
-                                    "nimax": nx,
-                                    "njmax": ny,
-                                    "xdx":  dx,
-                                    "xdy": dy,
-                                    "ilone": 0,
-                                    "ilate": 0
-                                }
-                            }
-                            geo_out = surfex.geo.ConfProj(domain)
-                    else:
-                        raise NotImplementedError(geo["gridType"] + " not implemented yet!")
-
-                    eccodes.codes_release(gid)
-                    fh.close()
-                    # print lons
-                    # print lats
-
-                    if geo_out is None:
-                        raise Exception("No geometry is found in file")
-
-                    return field, geo_out
+                    return gid, fh
                 eccodes.codes_release(gid)
 
-    def points(self, gribvar, geo, validtime=None, interpolation="nearest", cache=None):
+    def read_geo(self, gid, time):
+        """
+        Construct the geometry of a message from the geography keys. The values are not decoded.
+
+        Arguments:
+            gid: Handle to the message
+            time (datetime): Valid time
+
+        Returns:
+            surfex.geo.ConfProj: Geometry of the message
+        """
+
+        geo = {}
+        for key in self.geography:
+            try:
+                geo.update({key: eccodes.codes_get(gid, key)})
+            except eccodes.CodesInternalError as err:
+                print('Error with key="%s" : %s' % (key, err.msg))
+
+        if geo["gridType"].lower() == "lambert":
+            nx = geo["Nx"]
+            ny = geo["Ny"]
+
+            lon0 = geo["LoVInDegrees"]
+            lat0 = geo["LaDInDegrees"]
+            ll_lon = geo["longitudeOfFirstGridPointInDegrees"]
+            ll_lat = geo["latitudeOfFirstGridPointInDegrees"]
+            dx = geo["DxInMetres"]
+            dy = geo["DyInMetres"]
+
+            # TODO Check time consistency
+            print("Hopefullly valid for time ", time)
+
+            earth = 6.37122e+6
+            proj4 = "+proj=lcc +lat_0=" + str(lat0) + " +lon_0=" + str(lon0) + " +lat_1=" + \
+                    str(lat0) + " +lat_2=" + str(lat0) + " +units=m +no_defs +R=" + str(earth)
+
+            proj = surfex.geo.get_projection(proj4)
+            x0, y0 = proj(ll_lon, ll_lat)
+            xc = x0 + 0.5 * (nx - 1) * dx
+            yc = y0 + 0.5 * (ny - 1) * dy
+            lonc, latc = proj(xc, yc, inverse=True)
+
+            domain = {
+                "nam_conf_proj": {
+                    "xlon0": lon0,
+                    "xlat0": lat0
+                },
+                "nam_conf_proj_grid": {
+                    "xloncen": lonc,
+                    "xlatcen": latc,
+                    "nimax": nx,
+                    "njmax": ny,
+                    "xdx":  dx,
+                    "xdy": dy,
+                    "ilone": 0,
+                    "ilate": 0
+                }
+            }
+            geo_out = surfex.geo.ConfProj(domain)
+        else:
+            raise NotImplementedError(geo["gridType"] + " not implemented yet!")
+
+        return geo_out
+
+    def field(self, gribvar, time, window=None):
+
+        """
+        Reads a 2-D field
+
+        Arguments:
+            gribvar (Grib1Variable/Grib2Variable): Variable to read
+            time (datetime): Valid time
+            window (tuple): Index window (imin, imax, jmin, jmax). If set, a cropped view of the field is returned
+
+        Returns:
+            np.array: 2D field in (x, y) order
+            surfex.geo.ConfProj: Geometry of the full field
+
+        """
+
+        gid, fh = self.find_message(gribvar)
+        if gid is None:
+            fh.close()
+            return None
+
+        try:
+            geo_out = self.read_geo(gid, time)
+            values = eccodes.codes_get_values(gid)
+        finally:
+            eccodes.codes_release(gid)
+            fh.close()
+
+        field = np.reshape(values, [geo_out.nlons, geo_out.nlats], order="F")
+        if window is not None:
+            imin, imax, jmin, jmax = window
+            field = field[imin:imax + 1, jmin:jmax + 1]
+        return field, geo_out
+
+    def points(self, gribvar, geo, validtime=None, interpolation="nearest", cache=None, subarea=False):
 
         """
                 Reads a 2-D field and interpolates it to requested positions
 
                 Arguments:
+                    subarea (bool): Only decode the grid points needed by the nearest neighbour interpolator
 
 
                 Returns:
@@ -158,6 +188,9 @@ class Grib(object):
 
         """
 
+        if subarea and interpolation == "nearest":
+            return self.subarea_points(gribvar, geo, validtime=validtime, cache=cache)
+
         field, geo_in = self.field(gribvar, validtime)
         if interpolation == "nearest":
             surfex.util.info("Nearest neighbour", level=2)
@@ -174,6 +207,59 @@ class Grib(object):
         field = interpolator.interpolate(field)
         return field, interpolator
 
+    def subarea_points(self, gribvar, geo, validtime=None, cache=None):
+
+        """
+        Reads only the values of the grid points used by the nearest neighbour interpolator.
+        The geometry is set up from the message keys, and the needed values are decoded with
+        codes_get_double_elements instead of decoding the full field.
+
+        Returns:
+            np.array: vector with interpolated values
+            surfex.interpolation.NearestNeighbour: The interpolator
+
+        """
+
+        gid, fh = self.find_message(gribvar)
+        if gid is None:
+            fh.close()
+            return None
+
+        try:
+            geo_in = self.read_geo(gid, validtime)
+            surfex.util.info("Nearest neighbour for sub-area", level=2)
+            interpolator = surfex.interpolation.NearestNeighbour(geo_in, geo, cache=cache)
+            needed, inverse = np.unique(interpolator.flat_index(), return_inverse=True)
+            values = eccodes.codes_get_double_elements(gid, "values", needed.tolist())
+        finally:
+            eccodes.codes_release(gid)
+            fh.close()
+
+        field = np.asarray(values)[inverse]
+        return field, interpolator
+
+    def setup_interpolator(self, gribvar, geo, cache=None):
+
+        """
+        Set up the nearest neighbour interpolator for gribvar from the message keys without decoding values
+
+        Returns:
+            surfex.interpolation.NearestNeighbour: The interpolator. None if gribvar is not found
+
+        """
+
+        gid, fh = self.find_message(gribvar)
+        if gid is None:
+            fh.close()
+            return None
+
+        try:
+            geo_in = self.read_geo(gid, None)
+        finally:
+            eccodes.codes_release(gid)
+            fh.close()
+        return surfex.interpolation.NearestNeighbour(geo_in, geo, cache=cache)
+
 
 class Grib1Variable(object):
     def __init__(self, par, typ, level, tri):
@@ -270,6 +356,89 @@ class Grib2Variable(object):
         print("typeOfStatisticalProcessing:", self.typeOfStatisticalProcessing)
 
 
+# Built lazily in each worker process by the first task it runs
+_worker_cache = None
+
+
+def _worker_interpolators(cache):
+    """
+    The nearest neighbour interpolators in cache without the coordinates of the input grid.
+    The workers only need the indices, so the input grid is not sent with each task.
+
+    Arguments:
+        cache (surfex.Cache): Cache with interpolators
+
+    Returns:
+        dict: Interpolators in the layout of cache.interpolators
+    """
+
+    interpolators = {}
+    if "nearest" in cache.interpolators:
+        interpolators.update({"nearest": {}})
+        for identifier_out in cache.interpolators["nearest"]:
+            interpolators["nearest"].update({identifier_out: {}})
+            for identifier_in in cache.interpolators["nearest"][identifier_out]:
+                interpolator = copy.copy(cache.interpolators["nearest"][identifier_out][identifier_in])
+                interpolator.var_lons = None
+                interpolator.var_lats = None
+                interpolator.distances = None
+                interpolators["nearest"][identifier_out].update({identifier_in: interpolator})
+    return interpolators
+
+
+def _read_points_worker(fname, gribvar, validtime, interpolation, subarea, geo, interpolators):
+    global _worker_cache
+    if _worker_cache is None:
+        _worker_cache = surfex.cache.Cache(False, 0)
+        _worker_cache.interpolators = interpolators
+    field, interpolator = Grib(fname).points(gribvar, geo, validtime=validtime, interpolation=interpolation,
+                                             cache=_worker_cache, subarea=subarea)
+    return np.asarray(field, dtype=np.float32)
+
+
+def read_points_parallel(reads, geo, interpolation="nearest", cache=None, max_workers=None, subarea=False):
+
+    """
+    Decode and interpolate GRIB fields from several files in a process pool
+
+    The interpolator is set up once in the parent process. Its indices are passed with each task, and a worker
+    seeds its own cache with them the first time it runs, so the workers do not need to set up their own.
+
+    Arguments:
+        reads (list): (filename, gribvar, validtime) for each field to read
+        geo (surfex.Geo): Geometry to interpolate to
+        interpolation (str): Interpolation type
+        cache (surfex.Cache): Cache with interpolators to seed the workers with
+        max_workers (int): Number of processes. Default is the number of processors
+        subarea (bool): Only decode the grid points needed by the nearest neighbour interpolator
+
+    Returns:
+        list: The reads sorted by valid time
+        list: np.float32 arrays with interpolated values for each read
+
+    """
+
+    reads = sorted(reads, key=lambda read: read[2])
+    if cache is None:
+        cache = surfex.cache.Cache(False, 0)
+    if len(reads) == 0:
+        return reads, []
+
+    if interpolation == "nearest":
+        fname, gribvar, validtime = reads[0]
+        Grib(fname).setup_interpolator(gribvar, geo, cache=cache)
+    interpolators = _worker_interpolators(cache)
+
+    surfex.util.info("Reading " + str(len(reads)) + " grib fields in parallel")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for fname, gribvar, validtime in reads:
+            futures.append(executor.submit(_read_points_worker, fname, gribvar, validtime, interpolation, subarea,
+                                           geo, interpolators))
+        fields = [future.result() for future in futures]
+    return reads, fields
+
+
 def print_grib_id(gid):
     if eccodes is None:
         raise Exception("eccodes not found. Needed for reading grib files")
@@ -67,8 +67,6 @@ class Interpolation(object):
 class NearestNeighbour(Interpolation):
 
     def __init__(self, geo_in, geo_out, cache=None, distance_check=True,  distance_limit=3):
-        from scipy.interpolate import NearestNDInterpolator
-
         if not geo_in.can_interpolate:
             raise Exception("The input geometry can not be interpolated")
 
@@ -102,33 +100,17 @@ class NearestNeighbour(Interpolation):
             lons_vec = np.reshape(var_lons, dim_x * dim_y)
             lats_vec = np.reshape(var_lats, dim_x * dim_y)
 
-            points = np.empty([dim_x * dim_y, 2])
-            points[:, 0] = lons_vec
-            points[:, 1] = lats_vec
-
             values_vec = np.arange(dim_x * dim_y)
             x = np.floor_divide(values_vec, dim_y)
             y = np.mod(values_vec, dim_y)
 
-            # extract subdomain for faster interpolation
-            llv = (np.min(interpolated_lons) - 1, np.min(interpolated_lats) - 1)
-            urv = (np.max(interpolated_lons) + 1, np.max(interpolated_lats) + 1)
-            test1 = points > llv
-            test2 = points < urv
-            subdom = test1[:, 0] * test1[:, 1] * test2[:, 0] * test2[:, 1]
-
             surfex.util.info("Interpolating..." + str(len(interpolated_lons)) + " points")
-            # nn = NearestNDInterpolator(points[subdom, :], values_vec[subdom])
-
-            nn = NearestNDInterpolator(points[:, :], values_vec[:])
+            ii, self.distances = geo_in.spatial_index().nearest(interpolated_lons, interpolated_lats)
             surfex.util.info("Interpolation finished")
 
-            # print(interpolated_lons, interpolated_lats)
-            ii = nn(interpolated_lons, interpolated_lats)
             i = x[ii]
             j = y[ii]
 
-            self.distances = self.distance(interpolated_lons, interpolated_lats, lons_vec[ii], lats_vec[ii])
             # Set max distance as sanity
             if distance_check:
                 if len(lons_vec) > 1 and len(lats_vec) > 1:
@@ -150,8 +132,35 @@ class NearestNeighbour(Interpolation):
             if cache is not None:
                 cache.update_interpolator("nearest", geo_in, geo_out, self)
 
-    def interpolate(self, field2d):
-        ind_n = self.index[:, 1] * field2d.shape[0] + self.index[:, 0]
+    def flat_index(self):
+        """
+        Returns:
+            np.array: Fortran ordered flat indices of the input grid points used for each output point
+        """
+        return self.index[:, 1] * self.nx + self.index[:, 0]
+
+    def index_window(self):
+        """
+        Returns:
+            tuple: Index window (imin, imax, jmin, jmax) of the input grid points used
+        """
+        imin, jmin = self.index.min(axis=0)
+        imax, jmax = self.index.max(axis=0)
+        return int(imin), int(imax), int(jmin), int(jmax)
+
+    def interpolate(self, field2d, window=None):
+        """
+        Arguments:
+            field2d (np.array): 2D field in (x, y) order
+            window (tuple): Index window (imin, imax, jmin, jmax) if field2d only covers a part of the input grid
+
+        Returns:
+            np.array: Interpolated values
+        """
+        index = self.index
+        if window is not None:
+            index = index - [window[0], window[2]]
+        ind_n = index[:, 1] * field2d.shape[0] + index[:, 0]
         interpolated_field = field2d.flatten(order='F')[ind_n]
         return interpolated_field
 
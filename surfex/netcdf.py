@@ -13,6 +13,7 @@ class Netcdf(object):
         self.filename = filename
         print(filename)
         self.file = netCDF4.Dataset(filename, "r")
+        self.variables = {}
 
     def num_height(self, field):
         pass
@@ -34,8 +35,8 @@ class Netcdf(object):
             levels (list): Height index. If None, return all.
             members (list): Ensemble index. If None, return all.
             times (list): Time index. If None, return all.
-            xcoords: X-axis coordinates to subset
-            ycoords: Y-axis coordinates to subset
+            xcoords (tuple): Index window (imin, imax) along the x-axis to read. If None, read all.
+            ycoords (tuple): Index window (jmin, jmax) along the y-axis to read. If None, read all.
             deaccumulate (bool): Deaccumulate field
             instantanious (float): Scaling factor to make an accumulated value as instantanius
             units (str): CF unit for the variable to be read
@@ -45,84 +46,43 @@ class Netcdf(object):
          np.array: 5D array with values
         """
 
-        var = NetCDFFileVariable(self.file, var_name)
-        if xcoords is not None or ycoords is not None:
-            raise Exception("Subsetting of the input dimensions not implemented yet!")
+        var = self.variable(var_name)
 
         surfex.util.info("Reading variable "+var.var_name, level=1)
-        times_to_read = []
-        prev_time_steps = []
         if times is None:
-            for i in range(0, var.times.shape[0]):
-                times_to_read.append(i)
-                if i > 0:
-                    prev_time_steps.append(i-1)
-                else:
-                    prev_time_steps.append(0)
+            times_to_read = np.arange(var.times.shape[0])
         else:
             if not isinstance(times, (list, tuple)):
                 raise Exception("Times must be a list!")
             if isinstance(times[0], date):
                 surfex.util.info("Time provided in call as datetime objects", level=2)
-                times_in_var = var.datetimes
-                for i in range(0, len(times_in_var)):
-                    print(i, times_in_var[i], times)
-                    for j in range(0, len(times)):
-                        # Time steps requested
-                        print(times_in_var[i], times[j])
-                        if times_in_var[i] == times[j]:
-                            times_to_read.append(i)
-                            if i > 0:
-                                prev_time_steps.append(i-1)
-                            else:
-                                prev_time_steps.append(0)
-
+                times_to_read = np.nonzero(np.isin(var.datetime64, np.array(times, dtype="datetime64[s]")))[0]
             else:
-                times_in_var = var.times
-                for i in range(0, times_in_var.shape[0]):
-                    for j in range(0, len(times)):
-                        # Time steps requested
-                        if i == times[j]:
-                            times_to_read.append(times[j])
-                            if i > 0:
-                                prev_time_steps.append(i-1)
-                            else:
-                                prev_time_steps.append(0)
+                times_to_read = np.nonzero(np.isin(np.arange(var.times.shape[0]), times))[0]
+        prev_time_steps = np.maximum(times_to_read - 1, 0).tolist()
+        times_to_read = times_to_read.tolist()
 
         print("times to read", times_to_read)
-        levels_to_read = []
         if levels is None:
-            for i in range(0, var.levels.shape[0]):
-                levels_to_read.append(i)
+            levels_to_read = list(range(0, var.levels.shape[0]))
         else:
             surfex.util.info("Level provided in call. lev_from_ind=" + str(lev_from_ind), level=2)
             if not isinstance(levels, (list, tuple)):
                 raise Exception("Levels must be a list!")
-            levels_in_var = var.levels
-            for i in range(0, levels_in_var.shape[0]):
-                for j in range(0, len(levels)):
-                    # print lev_from_ind,i, j, levels_in_var[i], levels[j]
-                    if lev_from_ind:
-                        if i == levels[j]:
-                            levels_to_read.append(i)
-                    else:
-                        # NB! Round number to avoid round off when matching
-                        if round(float(levels_in_var[i]), 5) == round(float(levels[j]), 5):
-                            levels_to_read.append(i)
-
-        members_to_read = []
+            if lev_from_ind:
+                levels_to_read = np.nonzero(np.isin(np.arange(var.levels.shape[0]), levels))[0].tolist()
+            else:
+                # NB! Round number to avoid round off when matching
+                levels_to_read = np.nonzero(np.isin(np.round(var.levels.astype(float), 5),
+                                                    np.round(np.asarray(levels, dtype=float), 5)))[0].tolist()
+
         if members is None:
-            for i in range(0, var.members.shape[0]):
-                members_to_read.append(i)
+            members_to_read = list(range(0, var.members.shape[0]))
         else:
             if not isinstance(members, (list, tuple)):
                 raise Exception("Members must be a list!")
             surfex.util.info("Ensemble members provided in call", level=2)
-            members_in_var = var.members
-            for i in range(0, members_in_var.shape[0]):
-                for j in range(0, len(members)):
-                    if members_in_var[i] == members[j]:
-                        members_to_read.append(i)
+            members_to_read = np.nonzero(np.isin(var.members, members))[0].tolist()
 
             if len(members_to_read) == 0:
                 raise Exception("No ensemble members found for " + var.var_name)
@@ -130,11 +90,26 @@ class Netcdf(object):
         lons = var.lons
         lats = var.lats
 
+        # Index window of the hyperslab to read
+        lon_ind = slice(0, lons.shape[0], 1)
+        lat_ind = slice(0, lats.shape[1], 1)
+        if xcoords is not None:
+            lon_ind = slice(xcoords[0], xcoords[1] + 1, 1)
+        if ycoords is not None:
+            lat_ind = slice(ycoords[0], ycoords[1] + 1, 1)
+        if xcoords is not None or ycoords is not None:
+            surfex.util.info("Subsetting to x=" + str(lon_ind) + " y=" + str(lat_ind), level=2)
+            lons = np.asarray(lons)[lon_ind, lat_ind]
+            lats = np.asarray(lats)[lon_ind, lat_ind]
+
         # Dimensions of the "problem"
         dim_x = lons.shape[0]
         dim_y = lats.shape[1]
 
-        geo = surfex.geo.Geo(dim_x * dim_y, dim_x, dim_y, lons, lats)
+        if xcoords is None and ycoords is None:
+            geo = var.geo
+        else:
+            geo = surfex.geo.Geo(dim_x * dim_y, dim_x, dim_y, lons, lats)
 
         dim_t = max(len(times_to_read), 1)
         dim_levels = max(len(levels_to_read), 1)
@@ -144,8 +119,6 @@ class Netcdf(object):
         surfex.util.info(str(dim_x) + " " + str(dim_y) + " " + str(dim_t) + " " + str(dim_levels) + " " +
                          str(dim_members), level=3)
 
-        lon_ind = slice(0, dim_x, 1)
-        lat_ind = slice(0, dim_y, 1)
         dims = []
         prev_dims = []
         types = var.axis_types
@@ -160,8 +133,8 @@ class Netcdf(object):
                 prev_dims.append(lat_ind)
                 mapping[1] = i
             elif types[i] == Axis.Time:
-                dims.append(times_to_read)
-                prev_dims.append(prev_time_steps)
+                dims.append(self.hyperslab(times_to_read))
+                prev_dims.append(self.hyperslab(prev_time_steps))
                 mapping[2] = i
             elif var.is_level(types[i]):
                 dims.append(levels_to_read)
@@ -181,16 +154,16 @@ class Netcdf(object):
         print(var.var_name)
         print(dims)
         print(self.file[var.var_name])
-        field = self.file[var.var_name][dims]
+        field = self.file[var.var_name][tuple(dims)]
         if units is not None:
-            field = cfunits.Units.conform(field, cfunits.Units(var.units), cfunits.Units(units))
+            field = unit_converter(var.units, units).convert(field)
 
         # Deaccumulation
         if deaccumulate:
             original_field = field
-            previous_field = self.file[var.var_name][prev_dims]
+            previous_field = self.file[var.var_name][tuple(prev_dims)]
             if units is not None:
-                previous_field = cfunits.Units.conform(previous_field, cfunits.Units(var.units), cfunits.Units(units))
+                previous_field = unit_converter(var.units, units).convert(previous_field)
             field = np.subtract(original_field, previous_field)
 
         # Create instantanious values
@@ -217,7 +190,68 @@ class Netcdf(object):
         surfex.util.info("Shape of output: "+str(field.shape), level=2)
         return field, geo
 
-    def field(self, var_name, level=None, member=None, validtime=None,  units=None):
+    @staticmethod
+    def hyperslab(indices):
+
+        """
+        Make a slice of a sorted list of consecutive indices so they are read as one contiguous hyperslab
+
+        Arguments:
+            indices (list): Indices to read
+
+        Returns:
+            slice or list: A slice if the indices are consecutive, else the indices
+        """
+
+        if len(indices) > 1 and np.all(np.diff(indices) == 1):
+            return slice(indices[0], indices[-1] + 1, 1)
+        return indices
+
+    def read_geo(self, var_name):
+
+        """
+        Set up the geometry of a variable without reading any values
+
+        Arguments:
+            var_name (str): Name of field
+
+        Returns:
+            surfex.geo.Geo: Geometry of the full field
+
+        """
+
+        return self.variable(var_name).geo
+
+    def variable(self, var_name):
+
+        """
+        Metadata of a variable. Set up once per file handle.
+
+        Arguments:
+            var_name (str): Name of field
+
+        Returns:
+            NetCDFFileVariable: Variable with cached metadata
+
+        """
+
+        if var_name not in self.variables:
+            self.variables.update({var_name: NetCDFFileVariable(self.file, var_name)})
+        return self.variables[var_name]
+
+    def field(self, var_name, level=None, member=None, validtime=None,  units=None, window=None):
+
+        """
+        Reads a 2-D field
+
+        Arguments:
+            window (tuple): Index window (imin, imax, jmin, jmax). If set, only this hyperslab is read
+
+        Returns:
+            np.array: 2D field in (x, y) order
+            surfex.geo.Geo: Geometry of the field read
+
+        """
 
         if validtime is None:
             validtime = []
@@ -226,19 +260,27 @@ class Netcdf(object):
         else:
             validtime = [validtime]
 
+        xcoords = None
+        ycoords = None
+        if window is not None:
+            xcoords = window[0:2]
+            ycoords = window[2:4]
+
         print(level, member, validtime)
-        field, geo_in = self.slice(var_name, levels=level, members=member, times=validtime, units=units)
+        field, geo_in = self.slice(var_name, levels=level, members=member, times=validtime, units=units,
+                                   xcoords=xcoords, ycoords=ycoords)
         # Reshape to fortran 2D style
         field = np.reshape(field, [geo_in.nlons, geo_in.nlats], order="F")
         return field, geo_in
 
     def points(self, var_name, geo, level=None, member=None, validtime=None,  units=None, interpolation="nearest",
-               cache=None):
+               cache=None, subarea=False):
 
         """
         Assembles a 5D slice and interpolates it to requested positions
 
         Arguments:
+            subarea (bool): Only read the hyperslab covering the grid points used by the nearest neighbour interpolator
 
 
         Returns:
@@ -246,10 +288,65 @@ class Netcdf(object):
 
         """
 
+        if subarea and interpolation == "nearest":
+            return self.subarea_points(var_name, geo, level=level, member=member, validtime=validtime, units=units,
+                                       cache=cache)
+
         # field4d, geo_in = self.slice(var_name, levels=level, members=member, times=validtime, units=units)
         # field2d = np.transpose(np.reshape(field4d, [geo_in.nlons, geo_in.nlats], order="F"))
         print(level, member, validtime)
         field, geo_in = self.field(var_name, level=level, member=member, validtime=validtime, units=units)
+        interpolator = self.setup_interpolator(geo_in, geo, interpolation=interpolation, cache=cache)
+        field = interpolator.interpolate(field)
+        return field, interpolator
+
+    def points_block(self, var_name, geo, validtimes, level=None, member=None, units=None, interpolation="nearest",
+                     cache=None, subarea=False):
+
+        """
+        Reads several time steps in one hyperslab and interpolates them to requested positions
+
+        Arguments:
+            validtimes (list): Valid times to read
+            subarea (bool): Only read the hyperslab covering the grid points used by the nearest neighbour interpolator
+
+        Returns:
+            np.array: 2D array with interpolated values in order time,pos
+            surfex.interpolation.Interpolation: The interpolator
+
+        """
+
+        validtimes = sorted(validtimes)
+        interpolator = None
+        window = None
+        xcoords = None
+        ycoords = None
+        if subarea and interpolation == "nearest":
+            interpolator = surfex.interpolation.NearestNeighbour(self.read_geo(var_name), geo, cache=cache)
+            window = interpolator.index_window()
+            xcoords = window[0:2]
+            ycoords = window[2:4]
+
+        field, geo_in = self.slice(var_name, levels=level, members=member, times=validtimes, units=units,
+                                   xcoords=xcoords, ycoords=ycoords)
+        if field.shape[2] != len(validtimes):
+            raise Exception("Found " + str(field.shape[2]) + " of " + str(len(validtimes)) + " time steps of " +
+                            var_name + " in " + self.filename)
+
+        if interpolator is None:
+            interpolator = self.setup_interpolator(geo_in, geo, interpolation=interpolation, cache=cache)
+
+        fields = np.empty([len(validtimes), geo.npoints])
+        for i in range(0, len(validtimes)):
+            field2d = field[:, :, i, 0, 0]
+            if window is None:
+                fields[i, :] = interpolator.interpolate(field2d)
+            else:
+                fields[i, :] = interpolator.interpolate(field2d, window=window)
+        return fields, interpolator
+
+    @staticmethod
+    def setup_interpolator(geo_in, geo, interpolation="nearest", cache=None):
         if interpolation == "nearest":
             surfex.util.info("Nearest neighbour", level=2)
             interpolator = surfex.interpolation.NearestNeighbour(geo_in, geo, cache=cache)
@@ -261,8 +358,27 @@ class Netcdf(object):
             interpolator = surfex.interpolation.NoInterpolation(geo_in, geo, cache=cache)
         else:
             raise NotImplementedError("Interpolation type " + interpolation + " not implemented!")
+        return interpolator
 
-        field = interpolator.interpolate(field)
+    def subarea_points(self, var_name, geo, level=None, member=None, validtime=None, units=None, cache=None):
+
+        """
+        Reads only the hyperslab covering the grid points used by the nearest neighbour interpolator.
+        The interpolator is set up on the full geometry, so a cached interpolator is re-used as is.
+
+        Returns:
+            np.array: vector with interpolated values
+            surfex.interpolation.NearestNeighbour: The interpolator
+
+        """
+
+        geo_in = self.read_geo(var_name)
+        surfex.util.info("Nearest neighbour for sub-area", level=2)
+        interpolator = surfex.interpolation.NearestNeighbour(geo_in, geo, cache=cache)
+        window = interpolator.index_window()
+        field, geo_window = self.field(var_name, level=level, member=member, validtime=validtime, units=units,
+                                       window=window)
+        field = interpolator.interpolate(field, window=window)
         return field, interpolator
 
 
@@ -285,9 +401,14 @@ class NetCDFFileVariable(object):
     def __init__(self, fh, var_name):
         self.file = fh
         self.var_name = var_name
+        # Metadata read from the file. Set up at first use
+        self.metadata = {}
 
     @property
     def axis_types(self):
+        if "axis_types" in self.metadata:
+            return self.metadata["axis_types"]
+
         types = []
         if self.var_name not in self.file.variables:
             raise Exception(self.var_name + " is missing in file!")
@@ -316,6 +437,7 @@ class NetCDFFileVariable(object):
                     types.append(Axis.Time)
                 else:
                     types.append(Axis.Undefined)
+        self.metadata.update({"axis_types": types})
         return types
 
     @property
@@ -340,20 +462,24 @@ class NetCDFFileVariable(object):
            np.array: 2D array of latitudes
         """
 
+        if "lats" in self.metadata:
+            return self.metadata["lats"]
+
         latvals = np.array([])
         axis_types = self.axis_types
         for i in range(0, len(axis_types)):
             if axis_types[i] == Axis.Lat:
-                latvals = self.file.variables[self.dim_names[i]]
+                latvals = np.asarray(self.file.variables[self.dim_names[i]][:])
                 surfex.util.warning("Assumed to 2D in (lon,lat) order")
             elif axis_types[i] == Axis.GeoY:
                 # TODO: if lat/lon are 1D, create a 2D mesh
                 # TODO: Assume the name for now. Must be found in attributes
-                latvals = self.file.variables["latitude"]
+                latvals = np.asarray(self.file.variables["latitude"][:])
                 latvals = np.transpose(latvals, (1, 0))
 
         if latvals.shape[0] == 0:
             raise Exception("No latitude found for " + self.var_name)
+        self.metadata.update({"lats": latvals})
         return latvals
 
     @property
@@ -363,45 +489,73 @@ class NetCDFFileVariable(object):
            np.array: 2D array of longitudes
         """
 
+        if "lons" in self.metadata:
+            return self.metadata["lons"]
+
         lonvals = np.array([])
         axis_types = self.axis_types
         for i in range(0, len(axis_types)):
             if axis_types[i] == Axis.Lon:
-                lonvals = self.file.variables[self.dim_names[i]]
+                lonvals = np.asarray(self.file.variables[self.dim_names[i]][:])
             elif axis_types[i] == Axis.GeoX:
                 # TODO: if lat/lon are 1D, create a 2D mesh
                 # TODO: Assume the name for now. Must be found in attributes
-                lonvals = self.file.variables["longitude"]
+                lonvals = np.asarray(self.file.variables["longitude"][:])
                 lonvals = np.transpose(lonvals, (1, 0))
 
         if lonvals.shape[0] == 0:
             raise Exception("No longitude found for " + self.var_name)
+        self.metadata.update({"lons": lonvals})
         return lonvals
 
     @property
-    def datetimes(self):
+    def geo(self):
+        """
+        Returns:
+           surfex.geo.Geo: Geometry of the variable
+        """
+
+        if "geo" not in self.metadata:
+            lons = self.lons
+            lats = self.lats
+            dim_x = lons.shape[0]
+            dim_y = lats.shape[1]
+            self.metadata.update({"geo": surfex.geo.Geo(dim_x * dim_y, dim_x, dim_y, lons, lats)})
+        return self.metadata["geo"]
+
+    @property
+    def datetime64(self):
         """
             Return:
-            list()
+            np.array: 1D array of valid times as datetime64
         """
 
-        times = []
+        if "datetime64" in self.metadata:
+            return self.metadata["datetime64"]
+
+        times = np.array([], dtype="datetime64[s]")
         axis_types = self.axis_types
         for i in range(0, len(axis_types)):
             if axis_types[i] == Axis.Time:
                 val = self.file.variables[self.dim_names[i]]
-                for t in range(0, len(val)):
-                    epochtime = int(cfunits.Units.conform(val[t], cfunits.Units(val.units),
-                                                          cfunits.Units("seconds since 1970-01-01 00:00:00")))
-                    print(epochtime)
-                    dt = datetime.utcfromtimestamp(epochtime)
-                    print(dt)
-                    times.append(dt)
-
-        if len(times) == 0:
+                epochtimes = unit_converter(val.units, "seconds since 1970-01-01 00:00:00").convert(
+                    np.asarray(val[:], dtype=float))
+                times = np.round(epochtimes).astype("int64").astype("datetime64[s]")
+
+        if times.shape[0] == 0:
             surfex.util.info("No time found for " + self.var_name, level=2)
+        self.metadata.update({"datetime64": times})
         return times
 
+    @property
+    def datetimes(self):
+        """
+            Return:
+            list()
+        """
+
+        return self.datetime64.astype(datetime).tolist()
+
     @property
     def times(self):
         """
@@ -409,14 +563,18 @@ class NetCDFFileVariable(object):
             np.array: 1D array of times
         """
 
+        if "times" in self.metadata:
+            return self.metadata["times"]
+
         times = np.array([])
         axis_types = self.axis_types
         for i in range(0, len(axis_types)):
             if axis_types[i] == Axis.Time:
-                times = self.file.variables[self.dim_names[i]]
+                times = np.asarray(self.file.variables[self.dim_names[i]][:])
 
         if times.shape[0] == 0:
             surfex.util.info("No time found for "+self.var_name, level=2)
+        self.metadata.update({"times": times})
         return times
 
     @property
@@ -426,14 +584,18 @@ class NetCDFFileVariable(object):
             np.array: 1D array of ensemble members
         """
 
+        if "members" in self.metadata:
+            return self.metadata["members"]
+
         members = np.array([])
         axis_types = self.axis_types
         for i in range(0, len(axis_types)):
             if axis_types[i] == Axis.Realization:
-                members = self.file.variables[self.dim_names[i]]
+                members = np.asarray(self.file.variables[self.dim_names[i]][:])
 
         if members.shape[0] == 0:
             surfex.util.info("No ensemble members found for " + self.var_name, level=2)
+        self.metadata.update({"members": members})
         return members
 
     @property
@@ -443,14 +605,18 @@ class NetCDFFileVariable(object):
             np.array: 1D array of levels
         """
 
+        if "levels" in self.metadata:
+            return self.metadata["levels"]
+
         levels = np.array([])
         axis_types = self.axis_types
         for i in range(0, len(axis_types)):
             if self.is_level(axis_types[i]):
-                levels = self.file.variables[self.dim_names[i]]
+                levels = np.asarray(self.file.variables[self.dim_names[i]][:])
 
         if levels.shape[0] == 0:
             surfex.util.info("No levels found for " + self.var_name, level=2)
+        self.metadata.update({"levels": levels})
         return levels
 
     @staticmethod
@@ -461,6 +627,84 @@ class NetCDFFileVariable(object):
             return False
 
 
+class UnitConverter(object):
+
+    """
+    Conversion between two CF units. Affine conversions are resolved once with cfunits into a scale
+    and an offset, other conversions are done by cfunits.
+    """
+
+    def __init__(self, from_units, to_units):
+        self.from_units = from_units
+        self.to_units = to_units
+        self.scale = None
+        self.offset = None
+        self.identity = False
+
+        from_cf = cfunits.Units(from_units)
+        to_cf = cfunits.Units(to_units)
+        if from_cf.equals(to_cf):
+            self.identity = True
+        else:
+            test_values = np.array([0., 1., -40., 273.15, 1000.])
+            converted = np.asarray(cfunits.Units.conform(test_values, from_cf, to_cf), dtype=float)
+            offset = converted[0]
+            scale = converted[1] - converted[0]
+            if np.allclose(converted, scale * test_values + offset, rtol=1e-12, atol=0.):
+                self.scale = scale
+                self.offset = offset
+            else:
+                surfex.util.info("Conversion from " + from_units + " to " + to_units + " is not affine", level=2)
+
+    def convert(self, field):
+
+        """
+        Convert field. Floating point arrays are converted in place.
+
+        Arguments:
+            field (np.array): Values in from_units
+
+        Returns:
+            np.array: Values in to_units
+        """
+
+        if self.identity:
+            return field
+        if self.scale is None:
+            return cfunits.Units.conform(field, cfunits.Units(self.from_units), cfunits.Units(self.to_units))
+
+        if isinstance(field, np.ndarray) and np.issubdtype(field.dtype, np.floating):
+            if self.scale != 1.:
+                field *= field.dtype.type(self.scale)
+            if self.offset != 0.:
+                field += field.dtype.type(self.offset)
+            return field
+        else:
+            return field * self.scale + self.offset
+
+
+_unit_converters = {}
+
+
+def unit_converter(from_units, to_units):
+
+    """
+    Get a cached converter between two CF units
+
+    Arguments:
+        from_units (str): Units of the values
+        to_units (str): Units to convert to
+
+    Returns:
+        UnitConverter: The converter
+    """
+
+    key = (from_units, to_units)
+    if key not in _unit_converters:
+        _unit_converters.update({key: UnitConverter(from_units, to_units)})
+    return _unit_converters[key]
+
+
 def create_netcdf_first_guess_template(my_variables, my_nx, my_ny, fname="raw.nc"):
 
     if os.path.exists(fname):
@@ -527,8 +771,9 @@ def read_first_guess_netcdf_file(input_file, var):
     lons = fh["longitude"][:]
     lats = fh["latitude"][:]
 
-    validtime = int(cfunits.Units.conform(fh["time"][:], cfunits.Units(fh["time"].units),
-                    cfunits.Units("seconds since 1970-01-01 00:00:00")))
+    validtime = unit_converter(fh["time"].units, "seconds since 1970-01-01 00:00:00").convert(
+        np.asarray(fh["time"][:], dtype=float))
+    validtime = int(validtime[0])
     validtime = datetime.fromtimestamp(validtime)
 
 
@@ -4,6 +4,10 @@ import numpy as np
 import surfex
 from datetime import datetime, timedelta
 import json
+import hashlib
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 
 class Observation(object):
@@ -60,28 +64,256 @@ class Observation(object):
     @staticmethod
     def get_stid_from_stationlist(stationlist, lons, lats):
 
-        index_pos = {}
         ids_from_file = json.load(open(stationlist, "r"))
-        for stid in ids_from_file:
-            lon = ids_from_file[stid]["lon"]
-            lat = ids_from_file[stid]["lat"]
-            pos = Observation.format_lon(lon) + ":" + Observation.format_lat(lat)
-            index_pos.update({pos: stid})
+        station_ids = list(ids_from_file.keys())
+        station_lons = [ids_from_file[stid]["lon"] for stid in station_ids]
+        station_lats = [ids_from_file[stid]["lat"] for stid in station_ids]
 
         stids = []
+        if len(station_ids) == 0:
+            return ["NA"] * len(lons)
+        index = surfex.geo.SpatialIndex(station_lons, station_lats).match(lons, lats)
         for i in range(0, len(lons)):
-            lon = lons[i]
-            lat = lats[i]
-            pos = Observation.format_lon(lon) + ":" + Observation.format_lat(lat)
-            if pos in index_pos:
-                stids.append(index_pos[pos])
+            if index[i] >= 0:
+                stids.append(station_ids[index[i]])
             else:
                 stids.append("NA")
         return stids
 
 
-def get_datasources(obs_time, settings):
+class ObservationColumns(object):
+    """
+    Observations stored column wise as typed numpy arrays. Slicing gives views of the columns, while
+    masks and index arrays give copies like for any numpy array.
+    """
+
+    columns = ["obstimes", "lons", "lats", "stids", "elevs", "values", "varnames"]
+
+    def __init__(self, obstimes, lons, lats, values, elevs=None, stids=None, varnames=None):
+        """
+        Arguments:
+            obstimes (list): Observation times as datetime or np.datetime64
+            lons (np.array): Longitudes
+            lats (np.array): Latitudes
+            values (np.array): Observed values
+            elevs (np.array): Elevations. Default missing
+            stids (list): Station identifiers. Default "NA"
+            varnames (list): Variable names. Default None
+        """
+        self.obstimes = np.asarray(obstimes, dtype="datetime64[s]")
+        self.lons = np.asarray(lons, dtype=float)
+        self.lats = np.asarray(lats, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+        size = self.lons.shape[0]
+        if elevs is None:
+            elevs = np.full(size, np.nan)
+        self.elevs = np.asarray(elevs, dtype=float)
+        if stids is None:
+            stids = np.full(size, "NA", dtype=object)
+        self.stids = np.asarray(stids, dtype=object)
+        if varnames is None:
+            varnames = np.full(size, None, dtype=object)
+        self.varnames = np.asarray(varnames, dtype=object)
+
+        for column in self.columns:
+            if getattr(self, column).shape != (size,):
+                raise Exception("Column " + column + " has shape " + str(getattr(self, column).shape) +
+                                " but expected (" + str(size) + ",)")
+
+    def __len__(self):
+        return self.lons.shape[0]
+
+    def __getitem__(self, key):
+        """
+        Arguments:
+            key (slice, np.array): Slice, boolean mask or index array
+
+        Returns:
+            ObservationColumns: The selected observations
+        """
+        return ObservationColumns(self.obstimes[key], self.lons[key], self.lats[key], self.values[key],
+                                  elevs=self.elevs[key], stids=self.stids[key], varnames=self.varnames[key])
+
+    @staticmethod
+    def concatenate(columns):
+        """
+        Arguments:
+            columns (list): List of ObservationColumns
+
+        Returns:
+            ObservationColumns: All observations in the order given
+        """
+        if len(columns) == 0:
+            return ObservationColumns([], [], [], [])
+        return ObservationColumns(np.concatenate([c.obstimes for c in columns]),
+                                  np.concatenate([c.lons for c in columns]),
+                                  np.concatenate([c.lats for c in columns]),
+                                  np.concatenate([c.values for c in columns]),
+                                  elevs=np.concatenate([c.elevs for c in columns]),
+                                  stids=np.concatenate([c.stids for c in columns]),
+                                  varnames=np.concatenate([c.varnames for c in columns]))
+
+    @staticmethod
+    def from_observations(observations):
+        """
+        Arguments:
+            observations (list): List of Observation objects
+
+        Returns:
+            ObservationColumns: The observations as columns
+        """
+        return ObservationColumns([o.obstime for o in observations], [o.lon for o in observations],
+                                  [o.lat for o in observations], [o.value for o in observations],
+                                  elevs=[o.elev for o in observations], stids=[o.stid for o in observations],
+                                  varnames=[o.varname for o in observations])
+
+    @staticmethod
+    def from_arrays(arrays):
+        """
+        Arguments:
+            arrays (dict): Array for each column
+
+        Returns:
+            ObservationColumns: The observations as columns
+        """
+        return ObservationColumns(arrays["obstimes"], arrays["lons"], arrays["lats"], arrays["values"],
+                                  elevs=arrays["elevs"], stids=arrays["stids"], varnames=arrays["varnames"])
+
+    def arrays(self):
+        """
+        Returns:
+            dict: Array for each column
+        """
+        return dict([(column, getattr(self, column)) for column in self.columns])
+
+    def observations(self):
+        """
+        Returns:
+            list: The observations as a list of Observation objects
+        """
+        obstimes, lons, lats, stids, elevs, values, varnames = self.to_lists()
+        return [Observation(obstimes[i], lons[i], lats[i], values[i], elev=elevs[i], stid=stids[i],
+                            varname=varnames[i]) for i in range(0, len(lons))]
+
+    def to_lists(self):
+        """
+        Returns:
+            tuple: Lists of times, lons, lats, stids, elevs, values and varnames
+        """
+        return tuple([getattr(self, column).tolist() for column in self.columns])
+
+    def index(self):
+        """
+        Returns:
+            tuple: Dicts from formatted positions and from station identifiers to the last observation index
+        """
+        pos = ["{:10.5f}:{:10.5f}".format(lon, lat) for lon, lat in zip(self.lons.tolist(), self.lats.tolist())]
+        index_pos = dict(zip(pos, range(0, len(pos))))
+        index_stid = {}
+        for p, stid in enumerate(self.stids.tolist()):
+            stid = str(stid)
+            if stid != "NA":
+                index_stid[stid] = p
+        return index_pos, index_stid
+
+
+class ObservationCache(object):
+    """
+    Decoded observations of input files stored as npz sidecars in a cache directory. A sidecar is identified by
+    the path, size and modification time of the input file, so a changed file is decoded again.
+    """
+
+    def __init__(self, directory):
+        """
+        Arguments:
+            directory (str): Directory for the sidecars
+        """
+        self.directory = directory
+
+    def sidecar(self, filename, reader):
+        """
+        Arguments:
+            filename (str): Input file
+            reader (str): Reader and the settings that change what is decoded
+
+        Returns:
+            str: Sidecar file name
+        """
+        stat = os.stat(filename)
+        sha = hashlib.sha256()
+        sha.update((os.path.abspath(filename) + ":" + str(stat.st_size) + ":" + str(stat.st_mtime_ns) + ":" +
+                    reader).encode())
+        return os.path.join(self.directory, os.path.basename(filename) + "." + sha.hexdigest()[0:16] + ".npz")
+
+    def load(self, filename, reader):
+        """
+        Arguments:
+            filename (str): Input file
+            reader (str): Reader and the settings that change what is decoded
+
+        Returns:
+            dict: The decoded arrays. None if the file has no sidecar
+        """
+        sidecar = self.sidecar(filename, reader)
+        if not os.path.exists(sidecar):
+            return None
+        print("Using decoded observations from " + sidecar)
+        arrays = {}
+        with np.load(sidecar, allow_pickle=False) as data:
+            for key in data.files:
+                values = data[key]
+                if values.dtype.kind == "U":
+                    values = values.astype(object)
+                arrays.update({key: values})
+        return arrays
+
+    def save(self, filename, reader, arrays):
+        """
+        Arguments:
+            filename (str): Input file
+            reader (str): Reader and the settings that change what is decoded
+            arrays (dict): The decoded arrays
+        """
+        sidecar = self.sidecar(filename, reader)
+        print("Saving decoded observations to " + sidecar)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        values = {}
+        for key in arrays:
+            value = np.asarray(arrays[key])
+            if value.dtype == object:
+                value = value.astype(str)
+            values.update({key: value})
+        # Write to a temporary file first, so readers never see a partly written sidecar
+        tmp_file = sidecar + "." + str(os.getpid()) + ".tmp.npz"
+        np.savez(tmp_file, **values)
+        os.replace(tmp_file, sidecar)
+
+
+def get_datasources(obs_time, settings, cache_dir=None):
+    """
+    Arguments:
+        obs_time (datetime): Observation time
+        settings (dict): Settings for each observation set
+        cache_dir (str): Directory with observation sidecars for sets without the cache_dir setting
+
+    Returns:
+        list: Observation sets
+    """
     datasources = []
+
+    # Bufr files are decoded once for the variables of all the sets using them
+    bufr_variables = {}
+    bufr_decoded = {}
+    for obs_set in settings:
+        if "filetype" in settings[obs_set] and settings[obs_set]["filetype"].lower() == "bufr":
+            if "filepattern" in settings[obs_set] and "varname" in settings[obs_set]:
+                filename = surfex.file.parse_filepattern(settings[obs_set]["filepattern"], obs_time, obs_time)
+                if filename not in bufr_variables:
+                    bufr_variables.update({filename: []})
+                if settings[obs_set]["varname"] not in bufr_variables[filename]:
+                    bufr_variables[filename].append(settings[obs_set]["varname"])
+
     for obs_set in settings:
 
         if "filetype" in settings[obs_set]:
@@ -92,6 +324,10 @@ def get_datasources(obs_time, settings):
 
             validtime = obs_time
 
+            set_cache_dir = cache_dir
+            if "cache_dir" in settings[obs_set]:
+                set_cache_dir = settings[obs_set]["cache_dir"]
+
             if filetype.lower() == "bufr":
                 filename = surfex.file.parse_filepattern(filepattern, obs_time, validtime)
                 if "varname" in settings[obs_set]:
@@ -108,9 +344,16 @@ def get_datasources(obs_time, settings):
 
                 valid_range = timedelta(seconds=3600)
                 if os.path.exists(filename):
+                    key = filename + ":" + str(lonrange) + ":" + str(latrange)
+                    if key not in bufr_decoded:
+                        bufr_decoded.update({key: surfex.bufr.read_bufr(filename, bufr_variables[filename], obs_time,
+                                                                        valid_range, lonrange=lonrange,
+                                                                        latrange=latrange,
+                                                                        cache_dir=set_cache_dir)})
                     datasources.append(surfex.bufr.BufrObservationSet(filename, [varname], obs_time,
                                                                       valid_range, lonrange=lonrange,
-                                                                      latrange=latrange, label=obs_set))
+                                                                      latrange=latrange, label=obs_set,
+                                                                      decoded=bufr_decoded[key]))
                 else:
                     print("WARNING: filename " + filename + " not set. Not added.")
 
@@ -130,10 +373,15 @@ def get_datasources(obs_time, settings):
                 if "latrange" in settings[obs_set]:
                     latrange = settings[obs_set]["latrange"]
 
+                max_workers = None
+                if "max_workers" in settings[obs_set]:
+                    max_workers = settings[obs_set]["max_workers"]
+
                 if filenames is not None:
                     datasources.append(NetatmoObservationSet(filenames, variable, obs_time,
                                                              dt=3600, label=obs_set, lonrange=lonrange,
-                                                             latrange=latrange))
+                                                             latrange=latrange, max_workers=max_workers,
+                                                             cache_dir=set_cache_dir))
                 else:
                     print("WARNING: filenames not set. Not added.")
 
@@ -142,7 +390,18 @@ def get_datasources(obs_time, settings):
                     varname = settings[obs_set]["varname"]
                 else:
                     raise Exception("You must set variable name")
-                datasources.append(MetFrostObservations(varname, validtime=obs_time))
+                base_url = "https://frost.met.no"
+                if "base_url" in settings[obs_set]:
+                    base_url = settings[obs_set]["base_url"]
+                max_workers = 4
+                if "max_workers" in settings[obs_set]:
+                    max_workers = settings[obs_set]["max_workers"]
+                chunk_size = 50
+                if "chunk_size" in settings[obs_set]:
+                    chunk_size = settings[obs_set]["chunk_size"]
+                datasources.append(MetFrostObservations(varname, validtime=obs_time, label=obs_set,
+                                                        base_url=base_url, max_workers=max_workers,
+                                                        cache_dir=set_cache_dir, chunk_size=chunk_size))
             elif filetype.lower() == "json":
                 filename = surfex.file.parse_filepattern(filepattern, obs_time, validtime)
                 varname = None
@@ -150,7 +409,8 @@ def get_datasources(obs_time, settings):
                     varname = settings[obs_set]["varname"]
 
                 if os.path.exists(filename):
-                    datasources.append(JsonObservationSet(filename, label=obs_set, var=varname))
+                    datasources.append(JsonObservationSet(filename, label=obs_set, var=varname,
+                                                          cache_dir=set_cache_dir))
                 else:
                     print("WARNING: filename " + filename + " not existing. Not added.")
             else:
@@ -162,11 +422,23 @@ def get_datasources(obs_time, settings):
 
 class ObservationSet(object):
     def __init__(self, observations, label=""):
-        self.observations = observations
-        self.size = len(self.observations)
+        """
+        Arguments:
+            observations (list, ObservationColumns): Observation objects or observation columns
+            label (str): Label of the set
+        """
+        if not isinstance(observations, ObservationColumns):
+            observations = ObservationColumns.from_observations(observations)
+        self.columns = observations
+        self.size = len(self.columns)
         self.label = label
         self.index_pos = {}
         self.index_stid = {}
+        self._spatial_index = None
+
+    @property
+    def observations(self):
+        return self.columns.observations()
 
     def get_stid_index(self, stid):
         stid = str(stid)
@@ -185,32 +457,19 @@ class ObservationSet(object):
             return None
 
     def get_obs(self):
-        obs2vectors = np.vectorize(Observation.obs2vectors)
-        print("Obs dim", len(self.observations))
-        if len(self.observations) > 0:
-            times, lons, lats, stids, elevs, values, varnames = obs2vectors(self.observations)
-
-            for p in range(0, len(lons)):
-                lon = surfex.Observation.format_lon(lons[p])
-                lat = surfex.Observation.format_lat(lats[p])
-                stid = str(stids[p])
-
-                pos = lon + ":" + lat
-                self.index_pos.update({pos: p})
-                if stid != "NA":
-                    self.index_stid.update({stid: p})
-
-            times = times.tolist()
-            lons = lons.tolist()
-            lats = lats.tolist()
-            stids = stids.tolist()
-            elevs = elevs.tolist()
-            values = values.tolist()
-            varnames = varnames.tolist()
-
-            return times, lons, lats, stids, elevs, values, varnames
-        else:
-            return [], [], [], [], [], [], []
+        print("Obs dim", self.size)
+        if self.size > 0 and len(self.index_pos) == 0:
+            self.index_pos, self.index_stid = self.columns.index()
+        return self.columns.to_lists()
+
+    def spatial_index(self):
+        """
+        Returns:
+            surfex.geo.SpatialIndex: Spatial index of the observation positions. Set up the first time it is used
+        """
+        if self._spatial_index is None:
+            self._spatial_index = surfex.geo.SpatialIndex(self.columns.lons, self.columns.lats)
+        return self._spatial_index
 
     def matching_obs(self, my_obs):
         found = False
@@ -230,15 +489,12 @@ class ObservationSet(object):
         my_stids = []
         times, lons, lats, stids, elevs, values, varnames = self.get_obs()
 
+        index = np.full(geo.nlons, -1)
+        if len(lons) > 0:
+            index = self.spatial_index().match(geo.lonlist[0:geo.nlons], geo.latlist[0:geo.nlons])
         for i in range(0, geo.nlons):
-            lon = geo.lonlist[i]
-            lat = geo.latlist[i]
-            pos = surfex.Observation.format_lon(lon) + ":" + surfex.Observation.format_lat(lat)
-
-            lons.append(lon)
-            lats.append(lat)
-            if pos in self.index_pos:
-                ind = self.index_pos[pos]
+            if index[i] >= 0:
+                ind = index[i]
 
                 my_times.append(times[ind])
                 my_stids.append(stids[ind])
@@ -247,14 +503,15 @@ class ObservationSet(object):
                 my_times.append(None)
                 my_stids.append("NA")
                 my_values.append(np.nan)
+                pos = surfex.Observation.format_lon(geo.lonlist[i]) + ":" + \
+                    surfex.Observation.format_lat(geo.latlist[i])
                 print("Could not find position " + pos + " in this data source")
 
         my_values = np.asanyarray(my_values)
         return my_times, my_values, my_stids
 
     def write_json_file(self, filename, indent=None):
-        obs2vectors = np.vectorize(Observation.obs2vectors)
-        obstimes, lons, lats, stids, elevs, values, varnames = obs2vectors(self.observations)
+        obstimes, lons, lats, stids, elevs, values, varnames = self.columns.to_lists()
         data = {}
         for o in range(0, len(lons)):
             data.update({o: {
@@ -272,9 +529,150 @@ class ObservationSet(object):
             json.dump(data, open(filename, "w"), indent=indent)
 
 
+def netatmo_records(filename, chunk_size=16 * 1024 * 1024):
+    """
+    Stream the station records of a netatmo file
+
+    The raw data is not valid JSON, since it is missing commas between lists
+    e.g. [...][...][...] or between records {...}{...}. The records are decoded one by one while skipping
+    the brackets and commas between them, so the repaired text is never built.
+
+    Arguments:
+        filename (str): Netatmo file
+        chunk_size (int): Number of characters read at a time
+
+    Returns:
+        generator: Dicts with the station records
+
+    """
+    decoder = json.JSONDecoder()
+    separators = " \t\r\n[],"
+    with open(filename, "r") as ifile:
+        buffer = ""
+        pos = 0
+        eof = False
+        while True:
+            while pos < len(buffer) and buffer[pos] in separators:
+                pos = pos + 1
+            if pos < len(buffer):
+                try:
+                    record, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    # Incomplete record at the end of the buffer
+                    end = None
+                if end is not None and (end < len(buffer) or eof):
+                    pos = end
+                    yield record
+                    continue
+            elif eof:
+                return
+
+            chunk = ifile.read(chunk_size)
+            eof = len(chunk) == 0
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+
+def _read_netatmo_file(filename, variable, debug, cache_dir=None):
+    """
+    Read all records for variable in one netatmo file into arrays. Used by the process pool.
+
+    Arguments:
+        filename (str): Netatmo file
+        variable (str): Netatmo variable name
+        debug (bool): Print the number of records
+        cache_dir (str): Directory with observation sidecars. Not used if None
+
+    Returns:
+        dict: Arrays with id, time, lon, lat, elev, whether the record has an altitude and value for each record,
+              and counters. None if the file could not be parsed
+
+    """
+    cache = None
+    if cache_dir is not None:
+        cache = ObservationCache(cache_dir)
+        arrays = cache.load(filename, "netatmo:" + variable)
+        if arrays is not None:
+            return arrays
+
+    ids = []
+    times = []
+    lons = []
+    lats = []
+    elevs = []
+    has_altitude = []
+    values = []
+    counters = {"records": 0, "missing_metadata": 0, "missing_obs": 0, "missing_time": 0, "missing_elev": 0}
+    try:
+        for line in netatmo_records(filename):
+            counters["records"] += 1
+            if "data" in line and "_id" in line and "location" in line:
+                curr_data = line["data"]
+                if variable in curr_data:
+                    if "time_utc" in curr_data:
+                        if "altitude" not in line:
+                            counters["missing_elev"] += 1
+
+                        ids.append(line["_id"])
+                        times.append(curr_data["time_utc"])
+                        lons.append(line["location"][0])
+                        lats.append(line["location"][1])
+                        elevs.append(line.get("altitude", np.nan))
+                        has_altitude.append("altitude" in line)
+                        values.append(curr_data[variable])
+                    else:
+                        counters["missing_time"] += 1
+                else:
+                    counters["missing_obs"] += 1
+            else:
+                counters["missing_metadata"] += 1
+    except Exception as e:
+        print(e)
+        print("Could not parse %s" % filename)
+        return None
+
+    if counters["records"] == 0:
+        # Sometimes netatmo files are empty
+        print("Empty file: %s" % filename)
+    elif debug:
+        print("Parsing %d stations in %s" % (counters["records"], filename))
+
+    arrays = {
+        "ids": np.array(ids, dtype=object),
+        "times": np.array(times, dtype=np.int64),
+        "lons": np.array(lons, dtype=float),
+        "lats": np.array(lats, dtype=float),
+        "elevs": np.array(elevs, dtype=float),
+        "has_altitude": np.array(has_altitude, dtype=bool),
+        "values": np.array(values, dtype=float)
+    }
+    for counter in counters:
+        arrays.update({counter: np.array(counters[counter])})
+    if cache is not None:
+        cache.save(filename, "netatmo:" + variable, arrays)
+    return arrays
+
+
 class NetatmoObservationSet(ObservationSet):
     def __init__(self, filenames, variable, target_time, dt=3600, debug=True, re=True,
-                 lonrange=None, latrange=None, label=""):
+                 lonrange=None, latrange=None, label="", max_workers=None, cache_dir=None):
+        """
+        Arguments:
+            filenames (list): Netatmo files
+            variable (str): Netatmo variable name
+            target_time (datetime): The observation closest to this time is used for each station
+            dt (int): Maximum time difference in seconds
+            debug (bool): Print statistics
+            re (bool): Remove records without elevation
+            lonrange (list): Longitude range
+            latrange (list): Latitude range
+            label (str): Label of the set
+            max_workers (int): Parse the files in a process pool with this number of processes.
+                               The files are parsed serially if None
+            cache_dir (str): Directory with observation sidecars. The files are parsed every time if None
+        """
 
         if lonrange is None:
             lonrange = [-180, 180]
@@ -288,115 +686,78 @@ class NetatmoObservationSet(ObservationSet):
             if type(latrange) is not list and len(lonrange) != 2:
                 raise Exception("Latrange must be a list with length 2")
 
-        data = dict()  # key: id, value: list of values
-        times = dict()  # key: id, value: list of times
-        metadata = dict()
-
-        """
-        Parse json data
-
-        The raw data is not valid JSON, since it is missing commas between lists
-        e.g. [...][...][...]. Instead format it like this: [..., ..., ...]
-        """
-
-        # target_time = int(target_time.total_seconds())
-
-        observations = []
-        num_missing_metadata = 0
-        num_missing_obs = 0
-        num_missing_time = 0
-        num_missing_elev = 0
+        if max_workers is None or len(filenames) < 2:
+            files = [_read_netatmo_file(ifilename, variable, debug, cache_dir=cache_dir) for ifilename in filenames]
+        else:
+            surfex.util.info("Parsing " + str(len(filenames)) + " netatmo files in parallel")
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(_read_netatmo_file, ifilename, variable, debug, cache_dir=cache_dir)
+                           for ifilename in filenames]
+                files = [future.result() for future in futures]
+        files = [f for f in files if f is not None]
+
+        num_missing_metadata = int(sum([f["missing_metadata"] for f in files]))
+        num_missing_obs = int(sum([f["missing_obs"] for f in files]))
+        num_missing_time = int(sum([f["missing_time"] for f in files]))
+        num_missing_elev = int(sum([f["missing_elev"] for f in files]))
         num_wrong_time = 0
-        for ifilename in filenames:
-            ifile = open(ifilename, 'r')
-            text = ifile.read()
-            ifile.close()
-
-            try:
-                # Older files had an additional bug. This code will work for both cases
-                if len(text) == 0:
-                    # Sometimes netatmo files are empty
-                    print("Empty file: %s" % ifilename)
-                    continue
-
-                if text[0] == "{":
-                    text = "[%s" % text
 
-                text = text.replace('}]{', '}{')
-                text = text.replace('}][{', '},{')
-                text = text.replace('}{', '},{')
-                text = '{"data": %s}' % text
-                raw = json.loads(text)
-                raw = raw["data"]
-                if debug:
-                    print("Parsing %d stations in %s" % (len(raw), ifilename))
-            except Exception as e:
-                print(e)
-                print("Could not parse %s" % ifilename)
-                continue
-
-            for line in raw:
-                if "data" in line and "_id" in line and "location" in line:
-                    my_id = line["_id"]
-                    location = line["location"]
-                    curr_data = line["data"]
-                    # print(curr_data)
-                    if variable in curr_data:
-                        if "time_utc" in curr_data:
-                            time_utc = curr_data["time_utc"]
-
-                            """
-                            Record this observation if it is closer to the target time than any other
-                            previously parsed observation for this location. Also, only record if the
-                            time difference is within acceptable limits.
-                            """
-
-                            if "altitude" not in line:
-                                num_missing_elev += 1
-
-                            if not re or "altitude" in line:
-                                lon = location[0]
-                                lat = location[1]
-                                if lonrange[0] <= lon <= lonrange[1]:
-                                    if latrange[0] <= lat <= latrange[1]:
-                                        if my_id not in data:
-                                            data[my_id] = list()
-                                            times[my_id] = list()
-
-                                            elev = np.nan
-                                            metadata[my_id] = {"lon": lon, "lat": lat, "elev": elev}
-                                        if np.isnan(metadata[my_id]["elev"]) and "altitude" in line:
-                                            metadata[my_id]["elev"] = line["altitude"]
-
-                                        value = curr_data[variable]
-                                        if variable == "Temperature":
-                                            value = value + 273.15
-                                        if variable == "Humidity":
-                                            value = value * 0.01
-                                        data[my_id] += [value]
-                                        times[my_id] += [time_utc]
-                        else:
-                            num_missing_time += 1
-                    else:
-                        num_missing_obs += 1
-                else:
-                    num_missing_metadata += 1
+        ids = np.concatenate([np.empty(0, dtype=object)] + [f["ids"] for f in files])
+        times = np.concatenate([np.empty(0, dtype=np.int64)] + [f["times"] for f in files])
+        lons = np.concatenate([np.empty(0)] + [f["lons"] for f in files])
+        lats = np.concatenate([np.empty(0)] + [f["lats"] for f in files])
+        elevs = np.concatenate([np.empty(0)] + [f["elevs"] for f in files])
+        has_altitude = np.concatenate([np.empty(0, dtype=bool)] + [f["has_altitude"] for f in files])
+        values = np.concatenate([np.empty(0)] + [f["values"] for f in files])
+
+        keep = (lonrange[0] <= lons) & (lons <= lonrange[1]) & (latrange[0] <= lats) & (lats <= latrange[1])
+        if re:
+            keep = keep & has_altitude
+        ids = ids[keep]
+        times = times[keep]
+        lons = lons[keep]
+        lats = lats[keep]
+        elevs = elevs[keep]
+        values = values[keep]
+
+        if variable == "Temperature":
+            values = values + 273.15
+        if variable == "Humidity":
+            values = values * 0.01
+
+        # Stations in the order they first appear. Position and elevation are taken from the first record
+        # of the station and the first record of the station with an elevation
+        unique_ids, first, station = np.unique(ids.astype(str), return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty(len(order), dtype=int)
+        rank[order] = np.arange(len(order))
+        station = rank[station.reshape(-1)]
+        first = first[order]
+        nstations = len(first)
+
+        station_elevs = np.full(nstations, np.nan)
+        has_elev = np.where(~np.isnan(elevs))[0]
+        elev_stations, first_elev = np.unique(station[has_elev], return_index=True)
+        station_elevs[elev_stations] = elevs[has_elev[first_elev]]
 
         if target_time is not None:
-            num_valid_stations = 0
-            for my_id, time in times.items():
-                this_diff_times = [(datetime.utcfromtimestamp(t) - target_time).total_seconds() for t in time]
-                curr_times = [datetime.utcfromtimestamp(t) for t in time]
-                # print(this_diff_times, target_time, np.min(np.abs(np.array(this_diff_times))), dt)
-                if np.min(np.abs(np.array(this_diff_times))) < dt:
-                    ibest = int(np.argmin(np.abs(np.array(this_diff_times))))
-                    curr_time = curr_times[ibest]
-                    elev = metadata[my_id]["elev"]
-                    observations.append(Observation(curr_time, metadata[my_id]["lon"], metadata[my_id]["lat"],
-                                                    data[my_id][ibest], elev=elev))
-                    num_valid_stations += 1
+            target = (target_time - datetime(1970, 1, 1)).total_seconds()
+            diff = np.abs(times - target)
+
+            # Record closest to the target time for each station. The first record wins ties
+            closest = np.lexsort((np.arange(len(diff)), diff, station))
+            closest = closest[np.diff(station[closest], prepend=-1) != 0]
+            valid = diff[closest] < dt
+            closest = closest[valid]
+            valid_stations = station[closest]
+            num_valid_stations = len(closest)
+
+            observations = ObservationColumns(times[closest].astype("datetime64[s]"), lons[first[valid_stations]],
+                                              lats[first[valid_stations]], values[closest],
+                                              elevs=station_elevs[valid_stations])
         else:
-            num_valid_stations = len(data)
+            num_valid_stations = nstations
+            observations = ObservationColumns([], [], [], [])
 
         if debug:
             print("Found %d valid observations:" % num_valid_stations)
@@ -459,241 +820,355 @@ class MetKlappObservations(ObservationSet):
         ObservationSet.__init__(self, observations, label="kdvh")
 
 
+class FrostClient(object):
+    """
+    Client for the frost API. Requests for chunks of stations are sent concurrently from a thread pool.
+    The sources catalogue and the observation responses can be cached on disk.
+    """
+
+    def __init__(self, client_id, base_url="https://frost.met.no", num_tries=3, max_workers=4, cache_dir=None,
+                 sources_ttl=86400, timeout=30):
+        """
+        Arguments:
+            client_id (str): Frost client ID
+            base_url (str): URL of the frost server
+            num_tries (int): Number of tries for each request
+            max_workers (int): Maximum number of concurrent requests
+            cache_dir (str): Directory to cache responses in. Nothing is cached if None
+            sources_ttl (int): Seconds before the cached sources catalogue is downloaded again
+            timeout (int): Timeout in seconds for each request
+        """
+        self.client_id = client_id
+        self.base_url = base_url.rstrip("/")
+        self.num_tries = num_tries
+        self.max_workers = max_workers
+        self.cache_dir = cache_dir
+        self.sources_ttl = sources_ttl
+        self.timeout = timeout
+
+    def get(self, endpoint, parameters):
+        """
+        Arguments:
+            endpoint (str): Endpoint like observations/v0.jsonld
+            parameters (dict): Request parameters
+
+        Returns:
+            list: The data in the response. Empty if no data was found
+
+        """
+        tries = 1
+        while tries <= self.num_tries:
+            tries += 1
+            r = requests.get(self.base_url + "/" + endpoint, parameters, auth=(self.client_id, ''),
+                             timeout=self.timeout)
+            if r.status_code == 200:
+                return r.json()['data']
+            if r.status_code == 404:
+                print('STATUS: No data was found for the list of query Ids.')
+                return []
+        raise Exception('ERROR: could not retrieve observations.')
+
+    def cache_file(self, name, endpoint, parameters):
+        sha = hashlib.sha256()
+        sha.update((self.base_url + "/" + endpoint + ":" + json.dumps(parameters, sort_keys=True)).encode())
+        return os.path.join(self.cache_dir, "frost_" + name + "_" + sha.hexdigest()[0:16] + ".json")
+
+    def cached_get(self, name, endpoint, parameters, ttl=None):
+        """
+        Arguments:
+            name (str): Name of the cached responses
+            endpoint (str): Endpoint like observations/v0.jsonld
+            parameters (dict): Request parameters
+            ttl (int): Seconds before a cached response is downloaded again. Never if None
+
+        Returns:
+            list: The data in the response. Empty if no data was found
+
+        """
+        if self.cache_dir is None:
+            return self.get(endpoint, parameters)
+
+        cache_file = self.cache_file(name, endpoint, parameters)
+        if os.path.exists(cache_file):
+            if ttl is None or time.time() - os.path.getmtime(cache_file) < ttl:
+                with open(cache_file, "r") as fh:
+                    return json.load(fh)
+
+        data = self.get(endpoint, parameters)
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = cache_file + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        with open(tmp_file, "w") as fh:
+            json.dump(data, fh)
+        os.replace(tmp_file, cache_file)
+        return data
+
+    def sources(self):
+        """
+        Returns:
+            list: The sources catalogue for sensor systems
+
+        """
+        parameters = {'types': 'SensorSystem', 'fields': 'id,geometry,masl,wmoid,stationholders'}
+        return self.cached_get("sources", "sources/v0.jsonld", parameters, ttl=self.sources_ttl)
+
+    def observations(self, ids, elements, referencetime=None, level=None, chunk_size=50):
+        """
+        Arguments:
+            ids (list): Source IDs
+            elements (str): Frost element names
+            referencetime (datetime): Reference time. The latest observations are used if None
+            level (int): Level of the elements
+            chunk_size (int): Number of sources in each request
+
+        Returns:
+            list: The data in the responses for all the chunks
+
+        """
+        chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+        parameters = []
+        for chunk in chunks:
+            chunk_parameters = {'sources': ','.join(chunk), 'elements': elements}
+            if referencetime is not None:
+                chunk_parameters['referencetime'] = referencetime.strftime("%Y-%m-%dT%H")
+            else:
+                chunk_parameters['referencetime'] = 'latest'
+                chunk_parameters['maxage'] = 'PT30M'
+                chunk_parameters['limit'] = 1
+            if level is not None:
+                chunk_parameters['levels'] = str(level)
+            parameters.append(chunk_parameters)
+
+        def get_chunk(chunk_parameters):
+            # The latest observations change and are never cached
+            if chunk_parameters['referencetime'] == 'latest':
+                return self.get("observations/v0.jsonld", chunk_parameters)
+            return self.cached_get("observations", "observations/v0.jsonld", chunk_parameters)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            responses = list(executor.map(get_chunk, parameters))
+
+        data = []
+        for response in responses:
+            data.extend(response)
+        return data
+
+
 class MetFrostObservations(ObservationSet):
 
     def __init__(self, varname, stations=None, level=None, num_tries=3, debug=False, wmo=None,
-                 providers=None, xproviders=None, blacklist=None, validtime=None, dt=3600):
+                 providers=None, xproviders=None, blacklist=None, validtime=None, dt=3600, label="frost",
+                 base_url="https://frost.met.no", max_workers=4, cache_dir=None, sources_ttl=86400, chunk_size=50):
+        """
+        Arguments:
+            varname (str): Frost element name
+            stations (list): Only use these source IDs
+            level (int): Level of the element
+            num_tries (int): Number of tries for each request
+            debug (bool): Print why stations are thrown out
+            wmo (int): 1 to only use WMO stations, 0 to only use non-WMO stations
+            providers (str): Comma separated station holders to use
+            xproviders (str): Comma separated station holders to exclude
+            blacklist (list): Source IDs to exclude
+            validtime (datetime): Observation time. The latest observations are used if None
+            dt (int): Maximum difference in seconds between the observation time and validtime
+            label (str): Label of the set
+            base_url (str): URL of the frost server
+            max_workers (int): Maximum number of concurrent requests
+            cache_dir (str): Directory to cache responses in. Nothing is cached if None
+            sources_ttl (int): Seconds before the cached sources catalogue is downloaded again
+            chunk_size (int): Number of stations in each observation request
+        """
 
         if blacklist is None:
             blacklist = []
+        if providers is not None:
+            providers = providers.split(',')
+        if xproviders is not None:
+            xproviders = xproviders.split(',')
 
         # extract client ID from environment variable
         if 'CLIENTID' not in os.environ:
             raise KeyError('error: CLIENTID not found in environment\n')
 
-        client_id = os.environ['CLIENTID']
+        client = FrostClient(os.environ['CLIENTID'], base_url=base_url, num_tries=num_tries,
+                             max_workers=max_workers, cache_dir=cache_dir, sources_ttl=sources_ttl)
 
-        # Get all the stations (in an area or country)
+        # Get all the stations
         # Make list of station IDs and dictionary of their lat,long,elev
-        #
-        ids = []
-        tries = 1
+        data = client.sources()
+        ids = list()
         station_dict = dict()
-        while tries <= num_tries:
-            tries += 1
-            # first get all the stations within a polygon or in a country?
-            # 'geometry': 'POLYGON((10 60, 10 59, 11 60, 11 59))' # area around Oslo
-            # 'country': 'NO' # everything in Norway
-            parameters = {'types': 'SensorSystem', 'fields': 'id,geometry,masl,wmoid,stationholders'}
+        count_discard = 0
+        for i in range(len(data)):
+            my_id = data[i]['id']
+            if 'masl' in data[i]:
+                elev = data[i]['masl']
+            else:
+                elev = -999  # missing value
 
-            r = requests.get('https://frost.met.no/sources/v0.jsonld', parameters, auth=(client_id, ''),
-                             timeout=30)
+            # filter data for WMO and non WMO
+            keep_this_id = True
+            if 'wmoId' in data[i] and wmo is not None and wmo == 0:
+                # station is WMO skip
+                keep_this_id = False
+                if debug:
+                    print('throwing out this id (is WMO): ' + my_id)
+            elif 'wmoId' not in data[i] and wmo is not None and wmo == 1:
+                # station is not WMO skip
+                keep_this_id = False
+                if debug:
+                    print('throwing out this id (not WMO): ' + my_id)
 
-            # extract list of stations (if response was valid)
-            if r.status_code == 200:
-                data = r.json()['data']
-                # print(data)
-                ids = list()
-                count_discard = 0
-                for i in range(len(data)):
-                    my_id = data[i]['id']
-                    if 'masl' in data[i]:
-                        elev = data[i]['masl']
-                    else:
-                        elev = -999  # missing value
-
-                    # filter data for WMO and non WMO
-                    keep_this_id = True
-                    if 'wmoId' in data[i] and wmo is not None and wmo == 0:
-                        # station is WMO skip
-                        keep_this_id = False
-                        if debug:
-                            print('throwing out this id (is WMO): ' + my_id)
-                    elif 'wmoId' not in data[i] and wmo is not None and wmo == 1:
-                        # station is not WMO skip
-                        keep_this_id = False
-                        if debug:
-                            print('throwing out this id (not WMO): ' + my_id)
-
-                    # filter out stations with incomplete data
-                    if keep_this_id and 'geometry' not in data[i]:
-                        keep_this_id = False
-                        if debug:
-                            print('throwing out this id (no geometry): ' + my_id)
-
-                    # filters for station holders
-                    if 'stationHolders' not in data[i]:
-                        keep_this_id = False
-                        if debug:
-                            print('throwing out this id (no stationHolders): ' + my_id)
-                    # select station providers
-                    elif providers is not None:
-                        providers = providers.split(',')
-                        station_holders = data[i]['stationHolders']
-                        if not (any(x in station_holders for x in providers)):
-                            keep_this_id = False
-                            if debug:
-                                print('throwing out this id (station holder): ' + str(station_holders))
-                    # or exclude certain station providers
-                    elif xproviders is not None:
-                        xproviders = xproviders.split(',')
-                        station_holders = data[i]['stationHolders']
-                        if any(x in station_holders for x in xproviders):
-                            keep_this_id = False
-                            if debug:
-                                print('throwing out this id (exclude station holder): ' + str(station_holders))
-
-                    # filter out blacklisted stations
-                    if my_id in blacklist:
-                        keep_this_id = False
-                        if debug:
-                            print('throwing out blacklisted id: ' + my_id)
-
-                    if stations is not None:
-                        if my_id not in stations:
-                            keep_this_id = False
-                            if debug:
-                                print("Throwing out station because not in station list ", my_id)
+            # filter out stations with incomplete data
+            if keep_this_id and 'geometry' not in data[i]:
+                keep_this_id = False
+                if debug:
+                    print('throwing out this id (no geometry): ' + my_id)
 
+            # filters for station holders
+            if 'stationHolders' not in data[i]:
+                keep_this_id = False
+                if debug:
+                    print('throwing out this id (no stationHolders): ' + my_id)
+            # select station providers
+            elif providers is not None:
+                station_holders = data[i]['stationHolders']
+                if not (any(x in station_holders for x in providers)):
+                    keep_this_id = False
                     if debug:
-                        print('Keep this ID: ' + str(my_id) + ' bool: ' + str(keep_this_id))
-                    if keep_this_id:  # write into dict
-                        ids.append(my_id)
-                        # print('station: ' + str(id) + '\n' + str(data[i]))
-                        # create a dictionary for these stations to store lat,long,elev for each
-                        station_dict[my_id] = [data[i]['geometry']['coordinates'][1],
-                                               data[i]['geometry']['coordinates'][0], elev]
-                    else:
-                        count_discard = count_discard + 1
+                        print('throwing out this id (station holder): ' + str(station_holders))
+            # or exclude certain station providers
+            elif xproviders is not None:
+                station_holders = data[i]['stationHolders']
+                if any(x in station_holders for x in xproviders):
+                    keep_this_id = False
+                    if debug:
+                        print('throwing out this id (exclude station holder): ' + str(station_holders))
+
+            # filter out blacklisted stations
+            if my_id in blacklist:
+                keep_this_id = False
                 if debug:
-                    print('Number of stations: ' + str(len(ids)))
-                    print('Number of stations discarded: ' + str(count_discard))
-                    # print(station_dict)
-                break
-            if r.status_code == 404:
-                print('STATUS: No data was found for the list of query Ids.')
-                break
-            elif tries > num_tries:
-                raise Exception('ERROR: could not retrieve observations.')
+                    print('throwing out blacklisted id: ' + my_id)
+
+            if stations is not None:
+                if my_id not in stations:
+                    keep_this_id = False
+                    if debug:
+                        print("Throwing out station because not in station list ", my_id)
+
+            if debug:
+                print('Keep this ID: ' + str(my_id) + ' bool: ' + str(keep_this_id))
+            if keep_this_id:  # write into dict
+                ids.append(my_id)
+                # create a dictionary for these stations to store lat,long,elev for each
+                station_dict[my_id] = [data[i]['geometry']['coordinates'][1],
+                                       data[i]['geometry']['coordinates'][0], elev]
+            else:
+                count_discard = count_discard + 1
+        if debug:
+            print('Number of stations: ' + str(len(ids)))
+            print('Number of stations discarded: ' + str(count_discard))
 
         #
         # Use the station ID list to get the observation for each station
         #
-        ids_obs_dict = dict()  # declare outside loop, since may be more than one request
-        # check how long the list of stations is and potentially break it up to shorten
-        observations = []
-        it_ids = len(ids)
+        data = client.observations(ids, varname, referencetime=validtime, level=level, chunk_size=chunk_size)
         dt = timedelta(seconds=dt)
-        while it_ids > 0:
-            if it_ids > 50:
-                # get last 50
-                sub_id_list = ids[it_ids - 50:it_ids]
-                it_ids = it_ids - 50
+        ids_obs_dict = dict()
+        for i in range(len(data)):
+            # Check that reference time is ok, since sometimes future observations
+            # can be present when 'latest' is chosen for reference time
+            ref_time = datetime.strptime(data[i]['referenceTime'][0:19], "%Y-%m-%dT%H:%M:%S")
+            if debug:
+                print("ref_time", ref_time, "validtime", validtime)
+            if validtime is None or abs(ref_time - validtime) < dt:
+                value = data[i]['observations'][0]['value']
+                if len(str(value)) > 0:  # not all stations have observations
+                    source_id = str(data[i]['sourceId'])
+                    my_id = source_id.split(':')
+                    ids_obs_dict[my_id[0]] = [value, ref_time]
+
+        if debug:
+            print('Station list length: ' + str(len(ids)) +
+                  ', total number of observations retrieved: ' + str(len(ids_obs_dict)))
+
+        obstimes = []
+        lons = []
+        lats = []
+        stids = []
+        elevs = []
+        values = []
+        for station in ids_obs_dict:
+            value = float(ids_obs_dict[station][0])
+            if varname == "surface_snow_thickness":
+                value = value * 0.01
+            id_info = station_dict[station]
+            if validtime is None:
+                obstimes.append(ids_obs_dict[station][1])
             else:
-                # get the rest if <50
-                sub_id_list = ids[:it_ids]
-                it_ids = 0
-
-            tries = 1
-            while tries <= num_tries:
-                tries += 1
-                # use the list of stations and get the observations for those
-                parameters2 = {'sources': ','.join(sub_id_list), 'elements': varname}
-                date = validtime.strftime("%Y%m%d")
-                hour = validtime.strftime("%H")
-
-                # if have specified a date and time
-                if date is not None and hour is not None:
-                    # make these into a format that works for FROST
-                    date_string = date
-                    hour_string = hour
-                    date_string_frost = date_string[0:4] + '-' + date_string[4:6] + '-' + date_string[6:8] \
-                        + 'T' + hour_string
-                    parameters2['referencetime'] = date_string_frost
-                # do not have date and time, so use latest
-                else:
-                    parameters2['referencetime'] = 'latest'
-                    parameters2['maxage'] = 'PT30M'
-                    parameters2['limit'] = 1
-
-                if level is not None:
-                    parameters2['levels'] = str(level)
-
-                # print('Request parameters: ' + str(parameters2))
-                r = requests.get('https://frost.met.no/observations/v0.jsonld', parameters2, auth=(client_id, ''),
-                                 timeout=30)
-
-                if r.status_code == 200:
-                    data = r.json()['data']
-                    for i in range(len(data)):
-                        # Check that reference time is ok, since sometimes future observations
-                        # can be present when 'latest' is chosen for reference time
-                        ref_str = data[i]['referenceTime']
-                        ref_year = int(ref_str[0:4])
-                        ref_month = int(ref_str[5:7])
-                        ref_day = int(ref_str[8:10])
-                        ref_hour = int(ref_str[11:13])
-                        ref_min = int(ref_str[14:16])
-                        ref_sec = int(ref_str[17:19])
-                        ref_time = datetime(year=ref_year, month=ref_month, day=ref_day, hour=ref_hour, minute=ref_min,
-                                            second=ref_sec)
-                        if debug:
-                            print("ref_time", ref_time, "validtime", validtime)
-                        if abs(ref_time - validtime) < dt:
-                            value = data[i]['observations'][0]['value']
-                            if len(str(value)) > 0:  # not all stations have observations
-                                source_id = str(data[i]['sourceId'])
-                                my_id = source_id.split(':')
-                                ids_obs_dict[my_id[0]] = value
-                            # print(ids_obs_dict)
+                obstimes.append(validtime)
+            lats.append(id_info[0])
+            lons.append(id_info[1])
+            elevs.append(id_info[2])
+            stids.append(str(station)[2:])
+            values.append(value)
 
-                    if debug:
-                        print('Station list length: ' + str(len(sub_id_list)) +
-                              ', total number of observations retrieved: ' + str(len(ids_obs_dict)))
-
-                    break
-                if r.status_code == 404:
-                    print('STATUS: No data was found for the list of query Ids.')
-                    break
-                elif tries > num_tries:
-                    raise Exception('ERROR: could not retrieve observations.')
-
-            for station in ids_obs_dict:
-                value = float(ids_obs_dict[station])
-                if varname == "surface_snow_thickness":
-                    value = value * 0.01
-                id_info = station_dict[station]
-                stid = str(station)[2:]
-                lat = id_info[0]
-                lon = id_info[1]
-                elev = id_info[2]
-                observations.append(Observation(validtime, lon, lat, value, stid=str(stid), elev=elev))
-
-        ObservationSet.__init__(self, observations, label="frost")
+        ObservationSet.__init__(self, ObservationColumns(obstimes, lons, lats, values, elevs=elevs, stids=stids),
+                                label=label)
 
 
 class JsonObservationSet(ObservationSet):
-    def __init__(self, filename, label="", var=None):
+    def __init__(self, filename, label="", var=None, cache_dir=None):
+        """
+        Arguments:
+            filename (str): JSON file written by write_json_file
+            label (str): Label of the set
+            var (str): Only use observations of this variable. All observations are used if None
+            cache_dir (str): Directory with observation sidecars. The file is parsed every time if None
+        """
 
-        obs = json.load(open(filename, "r"))
-        observations = []
-        for i in range(0, len(obs)):
-            ind = str(i)
-            obstime = datetime.strptime(obs[ind]["obstime"], "%Y%m%d%H%M%S")
-            lon = obs[ind]["lon"]
-            lat = obs[ind]["lat"]
-            elev = obs[ind]["elev"]
-            value = obs[ind]["value"]
-            stid = obs[ind]["stid"]
-            varname = ""
-            if "varname" in obs[ind]:
-                varname = obs[ind]["varname"]
-
-            if varname is "" and var is not None:
-                raise Exception("Varname is not found " + varname)
-
-            if var is None or var == varname:
-                observations.append(Observation(obstime, lon, lat, value, stid=stid, elev=elev, varname=varname))
+        cache = None
+        observations = None
+        if cache_dir is not None:
+            cache = ObservationCache(cache_dir)
+            arrays = cache.load(filename, "json")
+            if arrays is not None:
+                observations = ObservationColumns.from_arrays(arrays)
+
+        if observations is None:
+            obs = json.load(open(filename, "r"))
+            obstimes = []
+            lons = []
+            lats = []
+            stids = []
+            elevs = []
+            values = []
+            varnames = []
+            for i in range(0, len(obs)):
+                ind = str(i)
+                varname = ""
+                if "varname" in obs[ind]:
+                    varname = obs[ind]["varname"]
+
+                obstimes.append(datetime.strptime(obs[ind]["obstime"], "%Y%m%d%H%M%S"))
+                lons.append(obs[ind]["lon"])
+                lats.append(obs[ind]["lat"])
+                stids.append(obs[ind]["stid"])
+                elevs.append(obs[ind]["elev"])
+                values.append(obs[ind]["value"])
+                varnames.append(varname)
+
+            observations = ObservationColumns(obstimes, lons, lats, values, elevs=elevs, stids=stids,
+                                              varnames=varnames)
+            if cache is not None:
+                cache.save(filename, "json", observations.arrays())
+
+        if var is not None:
+            if (observations.varnames == "").any():
+                raise Exception("Varname is not found ")
+            observations = observations[observations.varnames == var]
 
         ObservationSet.__init__(self, observations, label=label)
 
@@ -702,9 +1177,4 @@ class ObservationFromTitanJsonFile(ObservationSet):
     def __init__(self, an_time, filename, label=""):
 
         qc_obs = surfex.dataset_from_file(an_time, filename)
-        observations = []
-        for i in range(0, len(qc_obs)):
-            observations.append(Observation(qc_obs.obstimes[i], qc_obs.dataset.lons[i], qc_obs.dataset.lats[i],
-                                            qc_obs.dataset.elevs[i], qc_obs.dataset.value[i]))
-
-        ObservationSet.__init__(self, observations, label=label)
+        ObservationSet.__init__(self, qc_obs.columns, label=label)
@@ -2,6 +2,8 @@ import os
 import surfex
 from surfex.util import data_merge
 import copy
+import json
+import ast
 from abc import abstractmethod, ABCMeta
 import numpy as np
 try:
@@ -26,6 +28,26 @@ class ReadData(object):
     def print_info(self):
         raise NotImplementedError('users must define read_time_step to use this base class')
 
+    def read_time_steps(self, validtimes, cache):
+
+        """
+        Read several time steps
+
+        Returns:
+            np.array: Values in order time,pos
+        """
+
+        fields = np.empty([len(validtimes), self.geo.npoints])
+        for i in range(0, len(validtimes)):
+            fields[i, :] = self.read_time_step(validtimes[i], cache)
+        return fields
+
+    def prefetch(self, validtimes, cache, max_workers=None):
+        pass
+
+    def get_variables(self):
+        return []
+
 
 # Direct data can be ead with this class with converter = None
 class ConvertedInput(ReadData):
@@ -42,9 +64,18 @@ class ConvertedInput(ReadData):
         #    field[field < 0.] = 0.
         return field
 
+    def read_time_steps(self, validtimes, cache):
+        return self.converter.read_time_steps(self.geo, validtimes, cache)
+
     def print_info(self):
         self.converter.print_info()
 
+    def prefetch(self, validtimes, cache, max_workers=None):
+        self.converter.prefetch(self.geo, validtimes, cache, max_workers=max_workers)
+
+    def get_variables(self):
+        return self.converter.get_variables()
+
 
 class ConstantValue(ReadData):
 
@@ -88,24 +119,222 @@ def remove_existing_file(f_in, f_out):
 #######################################################
 
 
+class ReadPlan(object):
+    """
+    Input variables shared between the converters of a run.
+    Identical variable definitions are set up once and read once per time step.
+    """
+
+    def __init__(self):
+        self.variables = {}
+
+    def get_variable(self, fileformat, var_dict, basetime, validtime, create):
+        """
+        Return the shared variable for a definition
+
+        Arguments:
+            fileformat (str): File format
+            var_dict (dict): Merged variable definition
+            basetime (datetime): Base time
+            validtime (datetime): Valid time
+            create (function): Creates the variable if it is not already defined
+
+        Returns:
+            PlannedVariable: The shared variable
+        """
+
+        key = json.dumps([fileformat, str(basetime), str(validtime), var_dict], sort_keys=True, default=str)
+        if key not in self.variables:
+            self.variables.update({key: PlannedVariable(create())})
+        else:
+            print("Re-using planned variable for " + str(var_dict))
+        return self.variables[key]
+
+
+class PlannedVariable(object):
+    """
+    Variable shared by several converters. The last field read is returned as long as
+    the valid time and the geometry are the same.
+    The field is shared and must not be modified by the converters.
+    """
+
+    def __init__(self, var):
+        self.var = var
+        self.validtime = None
+        self.geo = None
+        self.field = None
+
+    def read_variable(self, geo, validtime, cache, geo_in=None):
+        if self.field is None or self.validtime != validtime or self.geo is not geo:
+            self.field = self.var.read_variable(geo, validtime, cache, geo_in=geo_in)
+            self.validtime = validtime
+            self.geo = geo
+        return self.field
+
+    def read_variables(self, geo, validtimes, cache, geo_in=None):
+        if self.field is None or self.validtime != validtimes or self.geo is not geo:
+            self.field = self.var.read_variables(geo, validtimes, cache, geo_in=geo_in)
+            self.validtime = list(validtimes)
+            self.geo = geo
+        return self.field
+
+    def prefetch(self, geo, validtimes, cache, max_workers=None):
+        self.var.prefetch(geo, validtimes, cache, max_workers=max_workers)
+
+    def print_variable_info(self):
+        self.var.print_variable_info()
+
+
+class Expression(object):
+    """
+    Arithmetic expression of input fields, e.g. "0.622*rh/100*6.112*exp(17.67*(t-273.15)/(t-29.65))/(p/100)".
+    The expression is parsed once into a list of NumPy ufunc calls. Intermediate results are written
+    in place to buffers that are allocated once and re-used for every evaluation.
+    """
+
+    operators = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide,
+                 ast.Pow: np.power}
+    functions = {"exp": np.exp, "log": np.log, "log10": np.log10, "sqrt": np.sqrt, "abs": np.abs, "sin": np.sin,
+                 "cos": np.cos, "tan": np.tan, "arcsin": np.arcsin, "arccos": np.arccos, "arctan": np.arctan,
+                 "arctan2": np.arctan2, "minimum": np.minimum, "maximum": np.maximum, "power": np.power}
+
+    def __init__(self, expression):
+        self.expression = expression
+        # Input field names used in the expression
+        self.names = []
+        # Ufunc calls as (ufunc, arguments, output buffer index)
+        self.instructions = []
+        self.nbuffers = 0
+        self.free_buffers = []
+        self.buffers = None
+        try:
+            tree = ast.parse(expression, mode="eval")
+        except SyntaxError:
+            raise Exception("Could not parse expression: " + expression)
+        self.result = self.compile(tree.body)
+        surfex.util.info("Compiled expression " + expression + " into " + str(len(self.instructions)) +
+                         " operations with " + str(self.nbuffers) + " buffers", level=2)
+
+    def compile(self, node):
+
+        """
+        Compile a node of the syntax tree
+
+        Returns:
+            tuple: Operand ("const", value), ("input", name) or ("buffer", index)
+        """
+
+        # Numbers are ast.Num before Python 3.8 and ast.Constant after. ast.Constant does not exist in 3.5.
+        if type(node).__name__ in ["Num", "Constant"]:
+            if type(node).__name__ == "Num":
+                value = node.n
+            else:
+                value = node.value
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise Exception("Not supported in expression " + self.expression + ": " + ast.dump(node))
+            return "const", float(value)
+        elif isinstance(node, ast.Name):
+            if node.id not in self.names:
+                self.names.append(node.id)
+            return "input", node.id
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.UAdd):
+            return self.compile(node.operand)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return self.add_instruction(np.negative, [self.compile(node.operand)])
+        elif isinstance(node, ast.BinOp) and type(node.op) in self.operators:
+            return self.add_instruction(self.operators[type(node.op)],
+                                        [self.compile(node.left), self.compile(node.right)])
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in self.functions:
+            ufunc = self.functions[node.func.id]
+            if len(node.args) != ufunc.nin or len(node.keywords) > 0:
+                raise Exception(node.func.id + " takes " + str(ufunc.nin) + " arguments in " + self.expression)
+            return self.add_instruction(ufunc, [self.compile(arg) for arg in node.args])
+        else:
+            raise Exception("Not supported in expression " + self.expression + ": " + ast.dump(node))
+
+    def add_instruction(self, ufunc, args):
+        # Constant sub-expressions are evaluated once here
+        if all(arg[0] == "const" for arg in args):
+            return "const", float(ufunc(*[arg[1] for arg in args]))
+
+        # Buffers of the arguments can be re-used for the output
+        for arg in args:
+            if arg[0] == "buffer":
+                self.free_buffers.append(arg[1])
+        if len(self.free_buffers) > 0:
+            out = self.free_buffers.pop()
+        else:
+            out = self.nbuffers
+            self.nbuffers = self.nbuffers + 1
+        self.instructions.append((ufunc, args, out))
+        return "buffer", out
+
+    def evaluate(self, fields, shape=None):
+
+        """
+        Evaluate the expression
+
+        Arguments:
+            fields (dict): Input fields for the names in the expression
+            shape (int or tuple): Shape of the result if the expression has no input fields
+
+        Returns:
+            np.array: The result in a new array
+        """
+
+        for name in self.names:
+            if name not in fields:
+                raise Exception("Field " + name + " is needed to evaluate " + self.expression)
+            shape = np.shape(fields[name])
+
+        kind, value = self.result
+        if kind == "const":
+            return np.full(shape, value)
+        elif kind == "input":
+            return np.array(fields[value], dtype=float)
+
+        if self.buffers is None or self.buffers.shape[1:] != tuple(shape):
+            self.buffers = np.empty([self.nbuffers] + list(shape))
+
+        result = None
+        for i in range(0, len(self.instructions)):
+            ufunc, args, out = self.instructions[i]
+            values = []
+            for kind, value in args:
+                if kind == "const":
+                    values.append(value)
+                elif kind == "input":
+                    values.append(fields[value])
+                else:
+                    values.append(self.buffers[value])
+            if i == len(self.instructions) - 1:
+                # The result is returned in a new array
+                result = ufunc(*values)
+            else:
+                ufunc(*values, out=self.buffers[out])
+        return result
+
+
 class Converter:
     """
     Main interface to read a field is done through a converter
     The converter is default "None" to read a plain field
     """
 
-    def __init__(self, name, validtime, defs, conf, fileformat, basetime, debug=False):
+    def __init__(self, name, validtime, defs, conf, fileformat, basetime, debug=False, read_plan=None):
         """
         Initializing the converter
 
         :param name: name
         :param conf: dictionary
         :param fileformat: format
+        :param read_plan: ReadPlan to share identical input variables with other converters
         """
 
         self.name = name
         self.validtime = validtime
         self.basetime = basetime
+        self.read_plan = read_plan
         # self.intervall = intervall
 
         print(conf, self.name)
@@ -150,6 +379,15 @@ class Converter:
         elif self.name == "sdp":
             self.sdp1 = self.create_variable(fileformat, defs, conf[self.name]["sdp1"], debug)
             self.sdp2 = self.create_variable(fileformat, defs, conf[self.name]["sdp2"], debug)
+        elif self.name == "expr":
+            if "expr" not in conf[self.name]:
+                raise KeyError("expr is missing in converter definition")
+            self.expression = Expression(conf[self.name]["expr"])
+            self.inputs = {}
+            for name in self.expression.names:
+                if name not in conf[self.name]:
+                    raise KeyError(name + " is used in " + conf[self.name]["expr"] + " but not defined")
+                self.inputs.update({name: self.create_variable(fileformat, defs, conf[self.name][name], debug)})
         else:
             print("Converter " + self.name + " not implemented")
             raise NotImplementedError
@@ -159,6 +397,21 @@ class Converter:
     def print_info(self):
         print(self.name)
 
+    def get_variables(self):
+        """ Returns the input variables of the converter """
+        variables = []
+        for var in vars(self).values():
+            if isinstance(var, (surfex.variable.Variable, PlannedVariable)):
+                variables.append(var)
+        if self.name == "expr":
+            variables = variables + list(self.inputs.values())
+        return variables
+
+    def prefetch(self, geo, validtimes, cache, max_workers=None):
+        """ Read the input variables ahead of time for validtimes if the file format supports it """
+        for var in self.get_variables():
+            var.prefetch(geo, validtimes, cache, max_workers=max_workers)
+
     def create_variable(self, fileformat, defs, var_dict, debug):
 
         # Finally we can merge the variable with the default settings
@@ -167,6 +420,13 @@ class Converter:
         var_dict = copy.deepcopy(var_dict)
         merged_dict = data_merge(defs, var_dict)
 
+        if self.read_plan is not None:
+            return self.read_plan.get_variable(fileformat, merged_dict, self.basetime, self.validtime,
+                                               lambda: self.new_variable(fileformat, merged_dict, debug))
+        return self.new_variable(fileformat, merged_dict, debug)
+
+    def new_variable(self, fileformat, merged_dict, debug):
+
         if fileformat == "netcdf":
             var = surfex.variable.NetcdfVariable(merged_dict, self.basetime, self.validtime,  debug=debug)
         elif fileformat == "grib1" or fileformat == "grib2":
@@ -190,14 +450,57 @@ class Converter:
     def read_time_step(self, geo, validtime, cache, geo_in=None):
         # print("Time in converter: "+self.name+" "+validtime.strftime('%Y%m%d%H'))
 
+        def read(var):
+            return var.read_variable(geo, validtime, cache, geo_in=geo_in)
+
+        return self.convert(read, validtime, geo.npoints)
+
+    def read_time_steps(self, geo, validtimes, cache, geo_in=None):
+
+        """
+        Read and convert several time steps at once. The input variables read all the time steps
+        before the conversion is done once for the whole block.
+
+        Arguments:
+            geo (surfex.Geo): Geometry to read for
+            validtimes (list): Valid times
+            cache (surfex.Cache): Cache
+            geo_in (surfex.Geo): Input geometry
+
+        Returns:
+            np.array: Converted values in order time,pos
+        """
+
+        validtimes = list(validtimes)
+
+        def read(var):
+            return var.read_variables(geo, validtimes, cache, geo_in=geo_in)
+
+        field = self.convert(read, validtimes, (len(validtimes), geo.npoints))
+        return np.reshape(field, [len(validtimes), geo.npoints])
+
+    def convert(self, read, validtime, shape):
+
+        """
+        Read the input variables with read and convert them
+
+        Arguments:
+            read (function): Returns the field(s) of a variable
+            validtime (datetime or list): Valid time or valid times read
+            shape (int or tuple): Shape of the field(s)
+
+        Returns:
+            np.array: Converted field(s)
+        """
+
         gravity = 9.81
-        field = np.empty(geo.npoints)
+        field = None
         # Specific reading for each converter
         if self.name == "none":
-            field = self.var.read_variable(geo, validtime, cache, geo_in=geo_in)
+            field = read(self.var)
         elif self.name == "windspeed" or self.name == "winddir":
-            field_x = self.x.read_variable(geo, validtime, cache, geo_in=geo_in)
-            field_y = self.y.read_variable(geo, validtime, cache, geo_in=geo_in)
+            field_x = read(self.x)
+            field_y = read(self.y)
             # field_y = self.y.read_variable(geo,validtime,cache)
             if self.name == "windspeed":
                 field = np.sqrt(np.square(field_x) + np.square(field_y))
@@ -207,9 +510,9 @@ class Converter:
                 field = np.mod(np.rad2deg(np.arctan2(field_x, field_y)) + 180, 360)
 
         elif self.name == "rh2q":
-            field_rh = self.rh.read_variable(geo, validtime, cache, geo_in=geo_in)  # %
-            field_t = self.t.read_variable(geo, validtime, cache, geo_in=geo_in)  # In K
-            field_p = self.p.read_variable(geo, validtime, cache, geo_in=geo_in)  # In Pa
+            field_rh = read(self.rh)  # %
+            field_t = read(self.t)  # In K
+            field_p = read(self.p)  # In Pa
 
             field_p_mb = np.divide(field_p, 100.)
             field_t_c = np.subtract(field_t, 273.15)
@@ -223,18 +526,17 @@ class Converter:
             # ZRATIO = 0.622 * ZE / (ZPRES / 100.)
             # RH2Q = 1. / (1. / ZRATIO + 1.)
         elif self.name == "totalprec":
-            field_totalprec = self.totalprec.read_variable(geo, validtime, cache, geo_in=geo_in)
-            field_snow = self.snow.read_variable(geo, validtime, cache, geo_in=geo_in)
+            field_totalprec = read(self.totalprec)
+            field_snow = read(self.snow)
             field = np.subtract(field_totalprec, field_snow)
         elif self.name == "calcrain":
-            field_totalprec = self.totalprec.read_variable(geo, validtime, cache, geo_in=geo_in)
-            field_t = self.t.read_variable(geo, validtime, cache)
-            field = field_totalprec
-            field[field_t < 1] = 0
+            field_totalprec = read(self.totalprec)
+            field_t = read(self.t)
+            field = np.where(field_t < 1, 0, field_totalprec)
         elif self.name == "calcsnow":
-            field_totalprec = self.totalprec.read_variable(geo, validtime, cache, geo_in=geo_in)
+            field_totalprec = read(self.totalprec)
             # field_rh = self.rh.read_variable(geo, validtime,cache) #
-            field_t = self.t.read_variable(geo, validtime, cache)  # In K
+            field_t = read(self.t)  # In K
             # field_p = self.p.read_variable(geo, validtime,cache)   # In Pa
             # tc = field_t + 273.15
             # e  = (field_rh)*0.611*exp((17.63*tc)/(tc+243.04));
@@ -245,40 +547,53 @@ class Converter:
             # print("problem?")
             # wetbulbTemperature = (gamma * tc + delta * Td)/(gamma + delta);
             # wetbulbTemperatureK  = wetbulbTemperature + 273.15;
-            field = field_totalprec
-            field[field_t > 1] = 0
+            field = np.where(field_t > 1, 0, field_totalprec)
         elif self.name == "phi2m":
-            field = self.phi.read_variable(geo, validtime, cache, geo_in=geo_in)
+            field = read(self.phi)
             field = np.divide(field, gravity)
             field[(field < 0)] = 0.
         elif self.name == "swe2sd":
-            field = self.swe.read_variable(geo, validtime, cache, geo_in=geo_in)
-            rho = self.swe.read_variable(geo, validtime, cache, geo_in=geo_in)
+            field = read(self.swe)
+            rho = read(self.swe)
             field = np.divide(field, rho)
         elif self.name == "sweclim":
-            field = self.swe.read_variable(geo, validtime, cache, geo_in=geo_in)
+            field = read(self.swe)
             rhoclim = {"01": 222., "02": 233., "03": 240., "04": 278., "05": 212., "06": 312., "07": 312., "08": 143.,
                        "09": 143., "10": 161., "11": 182., "12": 213.}
-            month = validtime.strftime("%m")
-            if month in rhoclim:
-                field = np.divide(field, rhoclim[month])
+            validtimes = validtime
+            if not isinstance(validtime, list):
+                validtimes = [validtime]
+            rho = []
+            for this_time in validtimes:
+                month = this_time.strftime("%m")
+                if month in rhoclim:
+                    rho.append(rhoclim[month])
+                else:
+                    raise Exception("Could not found climatological mean for month " + str(month))
+            if isinstance(validtime, list):
+                field = np.divide(field, np.reshape(rho, [len(rho), 1]))
             else:
-                raise Exception("Could not found climatological mean for month " + str(month))
+                field = np.divide(field, rho[0])
         elif self.name == "sea2land":
-            field = self.sea.read_variable(geo, validtime, cache, geo_in=geo_in)
+            field = read(self.sea)
             field = np.subtract(1, field)
         elif self.name == "tap":
-            tap1 = self.tap1.read_variable(geo, validtime, cache, geo_in=geo_in)
-            tap2 = self.tap2.read_variable(geo, validtime, cache, geo_in=geo_in)
+            tap1 = read(self.tap1)
+            tap2 = read(self.tap2)
             field = np.where(np.isnan(tap1), tap2, tap1)
         elif self.name == "rhp":
-            rhp1 = self.rhp1.read_variable(geo, validtime, cache, geo_in=geo_in)
-            rhp2 = self.rhp2.read_variable(geo, validtime, cache, geo_in=geo_in)
+            rhp1 = read(self.rhp1)
+            rhp2 = read(self.rhp2)
             field = np.where(np.isnan(rhp1), rhp2, rhp1)
         elif self.name == "sdp":
-            sdp1 = self.rhp1.read_variable(geo, validtime, cache, geo_in=geo_in)
-            sdp2 = self.rhp2.read_variable(geo, validtime, cache, geo_in=geo_in)
+            sdp1 = read(self.rhp1)
+            sdp2 = read(self.rhp2)
             field = np.where(np.isnan(sdp1), sdp2, sdp1)
+        elif self.name == "expr":
+            fields = {}
+            for name in self.inputs:
+                fields.update({name: read(self.inputs[name])})
+            field = self.expression.evaluate(fields, shape=shape)
         else:
             print("Converter " + self.name + " not implemented")
             raise NotImplementedError
@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 import surfex
 import json
+import numpy as np
 
 
 class TimeSeries(object):
@@ -59,30 +60,18 @@ class TimeSeriesFromJson(TimeSeries):
         ts_lons = data["lons"]
         ts_lats = data["lats"]
         ts_stids = data["stids"]
-        mask = []
-        lons1 = []
-        lats1 = []
-        stids1 = []
-        for i in range(0, len(ts_lons)):
-            if lons is not None and lats is not None:
-                lon1 = surfex.Observation.format_lon(float(ts_lons[i]))
-                lat1 = surfex.Observation.format_lat(float(ts_lats[i]))
-                if len(lons) != len(lats):
-                    raise Exception("Mismach in longitudes and latitudes")
-                for j in range(0, len(lons)):
-                    lon = surfex.Observation.format_lon(float(lons[j]))
-                    lat = surfex.Observation.format_lat(float(lats[j]))
-                    if lon == lon1 and lat == lat1:
-                        mask.append(i)
-                        lons1.append(ts_lons[i])
-                        lats1.append(ts_lats[i])
-                        stids1.append(ts_stids[i])
-                        break
-            else:
-                mask.append(i)
-                lons1.append(ts_lons[i])
-                lats1.append(ts_lats[i])
-                stids1.append(ts_stids[i])
+        if lons is not None and lats is not None:
+            if len(lons) != len(lats):
+                raise Exception("Mismach in longitudes and latitudes")
+            mask = []
+            if len(ts_lons) > 0 and len(lons) > 0:
+                index = surfex.geo.SpatialIndex(ts_lons, ts_lats).match(lons, lats)
+                mask = np.unique(index[index >= 0]).tolist()
+        else:
+            mask = list(range(0, len(ts_lons)))
+        lons1 = [ts_lons[i] for i in mask]
+        lats1 = [ts_lats[i] for i in mask]
+        stids1 = [ts_stids[i] for i in mask]
 
         if lons is not None and lats is not None:
             if len(mask) != len(lons):
@@ -136,18 +125,16 @@ class TimeSeriesFromConverter(TimeSeries):
         converter = surfex.Converter(converter, validtime, defs, conf[var][fileformat]["converter"], fileformat,
                                      basetime)
         times = []
-        values = []
         # Loop output time steps
         this_time = start
         while this_time <= end:
-            # Write for each time step
-            print("Creating time series for: " + this_time.strftime('%Y%m%d%H') + " time_step:" + str(this_time))
-            values.append(converter.read_time_step(geo, this_time, cache, geo_in=geo_in))
             times.append(this_time)
-
             this_time = this_time + timedelta(seconds=interval)
-            if cache is not None:
-                cache.clean_fields(this_time)
+
+        print("Creating time series for: " + start.strftime('%Y%m%d%H') + " - " + end.strftime('%Y%m%d%H'))
+        values = converter.read_time_steps(geo, times, cache, geo_in=geo_in)
+        if cache is not None:
+            cache.clean_fields(this_time)
 
         if stids_file is not None:
             stids = surfex.Observation.get_stid_from_stationlist(stids_file, geo.lonlist, geo.latlist)
@@ -641,28 +641,15 @@ class DomainCheck(QualityControl):
 
         lons = []
         lats = []
-        dx = []
-        dy = []
         for i in range(0, len(mask)):
             lons.append(dataset.lons[mask[i]])
             lats.append(dataset.lats[mask[i]])
-            dx.append(0.5)
-            dy.append(0.5)
 
-        settings = {
-            "nam_lonlatval": {
-                "xx": lons,
-                "xy": lats,
-                "xdx": dx,
-                "xdy": dy
-            }
-        }
-        geo_out = surfex.LonLatVal(settings)
-        nn = surfex.NearestNeighbour(self.domain_geo, geo_out, distance_check=False)
+        index, distances = self.domain_geo.spatial_index().nearest(lons, lats)
         flags = dataset.flags
-        print(len(flags), len(dataset.lons), len(nn.distances))
+        print(len(flags), len(dataset.lons), len(distances))
         for i in range(0, len(mask)):
-            if nn.distances[i] > self.max_distance:
+            if distances[i] > self.max_distance:
                 flags[mask[i]] = code
 
         if self.debug:
@@ -734,32 +721,11 @@ class QCDataSet(object):
                  fg_dep=None, an_dep=None, remove_invalid_elevs=False):
 
         self.analysis_time = analysis_time
-        self.index_pos = {}
-        self.index_stid = {}
-        obstimes = []
-        lons = []
-        lats = []
-        elevs = []
-        stids = []
-        values = []
-        varnames = []
-        for i in range(0, len(observations)):
-            obstimes.append(observations[i].obstime)
-            lons.append(observations[i].lon)
-            lats.append(observations[i].lat)
-            stids.append(observations[i].stid)
-            elevs.append(observations[i].elev)
-            values.append(observations[i].value)
-            varnames.append(observations[i].varname)
-
-            lon = "{:10.5f}".format(float(lons[i]))
-            lat = "{:10.5f}".format(float(lats[i]))
-            stid = str(stids[i])
-
-            pos = lon + ":" + lat
-            self.index_pos.update({pos: i})
-            if stid != "NA":
-                self.index_stid.update({stid: i})
+        if not isinstance(observations, surfex.ObservationColumns):
+            observations = surfex.ObservationColumns.from_observations(observations)
+        self.columns = observations
+        self.index_pos, self.index_stid = observations.index()
+        obstimes, lons, lats, stids, elevs, values, varnames = observations.to_lists()
 
         self.obstimes = obstimes
         self.lons = lons
@@ -888,48 +854,35 @@ class QCDataSet(object):
 
 class TitanDataSet(QCDataSet):
 
-    def __init__(self, var, settings, tests, test_flags, an_time, debug=False, corep=1):
+    def __init__(self, var, settings, tests, test_flags, an_time, debug=False, corep=1, cache_dir=None):
 
         self.var = var
         self.tests = define_quality_control(tests, settings)
         self.settings = settings
         self.test_flags = test_flags
         self.debug = debug
-        obstimes = []
-        lons = []
-        lats = []
-        stids = []
-        elevs = []
-        values = []
-        varnames = []
+        columns = []
         providers = []
         passed_tests = []
-        self.datasources = surfex.obs.get_datasources(an_time, settings["sets"])
+        self.datasources = surfex.obs.get_datasources(an_time, settings["sets"], cache_dir=cache_dir)
 
         # Get global data
         for obs_set in self.datasources:
-            lobstimes, llons, llats, lstids, lelevs, lvalues, lvarnames = obs_set.get_obs()
-            obstimes = obstimes + lobstimes
-            lons = lons + llons
-            lats = lats + llats
-            stids = stids + lstids
-            elevs = elevs + lelevs
-            values = values + lvalues
-            varnames = varnames + lvarnames
-            for i in range(0, len(llons)):
-                providers.append(obs_set.label)
-
-        for i in range(0, len(lons)):
+            columns.append(obs_set.columns)
+            providers += [obs_set.label] * obs_set.size
+
+        observations = surfex.ObservationColumns.concatenate(columns)
+        nobs = len(observations)
+        for i in range(0, nobs):
             passed_tests.append([])
-        flags = np.zeros(len(lons))
-        cis = np.ones(len(lons)) * corep
-        lafs = np.ones(len(lons))
-        stids = stids
-
-        observations = []
-        for i in range(0, len(lons)):
-            observations.append(surfex.Observation(obstimes[i], lons[i], lats[i], values[i], elev=elevs[i],
-                                                   stid=stids[i], varname=varnames[i]))
+        flags = np.zeros(nobs)
+        cis = np.ones(nobs) * corep
+        lafs = np.ones(nobs)
+
+        lats = observations.lats.tolist()
+        lons = observations.lons.tolist()
+        elevs = observations.elevs.tolist()
+        values = observations.values.tolist()
         self.titan_dataset = tit.Dataset(lats, lons, elevs, values)
         if passed_tests is None:
             passed_tests = []
@@ -1041,7 +994,12 @@ def dataset_from_file(an_time, filename, qc_flag=None, skip_flags=None, fg_dep=N
 
 def dataset_from_json(an_time, data, qc_flag=None, skip_flags=None, fg_dep=None, an_dep=None):
 
-    observations = []
+    obstimes = []
+    lons = []
+    lats = []
+    stids = []
+    elevs = []
+    values = []
     providers = []
     flags = []
     cis = []
@@ -1066,13 +1024,12 @@ def dataset_from_json(an_time, data, qc_flag=None, skip_flags=None, fg_dep=None,
 
         if add:
             icounter = icounter + 1
-            obstime = datetime.strptime(data[i]["obstime"], "%Y%m%d%H%M%S")
-            lon = data[i]["lon"]
-            lat = data[i]["lat"]
-            stid = data[i]["stid"]
-            elev = data[i]["elev"]
-            value = data[i]["value"]
-            observations.append(surfex.Observation(obstime, lon, lat, value, stid=stid, elev=elev))
+            obstimes.append(datetime.strptime(data[i]["obstime"], "%Y%m%d%H%M%S"))
+            lons.append(data[i]["lon"])
+            lats.append(data[i]["lat"])
+            stids.append(data[i]["stid"])
+            elevs.append(data[i]["elev"])
+            values.append(data[i]["value"])
             if "provider" in data[i]:
                 providers.append(data[i]["provider"])
             else:
@@ -1101,6 +1058,7 @@ def dataset_from_json(an_time, data, qc_flag=None, skip_flags=None, fg_dep=None,
     if len(passed_tests) == 0:
         passed_tests = None
 
+    observations = surfex.ObservationColumns(obstimes, lons, lats, values, elevs=elevs, stids=stids)
     return QCDataSet(an_time, observations, flags, cis, lafs, providers, passed_tests=passed_tests,
                      fg_dep=fg_deps, an_dep=an_deps)
 
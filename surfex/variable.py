@@ -32,6 +32,8 @@ class Variable(object):
             self.filepattern = None
         self.file_handler = None
         self.previousfilename = None
+        # Id and value of the last accumulated field read
+        self.buffer = None
         if validtime is not None:
             self.time_elapsed = validtime-basetime
         else:
@@ -45,6 +47,27 @@ class Variable(object):
     def read_variable(self, geo, validtime, cache, geo_in=None):
         raise NotImplementedError('users must define read_variable to use this base class')
 
+    def read_variables(self, geo, validtimes, cache, geo_in=None):
+
+        """
+        Read several time steps
+
+        Arguments:
+            geo (surfex.Geo): Geometry to read for
+            validtimes (list): Valid times in increasing order
+            cache (surfex.Cache): Cache
+            geo_in (surfex.Geo): Input geometry
+
+        Returns:
+            np.array: Values in order time,pos
+
+        """
+
+        fields = np.empty([len(validtimes), geo.npoints])
+        for i in range(0, len(validtimes)):
+            fields[i, :] = self.read_variable(geo, validtimes[i], cache, geo_in=geo_in)
+        return fields
+
     @abc.abstractmethod
     def print_variable_info(self):
         raise NotImplementedError('users must define print_variable_info to use this base class')
@@ -53,19 +76,36 @@ class Variable(object):
     def deaccumulate(field, previous_field, instant):
 
         field = np.subtract(field, previous_field)
-        if any(field[field < 0.]):
-            neg = []
-            for i in range(0, field.shape[0]):
-                if field[i] < 0.:
-                    neg.append(field[i])
-            neg = np.asarray(neg)
-            warning("Deaccumulated field has " + str(neg.shape[0]) + " negative lowest:"
-                    + str(np.nanmin(neg)) + " mean: " + str(np.nanmean(neg)))
-        field[field < 0.] = 0
+        negative = field < 0.
+        nneg = np.count_nonzero(negative)
+        if nneg > 0:
+            warning("Deaccumulated field has " + str(nneg) + " negative lowest:"
+                    + str(np.nanmin(field[negative])) + " mean: " + str(np.nanmean(field[negative])))
+            field[negative] = 0
         if float(instant) != 0.:
-            field = np.divide(field, float(instant))
+            if np.issubdtype(field.dtype, np.floating):
+                field /= float(instant)
+            else:
+                field = np.divide(field, float(instant))
         return field
 
+    def buffered_field(self, id_str):
+
+        """
+        The last accumulated field read by this variable if it has id id_str.
+        Lets the previous time step be deaccumulated without reading it again.
+
+        Arguments:
+            id_str (str): Cache id of the field
+
+        Returns:
+            np.array: The field or None
+        """
+
+        if self.buffer is not None and self.buffer[0] == id_str:
+            return self.buffer[1]
+        return None
+
     def open_new_file(self, fcint, offset, file_inc):
 
         if self.filepattern is None:
@@ -139,6 +179,67 @@ class Variable(object):
 
         return new
 
+    def file_reads(self, validtimes):
+
+        """
+        Find the files and base times read_variable will use for a sequence of valid times.
+        The state of this variable is not changed.
+
+        Arguments:
+            validtimes (list): Valid times in the order they will be read
+
+        Returns:
+            list: (validtime, basetime, filename, previoustime, previousfilename) for each valid time
+
+        """
+
+        var = copy.copy(self)
+        reads = []
+        for validtime in validtimes:
+            var.validtime = validtime
+            var.open_new_file(int(self.var_dict["fcint"]), int(self.var_dict["offset"]),
+                              int(self.var_dict["file_inc"]))
+            reads.append((validtime, var.basetime, var.filename, var.previoustime, var.previousfilename))
+            var.previoustime = validtime
+        return reads
+
+    def is_accumulated(self):
+        accumulated = False
+        if "accumulated" in self.var_dict:
+            accumulated = self.var_dict["accumulated"]
+        return accumulated
+
+    def planned_reads(self, validtimes):
+
+        """
+        All fields read_variable will read for a sequence of valid times, including the
+        previous time steps needed to deaccumulate. Each field is only listed once.
+
+        Arguments:
+            validtimes (list): Valid times in the order they will be read
+
+        Returns:
+            list: (filename, validtime) for each field to read
+
+        """
+
+        reads = []
+        for validtime, basetime, filename, previoustime, previousfilename in self.file_reads(validtimes):
+            if self.is_accumulated():
+                if basetime > self.initialtime or previoustime >= basetime:
+                    reads.append((previousfilename, previoustime))
+            reads.append((filename, validtime))
+
+        unique_reads = []
+        for read in reads:
+            if read not in unique_reads:
+                unique_reads.append(read)
+        return unique_reads
+
+    def prefetch(self, geo, validtimes, cache, max_workers=None):
+        """ Read fields ahead of time. Does nothing unless implemented for the file format """
+        pass
+
     def rotate_geographic_wind(self, field, interpolator):
         rotate_wind = False
         if "rotate_to_geographic" in self.var_dict:
@@ -164,6 +265,76 @@ class NetcdfVariable(Variable):
                 raise Exception("NetCDF variable must have attribute " + mandatory[i] + " var_dict:" + str(var_dict))
 
         Variable.__init__(self, basetime, validtime, var_dict, debug)
+        self.read_plan = {}
+
+    def prefetch(self, geo, validtimes, cache, max_workers=None):
+
+        """
+        Plan the time steps to read from each file if read_ahead is set. The first access
+        to a file will then read all of them in one hyperslab and save them in the cache.
+
+        Arguments:
+            geo (surfex.Geo): Geometry to interpolate to
+            validtimes (list): Valid times that will be read
+            cache (surfex.Cache): Cache to save the fields in
+            max_workers (int): Not used
+
+        """
+
+        read_ahead = False
+        if "read_ahead" in self.var_dict:
+            read_ahead = self.var_dict["read_ahead"]
+        if not read_ahead:
+            return
+
+        read_plan = {}
+        for filename, validtime in self.planned_reads(validtimes):
+            read_plan.setdefault(filename, set()).add(validtime)
+        self.read_plan = read_plan
+
+    def read_variables(self, geo, validtimes, cache, geo_in=None):
+
+        """
+        Read several time steps. The time steps needed from each file are read in one go.
+
+        """
+
+        for filename, validtime in self.planned_reads(validtimes):
+            self.read_plan.setdefault(filename, set()).add(validtime)
+        return Variable.read_variables(self, geo, validtimes, cache, geo_in=geo_in)
+
+    def read_ahead(self, geo, filename, cache, level=None, units=None, int_type="nearest", subarea=False):
+
+        """
+        Read all planned time steps from filename in one go and save them in the cache
+
+        """
+
+        if filename not in self.read_plan:
+            return
+
+        var_name = self.var_dict["name"]
+        validtimes = []
+        for validtime in sorted(self.read_plan.pop(filename)):
+            if not cache.is_saved(cache.generate_netcdf_id(var_name, filename, validtime)):
+                validtimes.append(validtime)
+        if len(validtimes) == 0:
+            return
+
+        if cache.file_open(filename):
+            file_handler = cache.get_file_handler(filename)
+        else:
+            file_handler = surfex.netcdf.Netcdf(filename)
+            cache.set_file_handler(filename, file_handler)
+
+        surfex.util.info("Read ahead " + str(len(validtimes)) + " time steps of " + var_name + " from " + filename,
+                         level=1)
+        fields, interpolator = file_handler.points_block(var_name, geo, validtimes, level=level, units=units,
+                                                         interpolation=int_type, cache=cache, subarea=subarea)
+        for i in range(0, len(validtimes)):
+            # Rotate wind to geographic if requested
+            field = self.rotate_geographic_wind(fields[i, :], interpolator)
+            cache.save_field(cache.generate_netcdf_id(var_name, filename, validtimes[i]), field)
 
     def read_variable(self, geo, validtime, cache, geo_in=None):
 
@@ -195,6 +366,9 @@ class NetcdfVariable(Variable):
             int_type = "nearest"
             if "interpolator" in self.var_dict:
                 int_type = self.var_dict["interpolator"]
+            subarea = False
+            if "subarea" in self.var_dict:
+                subarea = self.var_dict["subarea"]
 
             # Re-read field
             previous_field = None
@@ -210,9 +384,13 @@ class NetcdfVariable(Variable):
                     print(self.basetime, self.initialtime, self.previoustime)
                     previous_field = np.zeros([geo.npoints])
                 else:
+                    self.read_ahead(geo, self.previousfilename, cache, level=level, units=units, int_type=int_type,
+                                    subarea=subarea)
                     # Re-read field
                     id_str = cache.generate_netcdf_id(var_name, self.previousfilename, self.previoustime)
-                    if cache.is_saved(id_str):
+                    if self.buffered_field(id_str) is not None:
+                        previous_field = self.buffered_field(id_str)
+                    elif cache.is_saved(id_str):
                         print("Updating cached value ", id_str)
                         previous_field = cache.saved_fields[id_str]
                     else:
@@ -224,19 +402,25 @@ class NetcdfVariable(Variable):
                         previous_field, intp = self.file_handler.points(var_name,  geo, level=level,
                                                                         validtime=self.previoustime,
                                                                         interpolation=int_type,
-                                                                        units=units, cache=cache)
+                                                                        units=units, cache=cache, subarea=subarea)
                         cache.save_field(id_str, previous_field)
                         # Change filename back in handler. Ready to read this time step
                         self.file_handler.fname = fname
 
+            self.read_ahead(geo, self.filename, cache, level=level, units=units, int_type=int_type, subarea=subarea)
             id_str = cache.generate_netcdf_id(var_name, self.filename, validtime)
-            field, interpolator = self.file_handler.points(var_name, geo, level=level, validtime=validtime,
-                                                           interpolation=int_type, units=units, cache=cache)
-            # Rotate wind to geographic if requested
-            field = self.rotate_geographic_wind(field, interpolator)
-            cache.save_field(id_str, field)
+            if cache.is_saved(id_str):
+                field = cache.saved_fields[id_str]
+            else:
+                field, interpolator = self.file_handler.points(var_name, geo, level=level, validtime=validtime,
+                                                               interpolation=int_type, units=units, cache=cache,
+                                                               subarea=subarea)
+                # Rotate wind to geographic if requested
+                field = self.rotate_geographic_wind(field, interpolator)
+                cache.save_field(id_str, field)
 
             if accumulated:
+                self.buffer = (id_str, field)
                 instant = [(validtime - self.previoustime).total_seconds()]
                 if "instant" in self.var_dict:
                     instant = [self.var_dict["instant"]]
@@ -275,6 +459,73 @@ class GribVariable(Variable):
         else:
             raise NotImplementedError
 
+    def is_accumulated(self):
+        return self.get_gribvar().is_accumulated()
+
+    def get_gribvar(self):
+        if self.grib_type == "grib1":
+            par = self.var_dict["parameter"]
+            typ = self.var_dict["type"]
+            level = self.var_dict["level"]
+            tri = self.var_dict["tri"]
+            gribvar = surfex.grib.Grib1Variable(par, typ, level, tri)
+        elif self.grib_type == "grib2":
+            discipline = self.var_dict["discipline"]
+            pc = self.var_dict["parameterCategory"]
+            pn = self.var_dict["parameterNumber"]
+            lt = self.var_dict["levelType"]
+            lev = self.var_dict["level"]
+            tsp = -1
+            if "typeOfStatisticalProcessing" in self.var_dict:
+                tsp = self.var_dict["typeOfStatisticalProcessing"]
+            gribvar = surfex.grib.Grib2Variable(discipline, pc, pn, lt, lev, tsp)
+        else:
+            raise NotImplementedError
+        return gribvar
+
+    def prefetch(self, geo, validtimes, cache, max_workers=None):
+
+        """
+        Decode and interpolate all fields needed for validtimes in a process pool and save them in the cache.
+        read_variable will then find them as saved fields.
+
+        Arguments:
+            geo (surfex.Geo): Geometry to interpolate to
+            validtimes (list): Valid times that will be read
+            cache (surfex.Cache): Cache to save the fields in
+            max_workers (int): Number of processes. Nothing is read ahead if None
+
+        """
+
+        if max_workers is None:
+            return
+
+        gribvar = self.get_gribvar()
+        int_type = "nearest"
+        if "interpolator" in self.var_dict:
+            int_type = self.var_dict["interpolator"]
+        subarea = False
+        if "subarea" in self.var_dict:
+            subarea = self.var_dict["subarea"]
+
+        reads = []
+        for filename, validtime in self.planned_reads(validtimes):
+            if not cache.is_saved(cache.generate_grib_id(gribvar, filename, validtime)):
+                reads.append((filename, gribvar, validtime))
+
+        reads, fields = surfex.grib.read_points_parallel(reads, geo, interpolation=int_type, cache=cache,
+                                                         max_workers=max_workers, subarea=subarea)
+
+        # Rotate wind to geographic if requested, as read_variable does for the fields it reads itself.
+        # The rotation only depends on the input grid, so the interpolator is set up once in this process.
+        interpolator = None
+        if len(reads) > 0 and "rotate_to_geographic" in self.var_dict and self.var_dict["rotate_to_geographic"]:
+            interpolator = surfex.grib.Grib(reads[0][0]).setup_interpolator(gribvar, geo, cache=cache)
+        for i in range(0, len(reads)):
+            filename, gribvar, validtime = reads[i]
+            field = self.rotate_geographic_wind(fields[i], interpolator)
+            cache.save_field(cache.generate_grib_id(gribvar, filename, validtime), field)
+
     def read_variable(self, geo, validtime, cache, geo_in=None):
         self.validtime = validtime
         if self.open_new_file(int(self.var_dict["fcint"]), int(self.var_dict["offset"]),
@@ -292,29 +543,14 @@ class GribVariable(Variable):
             field = np.array([len(geo.lons)])
             field = field.fill(np.nan)
         else:
-            if self.grib_type == "grib1":
-                par = self.var_dict["parameter"]
-                typ = self.var_dict["type"]
-                level = self.var_dict["level"]
-                tri = self.var_dict["tri"]
-                gribvar = surfex.grib.Grib1Variable(par, typ, level, tri)
-            elif self.grib_type == "grib2":
-                discipline = self.var_dict["discipline"]
-                pc = self.var_dict["parameterCategory"]
-                pn = self.var_dict["parameterNumber"]
-                lt = self.var_dict["levelType"]
-                lev = self.var_dict["level"]
-                tsp = -1
-                if "typeOfStatisticalProcessing" in self.var_dict:
-                    tsp = self.var_dict["typeOfStatisticalProcessing"]
-                print("Trygve ", discipline, pc, pn, lt, lev, tsp)
-                gribvar = surfex.grib.Grib2Variable(discipline, pc, pn, lt, lev, tsp)
-            else:
-                raise NotImplementedError
+            gribvar = self.get_gribvar()
 
             int_type = "nearest"
             if "interpolator" in self.var_dict:
                 int_type = self.var_dict["interpolator"]
+            subarea = False
+            if "subarea" in self.var_dict:
+                subarea = self.var_dict["subarea"]
 
             # Re-read field
             previous_field = None
@@ -332,7 +568,9 @@ class GribVariable(Variable):
                 else:
 
                     id_str = cache.generate_grib_id(gribvar, self.previousfilename, self.previoustime)
-                    if cache.is_saved(id_str):
+                    if self.buffered_field(id_str) is not None:
+                        previous_field = self.buffered_field(id_str)
+                    elif cache.is_saved(id_str):
                         previous_field = cache.saved_fields[id_str]
                     else:
                         # Modify filename in handler
@@ -341,7 +579,8 @@ class GribVariable(Variable):
                             print("Re-read ", self.previoustime, " from ", self.previousfilename)
                         self.file_handler.fname = self.previousfilename
                         previous_field, intp = self.file_handler.points(gribvar, geo, self.previoustime,
-                                                                        interpolation=int_type, cache=cache)
+                                                                        interpolation=int_type, cache=cache,
+                                                                        subarea=subarea)
 
                         # Change filename back in handler. Ready to read this time step
                         self.file_handler.fname = fname
@@ -353,13 +592,14 @@ class GribVariable(Variable):
                 field = cache.saved_fields[id_str]
             else:
                 field, interpolator = self.file_handler.points(gribvar, geo, validtime, interpolation=int_type,
-                                                               cache=cache)
+                                                               cache=cache, subarea=subarea)
                 # Rotate wind to geographic if requested
                 field = self.rotate_geographic_wind(field, interpolator)
                 cache.save_field(id_str, field)
 
             # Deaccumulate
             if gribvar.is_accumulated():
+                self.buffer = (id_str, field)
                 instant = [(validtime - self.previoustime).total_seconds()]
                 if "instant" in self.var_dict:
                     instant = [self.var_dict["instant"]]
@@ -451,7 +691,9 @@ class SurfexVariable(Variable):
                 else:
                     id_str = cache.generate_surfex_id(varname, patches, layers, self.previousfilename,
                                                       self.previoustime)
-                    if cache.is_saved(id_str):
+                    if self.buffered_field(id_str) is not None:
+                        previous_field = self.buffered_field(id_str)
+                    elif cache.is_saved(id_str):
                         previous_field = cache.saved_fields[id_str]
                     else:
                         fname = self.filename
@@ -482,6 +724,7 @@ class SurfexVariable(Variable):
 
             # Deaccumulate
             if accumulated:
+                self.buffer = (id_str, field)
                 instant = [(validtime - self.previoustime).total_seconds()]
                 if "instant" in self.var_dict:
                     instant = [self.var_dict["instant"]]
@@ -514,6 +757,9 @@ class FaVariable(Variable):
         self.validtime = validtime
         if self.open_new_file(int(self.var_dict["fcint"]), int(self.var_dict["offset"]),
                               int(self.var_dict["file_inc"])):
+            # Close the files of the previous handle. They are opened again if the handle is used later.
+            if self.file_handler is not None:
+                self.file_handler.close()
             # print "Updating filehandler for "+self.print_variable_info()
             if cache.file_open(self.filename):
                 self.file_handler = cache.get_file_handler(self.filename)
@@ -550,7 +796,9 @@ class FaVariable(Variable):
                 else:
                     # Re-read field
                     id_str = cache.generate_netcdf_id(var_name, self.previousfilename, self.previoustime)
-                    if cache.is_saved(id_str):
+                    if self.buffered_field(id_str) is not None:
+                        previous_field = self.buffered_field(id_str)
+                    elif cache.is_saved(id_str):
                         print("Updating cached value ", id_str)
                         previous_field = cache.saved_fields[id_str]
                     else:
@@ -574,11 +822,7 @@ class FaVariable(Variable):
             cache.save_field(id_str, field)
 
             if accumulated:
-                print("accumulated variable ", self.var_dict)
-                print("field", field)
-                print("prevous", previous_field)
-                print("deccumulated", self.deaccumulate(field, previous_field, 0))
-            if accumulated:
+                self.buffer = (id_str, field)
                 instant = [(validtime - self.previoustime).total_seconds()]
                 if "instant" in self.var_dict:
                     instant = [self.var_dict["instant"]]
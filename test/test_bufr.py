@@ -0,0 +1,103 @@
+import unittest
+from unittest import mock
+import surfex
+import numpy as np
+import eccodes
+import tempfile
+from datetime import datetime, timedelta
+
+
+def write_synop(fh, lon, lat, hour, station_number=None, t2m=None, td2m=None, sd=None):
+    """ Write a single station SYNOP message with the position also in the local section """
+    bufr = eccodes.codes_bufr_new_from_samples("BUFR4_local")
+    eccodes.codes_set_array(bufr, "unexpandedDescriptors",
+                            [301001, 301011, 301012, 301021, 7001, 7030, 12004, 12006, 13013])
+    values = [("blockNumber", 1), ("year", 2020), ("month", 3), ("day", 30), ("hour", hour), ("minute", 0),
+              ("latitude", lat), ("longitude", lon), ("heightOfStationGroundAboveMeanSeaLevel", 100.),
+              ("heightOfStation", 110.)]
+    if station_number is not None:
+        values.append(("stationNumber", station_number))
+    if t2m is not None:
+        values.append(("airTemperatureAt2M", t2m))
+    if td2m is not None:
+        values.append(("dewpointTemperatureAt2M", td2m))
+    if sd is not None:
+        values.append(("totalSnowDepth", sd))
+    for key, value in values:
+        eccodes.codes_set(bufr, key, value)
+    eccodes.codes_set(bufr, "localLatitude", lat)
+    eccodes.codes_set(bufr, "localLongitude", lon)
+    eccodes.codes_set(bufr, "pack", 1)
+    fh.write(eccodes.codes_get_message(bufr))
+    eccodes.codes_release(bufr)
+
+
+class BufrTest(unittest.TestCase):
+
+    variables = ["airTemperatureAt2M", "relativeHumidityAt2M", "totalSnowDepth"]
+    valid_dtg = datetime(2020, 3, 30, 6)
+    valid_range = timedelta(hours=1)
+    lonrange = [5, 15]
+    latrange = [55, 65]
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = self.tmpdir.name + "/synop.bufr"
+        with open(self.fname, "wb") as fh:
+            write_synop(fh, 10., 60., 6, station_number=1, t2m=270., td2m=265., sd=0.2)
+            # Outside the time window. The missing dew point is counted as not defined.
+            write_synop(fh, 11., 61., 8, station_number=2, t2m=271.)
+            # Outside the domain
+            write_synop(fh, 30., 60., 6, station_number=3, t2m=272., td2m=268.)
+            # Missing station number
+            write_synop(fh, 12., 62., 7, t2m=273., td2m=271., sd=0.1)
+            # Missing temperature
+            write_synop(fh, 13., 63., 5, station_number=5, sd=0.3)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def read(self, cache_dir=None):
+        return surfex.bufr.read_bufr_file(self.fname, self.variables, self.valid_dtg, self.valid_range,
+                                          self.lonrange, self.latrange, cache_dir=cache_dir)
+
+    def test_read_bufr_file(self):
+        observations, counters, cnt, not_decoded = self.read()
+        self.assertEqual(cnt, 5)
+        self.assertEqual(not_decoded, 0)
+        self.assertEqual(observations.stids.tolist(), ["1001", "1001", "1001", "NA", "NA", "NA", "1005"])
+        self.assertEqual(observations.varnames.tolist(), self.variables + self.variables + ["totalSnowDepth"])
+        np.testing.assert_allclose(observations.values[[0, 2, 3, 5, 6]], [270., 0.2, 273., 0.1, 0.3])
+        rh = surfex.BufrObservationSet.td2rh(265., 270.) * 0.01
+        self.assertAlmostEqual(observations.values[1], rh)
+        self.assertTrue(0. < observations.values[4] < 1.)
+        np.testing.assert_array_equal(observations.elevs, 110.)
+
+        self.assertEqual(counters["airTemperatureAt2M"],
+                         {"nobs": 2, "ndomain": 1, "nundef": 1, "ntime": 1, "nerror": 1})
+        self.assertEqual(counters["relativeHumidityAt2M"],
+                         {"nobs": 2, "ndomain": 1, "nundef": 2, "ntime": 0, "nerror": 2})
+        self.assertEqual(counters["totalSnowDepth"],
+                         {"nobs": 3, "ndomain": 1, "nundef": 1, "ntime": 0, "nerror": 1})
+
+    def test_cache(self):
+        observations, counters, cnt, not_decoded = self.read()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cached = self.read(cache_dir=cache_dir)
+            with mock.patch("surfex.bufr.decode_bufr_file", side_effect=Exception("Decoded again")):
+                cached_again = self.read(cache_dir=cache_dir)
+        for obs_set in [cached, cached_again]:
+            self.assertEqual(obs_set[0].to_lists(), observations.to_lists())
+            self.assertEqual(obs_set[1], counters)
+            self.assertEqual(obs_set[2], cnt)
+
+    def test_observation_set(self):
+        obs_set = surfex.BufrObservationSet(self.fname, ["relativeHumidityAt2M"], self.valid_dtg, self.valid_range,
+                                            lonrange=self.lonrange, latrange=self.latrange)
+        obstimes, lons, lats, stids, elevs, values, varnames = obs_set.get_obs()
+        self.assertEqual(stids, ["1001", "NA"])
+        self.assertEqual(obstimes, [datetime(2020, 3, 30, 6), datetime(2020, 3, 30, 7)])
+
+
+if __name__ == '__main__':
+    unittest.main()
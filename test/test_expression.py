@@ -0,0 +1,70 @@
+import unittest
+import surfex
+import ast
+import numpy as np
+
+
+class ExpressionTest(unittest.TestCase):
+
+    t = np.array([[270., 280.], [290., 300.]])
+    rh = np.array([[50., 60.], [70., 80.]])
+    p = np.array([[100000., 95000.], [90000., 85000.]])
+
+    def test_evaluate(self):
+        expression = surfex.read.Expression("0.622*rh/100*6.112*exp(17.67*(t-273.15)/(t-29.65))/(p/100)")
+        self.assertEqual(expression.names, ["rh", "t", "p"])
+        field = expression.evaluate({"t": self.t, "rh": self.rh, "p": self.p})
+        expected = 0.622 * self.rh / 100 * 6.112 * np.exp(17.67 * (self.t - 273.15) / (self.t - 29.65)) / \
+            (self.p / 100)
+        np.testing.assert_allclose(field, expected)
+
+        expression = surfex.read.Expression("-maximum(t, 280.) + sqrt(abs(rh))")
+        np.testing.assert_allclose(expression.evaluate({"t": self.t, "rh": self.rh}),
+                                   -np.maximum(self.t, 280.) + np.sqrt(np.abs(self.rh)))
+
+    def test_constant_folding(self):
+        expression = surfex.read.Expression("t*(2*3+exp(0))")
+        self.assertEqual(len(expression.instructions), 1)
+        np.testing.assert_allclose(expression.evaluate({"t": self.t}), self.t * 7.)
+
+        expression = surfex.read.Expression("2**3-1")
+        self.assertEqual(expression.result, ("const", 7.))
+        np.testing.assert_allclose(expression.evaluate({}, shape=3), np.full(3, 7.))
+
+    def test_buffer_reuse(self):
+        expression = surfex.read.Expression("(t-273.15)*(t-273.15)+(rh/100)*(rh/100)")
+        self.assertLess(expression.nbuffers, len(expression.instructions))
+        first = expression.evaluate({"t": self.t, "rh": self.rh})
+        buffers = expression.buffers
+        second = expression.evaluate({"t": self.t + 1., "rh": self.rh})
+        self.assertIs(expression.buffers, buffers)
+        self.assertFalse(np.shares_memory(first, second))
+        np.testing.assert_allclose(first, (self.t - 273.15) ** 2 + (self.rh / 100) ** 2)
+        np.testing.assert_allclose(second, (self.t - 272.15) ** 2 + (self.rh / 100) ** 2)
+
+        # New buffers for a new shape
+        third = expression.evaluate({"t": self.t[0], "rh": self.rh[0]})
+        self.assertEqual(third.shape, (2,))
+
+    def test_rejected(self):
+        for expression in ["t.real", "t[0]", "t if rh else p", "open(t)", "exp(t, rh)", "t % 2", "True*t",
+                           "'a'*t", "t +"]:
+            with self.assertRaises(Exception):
+                surfex.read.Expression(expression)
+
+        with self.assertRaises(Exception):
+            surfex.read.Expression("t+rh").evaluate({"t": self.t})
+
+    def test_num_nodes(self):
+        # Numbers are ast.Num nodes before Python 3.8
+        class Num(ast.AST):
+            _fields = ("n",)
+
+        expression = surfex.read.Expression("t")
+        self.assertEqual(expression.compile(Num(n=2)), ("const", 2.))
+        with self.assertRaises(Exception):
+            expression.compile(Num(n=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+import numpy as np
+import surfex
+
+
+class FakeResource(object):
+    def __init__(self, fname, opened):
+        self.fname = fname
+        self.closed = False
+        opened.append(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeEpygram(object):
+    """ Records the FA files opened through epygram.formats.resource """
+
+    def __init__(self):
+        self.opened = []
+        self.formats = self
+
+    def resource(self, fname, openmode="r"):
+        return FakeResource(fname, self.opened)
+
+
+def fake_points(fa, var_name, geo, validtime=None, interpolation="nearest", cache=None):
+    fa.resource()
+    return np.zeros(geo.npoints), None
+
+
+class FaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.epygram = FakeEpygram()
+        patcher = mock.patch("surfex.fa.epygram", self.epygram)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resource(self):
+        with surfex.fa.Fa("fc2020033000+001.fa") as fa:
+            resource = fa.resource()
+            self.assertIs(fa.resource(), resource)
+            fa.fname = "fc2020033000+002.fa"
+            fa.resource()
+            self.assertEqual(len(self.epygram.opened), 2)
+            self.assertFalse(resource.closed)
+        self.assertTrue(all([resource.closed for resource in self.epygram.opened]))
+        self.assertEqual(fa.resources, {})
+
+        # A closed handle opens the file again
+        fa.resource()
+        self.assertEqual(len(self.epygram.opened), 3)
+
+    @mock.patch.object(surfex.fa.Fa, "points", fake_points)
+    def test_fa_variable_closes_files(self):
+        var_dict = {"name": "S001TEMPERATURE", "fcint": 10800, "offset": 0, "file_inc": 3600,
+                    "filepattern": "fc@YYYY@@MM@@DD@@HH@+@LLL@.fa"}
+        initialtime = datetime(2020, 3, 30, 0)
+        geo = surfex.geo.Geo(2, 2, 1, np.array([[10.], [11.]]), np.array([[60.], [61.]]))
+        cache = surfex.cache.Cache(False, 3600)
+        variable = surfex.variable.FaVariable(var_dict, initialtime, initialtime, False)
+        for hour in range(0, 4):
+            variable.read_variable(geo, initialtime + timedelta(hours=hour), cache)
+            # Only the file of the current time step is open
+            self.assertEqual([resource.fname for resource in self.epygram.opened if not resource.closed],
+                             [variable.filename])
+
+
+if __name__ == '__main__':
+    unittest.main()
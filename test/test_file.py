@@ -0,0 +1,239 @@
+import unittest
+import surfex
+import numpy as np
+import os
+import tempfile
+from datetime import datetime
+from netCDF4 import Dataset
+
+
+class AsciiSurfexFileTest(unittest.TestCase):
+
+    lines = ["&FULL  VERSION",
+             "(-)",
+             "           8",
+             "&FULL  GRID_TYPE",
+             "GRID TYPE",
+             "LONLATVAL",
+             "&FULL  XX",
+             "X COORDINATES",
+             "  0.1000000000000000D+02  0.1100000000000000D+02",
+             "&FULL  XY",
+             "Y COORDINATES",
+             "  0.6000000000000000D+02  0.6100000000000000D+02",
+             "&FULL  DX",
+             "X MESH SIZE",
+             "  0.1000000000000000D+01  0.1000000000000000D+01",
+             "&FULL  DY",
+             "Y MESH SIZE",
+             "  0.1000000000000000D+01  0.1000000000000000D+01",
+             "&FULL  ZS",
+             "OROGRAPHY (M)",
+             "  0.1250000000000000D+03",
+             "  0.1000000000000000D+21",
+             "&NATURE  TG1",
+             "X_Y_TG1 (K)",
+             "  0.2750000000000000D+03  0.2760000000000000D+03",
+             "&FULL  TG1",
+             "DUMMY",
+             "  0.0000000000000000D+00  0.0000000000000000D+00"]
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = self.tmpdir.name + "/PGD.txt"
+        with open(self.fname, "w") as fh:
+            fh.write("\n".join(self.lines) + "\n")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_read(self):
+        ascii_file = surfex.file.AsciiSurfexFile(self.fname)
+        self.assertIsInstance(ascii_file.geo, surfex.geo.LonLatVal)
+        self.assertEqual(ascii_file.geo.npoints, 2)
+        self.assertEqual(ascii_file.read("VERSION", "FULL", "integer").tolist(), [8])
+        self.assertEqual(ascii_file.read("grid_type", "&full", "string").tolist(), ["LONLATVAL"])
+        zs = ascii_file.read("ZS", "FULL", "float")
+        self.assertEqual(zs[0], 125.)
+        self.assertTrue(np.isnan(zs[1]))
+        self.assertEqual(ascii_file.read("TG1", "NATURE", "float").tolist(), [275., 276.])
+        self.assertEqual(ascii_file.read("TG1", "FULL", "float").tolist(), [0., 0.])
+        self.assertEqual(len(ascii_file.read("TG2", "NATURE", "float")), 0)
+        with self.assertRaises(Exception):
+            ascii_file.read("XX", "FULL", "integer")
+
+        # The file is indexed once
+        index = ascii_file.index
+        ascii_file.read("XY", "FULL", "float")
+        self.assertIs(ascii_file.index, index)
+
+
+class ForcingFileNetCDFTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = self.tmpdir.name + "/FORCING.nc"
+        self.geo = surfex.geo.Geo(4, 2, 2, np.array([[10., 10.], [11., 11.]]), np.array([[60., 61.], [60., 61.]]))
+        nc = Dataset(self.fname, "w")
+        nc.createDimension("time", None)
+        nc.createDimension("Number_of_points", 4)
+        nc.createVariable("LON", "f4", ("Number_of_points",))[:] = [10., 11., 10., 11.]
+        nc.createVariable("LAT", "f4", ("Number_of_points",))[:] = [60., 60., 61., 61.]
+        time = nc.createVariable("time", "f8", ("time",))
+        time.units = "minutes since 2020-03-30 00:00:00"
+        # The file times are truncated to the hour. 06:30 is read as 06.
+        time[:] = [0., 60., 390., 420.]
+        nc.createVariable("Tair", "f4", ("time", "Number_of_points"))[:] = \
+            270. + np.arange(4.)[:, np.newaxis] + np.array([0., 10., 20., 30.])
+        nc.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_time_indices(self):
+        forcing = surfex.file.ForcingFileNetCDF(self.fname, self.geo)
+        self.assertEqual(forcing.time_indices([datetime(2020, 3, 30, 7), datetime(2020, 3, 30, 0)]), [3, 0])
+        self.assertEqual(forcing.time_indices([datetime(2020, 3, 30, 6)]), [2])
+        self.assertEqual(forcing.time_indices([datetime(2020, 3, 30, 6, 30)]), [])
+        self.assertEqual(forcing.time_indices([datetime(2020, 3, 30, 2)]), [])
+        self.assertEqual(forcing.time_indices([datetime(2020, 3, 30, 0), datetime(2020, 3, 30, 0)]), [0, 0])
+        self.assertEqual(forcing.times.dtype, np.dtype("datetime64[s]"))
+
+    def test_read_field(self):
+        forcing = surfex.file.ForcingFileNetCDF(self.fname, self.geo)
+        var = surfex.file.SurfexFileVariable("Tair")
+        field, geo = forcing.read_field(var, [datetime(2020, 3, 30, 1), datetime(2020, 3, 30, 6)])
+        np.testing.assert_array_equal(field, [[271., 281., 291., 301.], [272., 282., 292., 302.]])
+        field, geo = forcing.read_field(var, [datetime(2020, 3, 30, 7), datetime(2020, 3, 30, 0)])
+        np.testing.assert_array_equal(field, [[273., 283., 293., 303.], [270., 280., 290., 300.]])
+        field, geo = forcing.field(var, validtime=datetime(2020, 3, 30, 6))
+        np.testing.assert_array_equal(field, [[272., 292.], [282., 302.]])
+        with self.assertRaises(Exception):
+            forcing.read_field(var, [datetime(2020, 3, 30, 6, 30)])
+
+    def test_time_chunks(self):
+        forcing = surfex.file.ForcingFileNetCDF(self.fname, self.geo)
+        var = surfex.file.SurfexFileVariable("Tair")
+        chunks = list(forcing.time_chunks(var, chunk_size=3))
+        self.assertEqual([len(times) for times, values in chunks], [3, 1])
+        self.assertEqual(chunks[0][0], [datetime(2020, 3, 30, 0), datetime(2020, 3, 30, 1),
+                                        datetime(2020, 3, 30, 6)])
+        self.assertEqual(chunks[1][0], [datetime(2020, 3, 30, 7)])
+        np.testing.assert_array_equal(np.concatenate([values for times, values in chunks]),
+                                      forcing.fh.variables["Tair"][:])
+
+    def test_points_block(self):
+        forcing = surfex.file.ForcingFileNetCDF(self.fname, self.geo)
+        var = surfex.file.SurfexFileVariable("Tair")
+        geo_out = surfex.geo.Geo(1, 1, 1, np.array([[11.]]), np.array([[61.]]))
+        validtimes = [datetime(2020, 3, 30, 7), datetime(2020, 3, 30, 1)]
+        values, interpolator = forcing.points_block(var, geo_out, validtimes)
+        np.testing.assert_array_equal(values, [[303.], [301.]])
+        for i in range(0, len(validtimes)):
+            points, interpolator = forcing.points(var, geo_out, validtime=validtimes[i], interpolation="nearest")
+            np.testing.assert_array_equal(values[i, :], np.reshape(points, [-1]))
+
+
+class TexteSurfexFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = self.tmpdir.name + "/T2M.TXT"
+        self.geo = surfex.geo.Geo(2, 2, 1, np.array([[10.], [11.]]), np.array([[60.], [61.]]))
+        self.write(["0.2701D+03 0.2711D+03", "0.2702D+03 0.1000D+21", "0.2703D+03 0.2713D+03"])
+        self.var = surfex.file.SurfexFileVariable("T2M", basetime=datetime(2020, 3, 30, 0), interval=3600)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, lines):
+        with open(self.fname, "w") as fh:
+            fh.write("\n".join(lines) + "\n")
+
+    def test_read(self):
+        texte = surfex.file.TexteSurfexFile(self.fname, self.geo)
+        values, geo = texte.read(self.var, [datetime(2020, 3, 30, 3), datetime(2020, 3, 30, 1),
+                                            datetime(2020, 3, 30, 1, 30), datetime(2020, 3, 30, 4)])
+        np.testing.assert_allclose(values, [[270.1, 271.1], [270.3, 271.3]])
+        values, geo = texte.read(self.var, [datetime(2020, 3, 30, 2)])
+        self.assertEqual(values[0, 0], 270.2)
+        self.assertTrue(np.isnan(values[0, 1]))
+        self.assertEqual(texte.read(self.var, None)[0].shape, (3, 2))
+        self.assertFalse(os.path.exists(self.fname + ".npy"))
+
+    def test_sidecar(self):
+        times = [datetime(2020, 3, 30, 1), datetime(2020, 3, 30, 3)]
+        expected = surfex.file.TexteSurfexFile(self.fname, self.geo).read(self.var, times)[0]
+        values = surfex.file.TexteSurfexFile(self.fname, self.geo, sidecar=True).read(self.var, times)[0]
+        np.testing.assert_array_equal(values, expected)
+        self.assertTrue(os.path.exists(self.fname + ".npy"))
+
+        # The sidecar is memory mapped when the file is opened again
+        texte = surfex.file.TexteSurfexFile(self.fname, self.geo, sidecar=True)
+        np.testing.assert_array_equal(texte.read(self.var, times)[0], expected)
+        self.assertIsInstance(texte.data[2], np.memmap)
+
+        # A TEXTE file newer than the sidecar is parsed again
+        self.write(["0.2801D+03 0.2811D+03", "0.2802D+03 0.2812D+03", "0.2803D+03 0.2813D+03"])
+        mtime = os.path.getmtime(self.fname + ".npy")
+        os.utime(self.fname, (mtime + 10, mtime + 10))
+        texte = surfex.file.TexteSurfexFile(self.fname, self.geo, sidecar=True)
+        np.testing.assert_allclose(texte.read(self.var, times)[0], [[280.1, 281.1], [280.3, 281.3]])
+        self.assertNotIsInstance(texte.data[2], np.memmap)
+
+        # A sidecar with another number of values in a time step is parsed again
+        self.var.patches = 2
+        texte = surfex.file.TexteSurfexFile(self.fname, self.geo, sidecar=True)
+        values = texte.read(self.var, None)[0]
+        np.testing.assert_allclose(values, [[280.1, 281.1, 280.2, 281.2]])
+        self.assertEqual(np.load(self.fname + ".npy").shape, (1, 4))
+
+
+class NetCDFSurfexFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = self.tmpdir.name + "/SURFOUT.nc"
+        Dataset(self.fname, "w").close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def masked_values(field, mask):
+        """ Pack the masked points of a field with the loop used before the indices were vectorized """
+        values = []
+        ii = 0
+        j = 0
+        for x in range(-1, field.shape[0] + 1):
+            for y in range(-1, field.shape[1] + 1):
+                if x in range(0, field.shape[0]) and y in range(0, field.shape[1]):
+                    if mask[j] == ii:
+                        values.append(field[x, y])
+                        j = j + 1
+                        if j == len(mask):
+                            return values
+                ii = ii + 1
+        return values
+
+    def test_gather_indices(self):
+        nx = 3
+        ny = 4
+        # Points of the 5 x 6 PGD grid with the halo. Only points inside the field are in the mask.
+        mask = [7, 8, 10, 14, 15, 16, 19, 20, 22]
+        geo = surfex.geo.Geo(len(mask), len(mask), 1, np.arange(len(mask)) + 10., np.arange(len(mask)) + 60.)
+        geo.mask = mask
+        surfex_file = surfex.file.NetCDFSurfexFile(self.fname, geo)
+        x_ind, y_ind = surfex_file.gather_indices(nx, ny)
+        self.assertIs(surfex_file.gather_indices(nx, ny)[0], x_ind)
+
+        field = np.arange(nx * ny, dtype=float).reshape(nx, ny)
+        expected = self.masked_values(field, mask)
+        self.assertEqual(len(expected), len(mask))
+        np.testing.assert_array_equal(field[x_ind, y_ind], expected)
+        np.testing.assert_array_equal(x_ind, [0, 0, 0, 1, 1, 1, 2, 2, 2])
+        np.testing.assert_array_equal(y_ind, [0, 1, 3, 1, 2, 3, 0, 1, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,8 @@
 import unittest
+import io
+import tempfile
+import contextlib
+from datetime import datetime
 import surfex
 
 
@@ -21,3 +25,40 @@ class ForcingTest(unittest.TestCase):
         args = surfex.parse_args_create_forcing(argv)
         options, var_objs, att_objs = surfex.forcing.set_forcing_config(args)
         surfex.forcing.run_time_loop(options, var_objs, att_objs)
+
+
+class FakeInput(object):
+    """ Input object reading the given variables """
+
+    def __init__(self, variables):
+        self.variables = variables
+
+    def get_variables(self):
+        return self.variables
+
+
+class ReadPlanTest(unittest.TestCase):
+
+    def test_shared_variable(self):
+        start = datetime(2020, 2, 20, 0)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            var_dict = {"filepattern": tmpdir + "/fc@YYYY@@MM@@DD@@HH@.nc", "fcint": 10800, "offset": 0,
+                        "file_inc": 3600}
+            var = surfex.variable.Variable(start, start, var_dict, False)
+            # The same variable is used by an attribute and by a forcing variable
+            shared = surfex.read.PlannedVariable(var)
+            options = {"start": start, "stop": datetime(2020, 2, 20, 4), "timestep": 3600}
+            plan = surfex.forcing.plan_reads(options, [FakeInput([shared])], [FakeInput([shared])])
+
+            self.assertEqual(sorted(plan), [tmpdir + "/fc2020022000.nc", tmpdir + "/fc2020022003.nc"])
+            reads = plan[tmpdir + "/fc2020022000.nc"] + plan[tmpdir + "/fc2020022003.nc"]
+            self.assertEqual([validtime.hour for v, validtime in reads], [0, 1, 2, 3, 4])
+            for v, validtime in reads:
+                self.assertIs(v, var)
+
+            open(tmpdir + "/fc2020022000.nc", "w").close()
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                missing = surfex.forcing.print_read_plan(plan)
+            self.assertEqual(missing, [tmpdir + "/fc2020022003.nc"])
+            self.assertIn("Files: 2 Fields to decode: 5", output.getvalue())
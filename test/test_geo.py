@@ -1,6 +1,10 @@
 import unittest
 import surfex
 import json
+import copy
+import os
+import tempfile
+import numpy as np
 
 
 class GeoTest(unittest.TestCase):
@@ -195,16 +199,19 @@ class GeoTest(unittest.TestCase):
                 "nrows": 1
             }
         }
-        my_geo = surfex.geo.IGN(domain, recreate=True)
+        cache_dir = tempfile.TemporaryDirectory()
+        my_geo = surfex.geo.IGN(domain, recreate=True, cache_dir=cache_dir.name)
         json_settings = {"nam_io_offline": {"csurf_filetype": "NC"}}
         my_settings = surfex.ascii2nml(json_settings)
         my_settings = my_geo.update_namelist(my_settings)
         self.assertEqual(domain["nam_pgd_grid"]["cgrid"], my_geo.cgrid)
         self.assertEqual(my_settings["nam_pgd_grid"]["cgrid"], my_geo.cgrid)
 
-        my_geo1 = surfex.geo.IGN(domain, recreate=False)
-        my_geo2 = surfex.geo.IGN(domain, recreate=True)
+        my_geo1 = surfex.geo.IGN(domain, recreate=False, cache_dir=cache_dir.name)
+        my_geo2 = surfex.geo.IGN(domain, recreate=True, cache_dir=cache_dir.name)
         self.assertTrue(my_geo1.is_identical(my_geo2))
+        self.assertEqual(len([f for f in os.listdir(cache_dir.name) if f.startswith(".surfex_ign_")]), 3)
+        cache_dir.cleanup()
 
         domain = {
             "nam_pgd_grid": {
@@ -235,6 +242,60 @@ class GeoTest(unittest.TestCase):
         with self.assertRaises(KeyError):
             surfex.geo.IGN(domain)
 
+    def test_ign_regular(self):
+        # Expected values are from the loops used before the coordinates and mask were vectorized
+        xx = [11000, 12000, 13000, 11000, 13000, 12000]
+        xy = [21000, 21000, 21000, 22000, 22000, 23000]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for recreate in [True, False]:
+                pxall = surfex.geo.IGN.get_coord(xx, [1000] * 6, "x", recreate, cache_dir=cache_dir)
+                pyall = surfex.geo.IGN.get_coord(xy, [1000] * 6, "y", recreate, cache_dir=cache_dir)
+                mask = surfex.geo.IGN.ign_mask(pxall, pyall, xx, xy, recreate, cache_dir=cache_dir)
+                self.assertEqual(pxall, [10000., 11000., 12000., 13000., 14000.])
+                self.assertEqual(pyall, [20000., 21000., 22000., 23000., 24000.])
+                self.assertEqual(mask, [6, 7, 11, 13, 16, 17])
+
+    def test_ign_irregular(self):
+        # Expected values are from the loops used before the coordinates and mask were vectorized.
+        # The 2000 m points cover the right neighbour of the 1000 m point at 12000, so none is added.
+        xx = [14000, 14000, 10000, 11000, 12000]
+        xy = [21000, 23000, 20000, 20000, 20000]
+        dxy = [2000, 2000, 1000, 1000, 1000]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            pxall = surfex.geo.IGN.get_coord(xx, dxy, "x", True, cache_dir=cache_dir)
+            pyall = surfex.geo.IGN.get_coord(xy, dxy, "y", True, cache_dir=cache_dir)
+            mask = surfex.geo.IGN.ign_mask(pxall, pyall, xx, xy, True, cache_dir=cache_dir)
+        self.assertEqual(pxall, [9000., 10000., 11000., 12000., 14000., 16000.])
+        self.assertEqual(pyall, [19000., 20000., 21000., 23000., 25000.])
+        self.assertEqual(mask, [6, 11, 16, 22, 23])
+
+    def test_geo_tiles(self):
+        domain = copy.deepcopy(self.domain_conf_proj)
+        domain["nam_conf_proj_grid"].update({"nimax": 7, "njmax": 5})
+        my_geo = surfex.geo.get_geo_object(domain)
+        tiles = my_geo.tiles(3, 2, halo=1)
+        self.assertEqual(len(tiles), 6)
+        values = []
+        for tile in tiles:
+            self.assertTrue((tile.geo.lonlist == my_geo.lonlist[tile.index]).all())
+            values.append(tile.index)
+        field = my_geo.assemble_tiles(tiles, values)
+        self.assertTrue((field == np.arange(my_geo.npoints)).all())
+
+        points = surfex.geo.Geo(5, 5, 5, np.arange(5.), np.arange(5.))
+        tiles = points.tiles(2)
+        field = points.assemble_tiles(tiles, [np.ones([2, tile.geo.npoints]) for tile in tiles])
+        self.assertEqual(field.shape, (2, 5))
+
+    def test_spatial_index(self):
+        my_geo = surfex.geo.Geo(3, 3, 3, np.array([10., 11., 12.]), np.array([60., 60., 61.]))
+        index, distances = my_geo.spatial_index().nearest([10.9, 12.], [60., 61.])
+        self.assertEqual(index.tolist(), [1, 2])
+        self.assertAlmostEqual(distances[1], 0.)
+        self.assertEqual(my_geo.spatial_index().radius([10.], [60.], 60000.)[0].tolist(), [0, 1])
+        self.assertEqual(my_geo.spatial_index().bounding_box([10.5, 12.5], [59., 60.5]).tolist(), [1])
+        self.assertEqual(my_geo.spatial_index().match([12., 13.], [61., 61.]).tolist(), [2, -1])
+
     def test_set_domain(self):
         domains = {"NAME": {"nam_pgd_grid": {"cgrid": "some_projection"}}}
         domain = surfex.geo.set_domain(domains, "NAME")
@@ -0,0 +1,53 @@
+import unittest
+import tempfile
+import numpy as np
+
+import surfex
+from test_variable import write_lambert_grib2
+
+
+class GribTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = self.tmpdir.name + "/fc.grib"
+        # Distinct values to see that the right grid points are picked. The grid has 10 x 8 points.
+        write_lambert_grib2(self.fname, 270. + np.arange(80.))
+        self.gribvar = surfex.grib.Grib2Variable(0, 0, 0, 103, 2)
+        self.geo = surfex.geo.Geo(5, 5, 1, np.array([10.1, 10.2, 10.25, 10.3, 10.12]),
+                                  np.array([60.01, 60.1, 60.12, 60.05, 60.08]))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_subarea_points(self):
+        full, interpolator = surfex.grib.Grib(self.fname).points(self.gribvar, self.geo)
+        subarea, subarea_interpolator = surfex.grib.Grib(self.fname).points(self.gribvar, self.geo, subarea=True)
+        np.testing.assert_array_equal(subarea, full)
+        np.testing.assert_array_equal(subarea_interpolator.index, interpolator.index)
+        # The points are not all in the same row or column
+        self.assertGreater(len(np.unique(interpolator.index[:, 0])), 1)
+        self.assertGreater(len(np.unique(interpolator.index[:, 1])), 1)
+
+    def test_nearest_index(self):
+        field, geo_in = surfex.grib.Grib(self.fname).field(self.gribvar, None)
+        self.assertEqual(field.shape, (10, 8))
+        interpolator = surfex.interpolation.NearestNeighbour(geo_in, self.geo)
+        expected = field[interpolator.index[:, 0], interpolator.index[:, 1]]
+        # The x index runs fastest in the message
+        np.testing.assert_array_equal(expected, 270. + interpolator.index[:, 0] + 10 * interpolator.index[:, 1])
+
+        np.testing.assert_array_equal(interpolator.interpolate(field), expected)
+        np.testing.assert_array_equal(field.flatten(order="F")[interpolator.flat_index()], expected)
+
+        window = interpolator.index_window()
+        imin, imax, jmin, jmax = window
+        self.assertEqual((imin, jmin), tuple(interpolator.index.min(axis=0)))
+        self.assertEqual((imax, jmax), tuple(interpolator.index.max(axis=0)))
+        cropped, geo_in = surfex.grib.Grib(self.fname).field(self.gribvar, None, window=window)
+        self.assertEqual(cropped.shape, (imax - imin + 1, jmax - jmin + 1))
+        np.testing.assert_array_equal(interpolator.interpolate(cropped, window=window), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import tempfile
+from datetime import datetime, timedelta
+import surfex
+import numpy as np
+import cfunits
+from netCDF4 import Dataset
+
+
+def write_netcdf(fname, var_name, values, basetime, units="K"):
+    """ Write hourly fields in (time, y, x) order on a small regular lon/lat grid """
+    nt, ny, nx = values.shape
+    nc = Dataset(fname, "w")
+    nc.createDimension("time", None)
+    nc.createDimension("y", ny)
+    nc.createDimension("x", nx)
+    lons, lats = np.meshgrid(10. + 0.1 * np.arange(nx), 60. + 0.1 * np.arange(ny))
+    nc.createVariable("longitude", "f8", ("y", "x"))[:] = lons
+    nc.createVariable("latitude", "f8", ("y", "x"))[:] = lats
+    time = nc.createVariable("time", "f8", ("time",))
+    time.units = "hours since " + basetime.strftime("%Y-%m-%d %H:%M:%S")
+    time[:] = np.arange(float(nt))
+    var = nc.createVariable(var_name, "f4", ("time", "y", "x"))
+    var.units = units
+    var[:] = values
+    nc.close()
+
+
+class UnitConverterTest(unittest.TestCase):
+
+    def check(self, from_units, to_units, values):
+        field = np.array(values, dtype=np.float32)
+        expected = cfunits.Units.conform(np.array(values, dtype=float), cfunits.Units(from_units),
+                                         cfunits.Units(to_units))
+        converted = surfex.netcdf.UnitConverter(from_units, to_units).convert(field)
+        # Floating point arrays are converted in place
+        self.assertIs(converted, field)
+        self.assertEqual(converted.dtype, np.float32)
+        np.testing.assert_allclose(converted, expected, rtol=1e-6, atol=1e-4)
+
+    def test_offset(self):
+        converter = surfex.netcdf.UnitConverter("K", "degC")
+        self.assertAlmostEqual(converter.scale, 1.)
+        self.assertAlmostEqual(converter.offset, -273.15)
+        self.check("K", "degC", [[250., 273.15], [290.5, 310.]])
+
+    def test_scale(self):
+        converter = surfex.netcdf.UnitConverter("kg m-2 s-1", "kg m-2 h-1")
+        self.assertAlmostEqual(converter.scale, 3600.)
+        self.assertEqual(converter.offset, 0.)
+        self.check("kg m-2 s-1", "kg m-2 h-1", [0., 1e-4, 2.5e-3])
+        self.check("cm", "m", [0., 12.5, 300.])
+
+    def test_identity_and_integers(self):
+        field = np.array([1., 2.], dtype=np.float32)
+        self.assertIs(surfex.netcdf.UnitConverter("m", "m").convert(field), field)
+        field = np.array([0, 3600])
+        converted = surfex.netcdf.UnitConverter("seconds since 1970-01-01 00:00:00",
+                                                "hours since 1970-01-01 00:00:00").convert(field)
+        np.testing.assert_allclose(converted, [0., 1.])
+        np.testing.assert_array_equal(field, [0, 3600])
+
+    def test_unit_converter(self):
+        converter = surfex.netcdf.unit_converter("K", "degC")
+        self.assertIs(surfex.netcdf.unit_converter("K", "degC"), converter)
+        self.assertIsNot(surfex.netcdf.unit_converter("degC", "K"), converter)
+        field = np.array([273.15], dtype=np.float32)
+        np.testing.assert_allclose(converter.convert(field), [0.], atol=1e-4)
+
+
+class NetcdfTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = self.tmpdir.name + "/fc.nc"
+        self.basetime = datetime(2020, 2, 20, 0)
+        # Value 270 + 100*t + x + 10*y to see that the right grid points and times are picked
+        t, y, x = np.meshgrid(np.arange(4.), np.arange(6.), np.arange(7.), indexing="ij")
+        write_netcdf(self.fname, "air_temperature_2m", 270. + 100. * t + x + 10. * y, self.basetime)
+        self.geo = surfex.geo.Geo(4, 4, 1, np.array([10.21, 10.29, 10.42, 10.31]),
+                                  np.array([60.09, 60.22, 60.18, 60.31]))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_hyperslab(self):
+        self.assertEqual(surfex.netcdf.Netcdf.hyperslab([2, 3, 4]), slice(2, 5, 1))
+        self.assertEqual(surfex.netcdf.Netcdf.hyperslab([1, 3]), [1, 3])
+        self.assertEqual(surfex.netcdf.Netcdf.hyperslab([2]), [2])
+
+    def test_window(self):
+        nc = surfex.netcdf.Netcdf(self.fname)
+        validtime = self.basetime + timedelta(hours=2)
+        full, geo_full = nc.field("air_temperature_2m", validtime=validtime)
+        self.assertEqual(full.shape, (7, 6))
+        self.assertEqual(full[3, 2], 270. + 200. + 3. + 20.)
+
+        window = (2, 4, 1, 3)
+        cropped, geo_window = nc.field("air_temperature_2m", validtime=validtime, window=window)
+        np.testing.assert_array_equal(cropped, full[2:5, 1:4])
+        np.testing.assert_array_equal(geo_window.lons, geo_full.lons[2:5, 1:4])
+        np.testing.assert_array_equal(geo_window.lats, geo_full.lats[2:5, 1:4])
+
+        interpolator = surfex.interpolation.NearestNeighbour(geo_full, self.geo)
+        window = interpolator.index_window()
+        self.assertNotEqual(window, (0, 6, 0, 5))
+        cropped, geo_window = nc.field("air_temperature_2m", validtime=validtime, window=window)
+        np.testing.assert_array_equal(interpolator.interpolate(cropped, window=window),
+                                      interpolator.interpolate(full))
+
+        points, interpolator = nc.points("air_temperature_2m", self.geo, validtime=validtime)
+        np.testing.assert_array_equal(points, [482., 493., 494., 503.])
+        subarea, subarea_interpolator = nc.points("air_temperature_2m", self.geo, validtime=validtime, subarea=True)
+        np.testing.assert_array_equal(subarea, points)
+
+    def test_points_block(self):
+        nc = surfex.netcdf.Netcdf(self.fname)
+        validtimes = [self.basetime + timedelta(hours=i) for i in range(1, 4)]
+        fields, interpolator = nc.points_block("air_temperature_2m", self.geo, validtimes)
+        subarea, subarea_interpolator = nc.points_block("air_temperature_2m", self.geo, validtimes, subarea=True)
+        np.testing.assert_array_equal(subarea, fields)
+        for i in range(0, len(validtimes)):
+            points, interpolator = nc.points("air_temperature_2m", self.geo, validtime=validtimes[i])
+            np.testing.assert_array_equal(fields[i, :], points)
+
+
+if __name__ == '__main__':
+    unittest.main()
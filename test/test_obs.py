@@ -0,0 +1,135 @@
+import unittest
+import surfex
+import numpy as np
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+from datetime import datetime
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+class FrostReplayHandler(BaseHTTPRequestHandler):
+    """
+    Replays the recorded frost responses in test/fixtures/frost.json
+    """
+
+    # Loaded by FrostTest.setUpClass
+    responses = {}
+    requests = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = url.path.lstrip("/")
+        parameters = parse_qs(url.query)
+        FrostReplayHandler.requests.append(endpoint)
+        data = self.responses[endpoint]
+        if "sources" in parameters:
+            sources = parameters["sources"][0].split(",")
+            data = [d for d in data if d["sourceId"].split(":")[0] in sources]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps({"data": data}).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class ObsTest(unittest.TestCase):
+
+    def setUp(self):
+        obstime = datetime(2020, 3, 30, 6)
+        self.observations = [surfex.Observation(obstime, 10., 60., 273., elev=100., stid="1"),
+                             surfex.Observation(obstime, 11., 61., 274.),
+                             surfex.Observation(obstime, 12., 62., 275., elev=300., stid="3")]
+
+    def test_observation_columns(self):
+        columns = surfex.ObservationColumns.from_observations(self.observations)
+        self.assertEqual(len(columns), 3)
+        self.assertTrue(np.shares_memory(columns[1:].values, columns.values))
+        self.assertEqual(columns[columns.values > 273.5].stids.tolist(), ["NA", "3"])
+        self.assertEqual(len(surfex.ObservationColumns.concatenate([columns, columns[0:1]])), 4)
+
+        obs_set = surfex.ObservationSet(columns, label="test")
+        obstimes, lons, lats, stids, elevs, values, varnames = obs_set.get_obs()
+        self.assertEqual(obstimes[0], self.observations[0].obstime)
+        self.assertEqual(obs_set.get_stid_index("3"), 2)
+        self.assertEqual(obs_set.get_pos_index(11., 61.), 1)
+        self.assertEqual(obs_set.observations[1].stid, "NA")
+
+    def test_netatmo(self):
+        t0 = int((datetime(2020, 3, 30, 6) - datetime(1970, 1, 1)).total_seconds())
+        records = [{"_id": "a", "location": [10., 60.], "data": {"Temperature": 1., "time_utc": t0 - 600}},
+                   {"_id": "b", "location": [11., 61.], "altitude": 20, "data": {"Temperature": 2., "time_utc": t0}},
+                   {"_id": "a", "location": [10., 60.], "altitude": 10, "data": {"Temperature": 3., "time_utc": t0}}]
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".json") as ifile:
+            ifile.write("[" + json.dumps(records[0]) + "][" + ",".join([json.dumps(r) for r in records[1:]]) + "]")
+            ifile.flush()
+            obs_set = surfex.NetatmoObservationSet([ifile.name], "Temperature", datetime(2020, 3, 30, 6), re=False)
+        obstimes, lons, lats, stids, elevs, values, varnames = obs_set.get_obs()
+        self.assertEqual(lons, [10., 11.])
+        self.assertEqual(elevs, [10., 20.])
+        self.assertEqual(values, [276.15, 275.15])
+
+    def test_observation_cache(self):
+        obs_set = surfex.ObservationSet(self.observations, label="test")
+        with tempfile.TemporaryDirectory() as cache_dir:
+            filename = cache_dir + "/obs.json"
+            obs_set.write_json_file(filename)
+            obs_set1 = surfex.JsonObservationSet(filename, cache_dir=cache_dir)
+            self.assertTrue(os.path.exists(surfex.ObservationCache(cache_dir).sidecar(filename, "json")))
+            obs_set2 = surfex.JsonObservationSet(filename, cache_dir=cache_dir)
+        self.assertEqual(obs_set1.get_obs()[3], obs_set2.get_obs()[3])
+        self.assertEqual(obs_set1.get_obs()[0], obs_set2.get_obs()[0])
+
+
+class FrostTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(os.path.dirname(__file__), "fixtures", "frost.json"), "r") as fh:
+            FrostReplayHandler.responses = json.load(fh)
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), FrostReplayHandler)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.base_url = "http://127.0.0.1:" + str(self.server.server_port)
+        FrostReplayHandler.requests = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @mock.patch.dict(os.environ, {"CLIENTID": "test"})
+    def test_frost(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            obs_set = surfex.MetFrostObservations("air_temperature", validtime=datetime(2020, 3, 30, 6),
+                                                  providers="MET.NO", base_url=self.base_url, cache_dir=cache_dir)
+            self.assertEqual(FrostReplayHandler.requests, ["sources/v0.jsonld", "observations/v0.jsonld"])
+            obs_set = surfex.MetFrostObservations("air_temperature", validtime=datetime(2020, 3, 30, 6),
+                                                  providers="MET.NO", base_url=self.base_url, cache_dir=cache_dir)
+            self.assertEqual(len(FrostReplayHandler.requests), 2)
+
+        obstimes, lons, lats, stids, elevs, values, varnames = obs_set.get_obs()
+        self.assertEqual(stids, ["18700", "18950"])
+        self.assertEqual(values, [1.5, -2.0])
+        self.assertEqual(elevs, [94., 514.])
+
+    @mock.patch.dict(os.environ, {"CLIENTID": "test"})
+    def test_frost_chunks(self):
+        # Two requests with two and one station. Each station must only be added once.
+        obs_set = surfex.MetFrostObservations("air_temperature", validtime=datetime(2020, 3, 30, 6),
+                                              base_url=self.base_url, max_workers=2, chunk_size=2)
+        self.assertEqual(FrostReplayHandler.requests.count("observations/v0.jsonld"), 2)
+        obstimes, lons, lats, stids, elevs, values, varnames = obs_set.get_obs()
+        self.assertEqual(stids, ["18700", "18950", "17150"])
+        self.assertEqual(values, [1.5, -2.0, 3.0])
+        self.assertEqual(lons, [10.72, 10.67, 10.81])
+
+
+if __name__ == '__main__':
+    unittest.main()
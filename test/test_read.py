@@ -0,0 +1,116 @@
+import unittest
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
+import numpy as np
+
+import surfex
+from test_netcdf import write_netcdf
+
+
+class CountingVariable(object):
+    """ Input variable counting the fields it reads """
+
+    def __init__(self, var_dict):
+        self.var_dict = var_dict
+        self.reads = []
+
+    def read_variable(self, geo, validtime, cache, geo_in=None):
+        self.reads.append(validtime)
+        return np.full(geo.npoints, float(self.var_dict["value"] + validtime.hour))
+
+
+class ReadPlanTest(unittest.TestCase):
+
+    @mock.patch.object(surfex.read.Converter, "new_variable",
+                       lambda converter, fileformat, merged_dict, debug: CountingVariable(merged_dict))
+    def test_shared_variable(self):
+        basetime = datetime(2020, 2, 20, 0)
+        geo = surfex.geo.Geo(2, 2, 1, np.array([10., 11.]), np.array([60., 60.]))
+        x_dict = {"name": "x_wind_10m", "value": 3.}
+        y_dict = {"name": "y_wind_10m", "value": 4.}
+
+        read_plan = surfex.read.ReadPlan()
+        # x_wind_10m is defined the same way in both converters
+        x_wind = surfex.read.Converter("none", basetime, {}, {"none": x_dict}, "netcdf", basetime,
+                                       read_plan=read_plan)
+        wind = surfex.read.Converter("windspeed", basetime, {}, {"windspeed": {"x": x_dict, "y": y_dict}},
+                                     "netcdf", basetime, read_plan=read_plan)
+
+        self.assertEqual(len(read_plan.variables), 2)
+        self.assertIs(x_wind.var, wind.x)
+        self.assertIsNot(wind.x, wind.y)
+
+        cache = surfex.cache.Cache(False, 0)
+        validtimes = [basetime + timedelta(hours=i) for i in range(0, 3)]
+        for validtime in validtimes:
+            field_x = x_wind.read_time_step(geo, validtime, cache)
+            field_wind = wind.read_time_step(geo, validtime, cache)
+            np.testing.assert_allclose(field_x, 3. + validtime.hour)
+            np.testing.assert_allclose(field_wind, np.sqrt((3. + validtime.hour) ** 2 + (4. + validtime.hour) ** 2))
+
+        # One read per time step for the shared variable
+        self.assertEqual(wind.x.var.reads, validtimes)
+        self.assertEqual(wind.y.var.reads, validtimes)
+
+
+class ReadTimeStepsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.basetime = datetime(2020, 2, 20, 0)
+        self.geo = surfex.geo.Geo(3, 3, 1, np.array([10.1, 10.2, 10.45]), np.array([60.01, 60.1, 60.32]))
+        lead, y, x = np.meshgrid(np.arange(7.), np.arange(6.), np.arange(7.), indexing="ij")
+        self.conf = {}
+        for name, values in [("x_wind_10m", 2. + lead - x), ("y_wind_10m", 1. + y * lead),
+                             ("precipitation_amount_acc", lead * (1. + x + 10. * y))]:
+            for hour in [0, 3]:
+                basetime = self.basetime + timedelta(hours=hour)
+                write_netcdf(basetime.strftime(self.tmpdir.name + "/" + name + "%Y%m%d%H.nc"), name,
+                             values + hour, basetime, units="m/s")
+            self.conf.update({name: {"name": name, "fcint": 10800, "offset": 0, "file_inc": 3600,
+                                     "filepattern": self.tmpdir.name + "/" + name + "@YYYY@@MM@@DD@@HH@.nc"}})
+        self.conf["precipitation_amount_acc"].update({"accumulated": True, "instant": 3600})
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def inputs(self, shared):
+        read_plan = None
+        if shared:
+            read_plan = surfex.read.ReadPlan()
+        wind = surfex.read.Converter("windspeed", self.basetime, {},
+                                     {"windspeed": {"x": self.conf["x_wind_10m"], "y": self.conf["y_wind_10m"]}},
+                                     "netcdf", self.basetime, read_plan=read_plan)
+        x_wind = surfex.read.Converter("none", self.basetime, {}, {"none": self.conf["x_wind_10m"]}, "netcdf",
+                                       self.basetime, read_plan=read_plan)
+        precipitation = surfex.read.Converter("none", self.basetime, {},
+                                              {"none": self.conf["precipitation_amount_acc"]}, "netcdf",
+                                              self.basetime, read_plan=read_plan)
+        return [surfex.read.ConvertedInput(self.geo, "WIND", wind),
+                surfex.read.ConvertedInput(self.geo, "UWIND", x_wind),
+                surfex.read.ConvertedInput(self.geo, "RAIN", precipitation),
+                surfex.read.ConstantValue(self.geo, "CO2", {"value": 0.00062})]
+
+    def test_read_time_steps(self):
+        validtimes = [self.basetime + timedelta(hours=i) for i in range(0, 7)]
+        for shared in [False, True]:
+            with self.subTest(shared=shared):
+                # Read one time step at a time for all inputs as in the time loop
+                cache = surfex.cache.Cache(False, 0)
+                objs = self.inputs(shared)
+                expected = np.empty([len(objs), len(validtimes), self.geo.npoints])
+                for i in range(0, len(validtimes)):
+                    for j in range(0, len(objs)):
+                        expected[j, i, :] = objs[j].read_time_step(validtimes[i], cache)
+                self.assertGreater(np.max(expected[2]), 0.)
+
+                cache = surfex.cache.Cache(False, 0)
+                objs = self.inputs(shared)
+                # The block is converted in double precision, the single time steps in the precision of the file
+                for j in range(0, len(objs)):
+                    np.testing.assert_allclose(objs[j].read_time_steps(validtimes, cache), expected[j], rtol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
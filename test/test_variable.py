@@ -1,8 +1,30 @@
 import unittest
 from datetime import datetime, timedelta
+import tempfile
+from unittest import mock
+import numpy as np
 import yaml
+import eccodes
 
+import surfex
 from surfex.variable import Variable
+from test_netcdf import write_netcdf
+
+
+def write_lambert_grib2(fname, values):
+    """ Write a 2 m temperature field on a small lambert grid """
+    gid = eccodes.codes_grib_new_from_samples("GRIB2")
+    eccodes.codes_set(gid, "gridDefinitionTemplateNumber", 30)
+    keys = {"Nx": 10, "Ny": 8, "LoV": 15000000, "LaD": 63000000, "Latin1": 63000000, "Latin2": 63000000,
+            "latitudeOfFirstGridPoint": 60000000, "longitudeOfFirstGridPoint": 10000000, "Dx": 2500000,
+            "Dy": 2500000, "discipline": 0, "parameterCategory": 0, "parameterNumber": 0,
+            "typeOfFirstFixedSurface": 103, "level": 2}
+    for key in keys:
+        eccodes.codes_set(gid, key, keys[key])
+    eccodes.codes_set_values(gid, values)
+    with open(fname, "wb") as fh:
+        eccodes.codes_write(gid, fh)
+    eccodes.codes_release(gid)
 
 
 class TestVariable(unittest.TestCase):
@@ -37,6 +59,148 @@ class TestVariable(unittest.TestCase):
             
                     self.assertEqual(variable.filename, var_dict['blueprint'][i])
 
+    # rotate_wind_to_geographic does not change the field yet. Shift it to see that it is applied.
+    @mock.patch.object(surfex.interpolation.Interpolation, "rotate_wind_to_geographic",
+                       lambda interpolator, field: field + 100.)
+    def test_grib_prefetch(self):
+        initialtime = datetime(2019, 11, 13, 0)
+        validtimes = [initialtime + timedelta(hours=i) for i in range(0, 5)]
+        geo = surfex.geo.Geo(3, 3, 1, np.array([10.1, 10.2, 10.25]), np.array([60.01, 60.1, 60.12]))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            var_dict = {"discipline": 0, "parameterCategory": 0, "parameterNumber": 0, "levelType": 103,
+                        "level": 2, "fcint": 10800, "offset": 0, "file_inc": 3600, "rotate_to_geographic": True,
+                        "filepattern": tmpdir + "/fc@YYYY@@MM@@DD@@HH@_@LLL@.grib"}
+            for validtime, basetime, filename, previoustime, previousfilename in \
+                    Variable(initialtime, initialtime, var_dict, False).file_reads(validtimes):
+                write_lambert_grib2(filename, 270. + (validtime - initialtime).total_seconds() / 3600. +
+                                    np.arange(80.))
+
+            serial = []
+            cache = surfex.cache.Cache(False, 0)
+            variable = surfex.variable.GribVariable(var_dict, initialtime, initialtime, False)
+            for validtime in validtimes:
+                serial.append(variable.read_variable(geo, validtime, cache))
+
+            prefetched = []
+            cache = surfex.cache.Cache(False, 0)
+            variable = surfex.variable.GribVariable(var_dict, initialtime, initialtime, False)
+            variable.prefetch(geo, validtimes, cache, max_workers=2)
+            self.assertEqual(len(cache.saved_fields), len(validtimes))
+            # The workers only get the indices of the interpolator, not the input grid
+            seeds = surfex.grib._worker_interpolators(cache)["nearest"]
+            for identifier_out in seeds:
+                for identifier_in in seeds[identifier_out]:
+                    seed = seeds[identifier_out][identifier_in]
+                    self.assertIsNone(seed.var_lons)
+                    self.assertIsNotNone(cache.interpolators["nearest"][identifier_out][identifier_in].var_lons)
+                    np.testing.assert_array_equal(seed.index,
+                                                  cache.interpolators["nearest"][identifier_out][identifier_in].index)
+            for validtime in validtimes:
+                prefetched.append(variable.read_variable(geo, validtime, cache))
+
+        np.testing.assert_allclose(prefetched, serial)
+        np.testing.assert_allclose(np.diff(serial, axis=0), 1.)
+        self.assertTrue(np.all(np.array(serial) > 370.))
+
+    @staticmethod
+    def read_netcdf(var_dict, validtimes, read_ahead=False, clean=False):
+        initialtime = validtimes[0]
+        var_dict = dict(var_dict, read_ahead=read_ahead)
+        geo = surfex.geo.Geo(3, 3, 1, np.array([10.1, 10.2, 10.45]), np.array([60.01, 60.1, 60.32]))
+        cache = surfex.cache.Cache(False, 0)
+        variable = surfex.variable.NetcdfVariable(var_dict, initialtime, initialtime, False)
+        variable.prefetch(geo, validtimes, cache)
+        fields = []
+        for validtime in validtimes:
+            # Drop the fields of the previous time steps from the cache
+            if clean:
+                cache.clean_fields(validtime)
+            fields.append(variable.read_variable(geo, validtime, cache))
+        return np.array(fields)
+
+    @staticmethod
+    def write_accumulated_netcdf(tmpdir, initialtime):
+        var_dict = {"name": "precipitation_amount_acc", "fcint": 10800, "offset": 0, "file_inc": 3600,
+                    "filepattern": tmpdir + "/fc@YYYY@@MM@@DD@@HH@.nc", "accumulated": True, "instant": 3600}
+        # Forecasts from 00 and 03 with seven hourly lead times and different rates
+        lead, y, x = np.meshgrid(np.arange(7.), np.arange(6.), np.arange(7.), indexing="ij")
+        for hour in [0, 3]:
+            basetime = initialtime + timedelta(hours=hour)
+            write_netcdf(basetime.strftime(tmpdir + "/fc%Y%m%d%H.nc"), "precipitation_amount_acc",
+                         lead * (1. + x + 10. * y + hour), basetime, units="kg/m^2")
+        return var_dict
+
+    def test_netcdf_read_ahead(self):
+        initialtime = datetime(2020, 2, 20, 0)
+        validtimes = [initialtime + timedelta(hours=i) for i in range(0, 7)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            var_dict = self.write_accumulated_netcdf(tmpdir, initialtime)
+            per_time = self.read_netcdf(var_dict, validtimes, False)
+            # With read ahead all fields must come from the block reads
+            with mock.patch.object(surfex.netcdf.Netcdf, "points", side_effect=AssertionError("Read per time")):
+                read_ahead = self.read_netcdf(var_dict, validtimes, True)
+
+        np.testing.assert_allclose(read_ahead, per_time)
+        # Hourly rates of the 00 forecast up to 03, then of the 03 forecast deaccumulated from its own 03 field
+        np.testing.assert_allclose(per_time[0, :], 0.)
+        rate = np.array([2., 13., 35.]) / 3600.
+        np.testing.assert_allclose(per_time[1:4, :], np.tile(rate, (3, 1)), rtol=1e-6)
+        np.testing.assert_allclose(per_time[4:, :], np.tile(rate + 3. / 3600., (3, 1)), rtol=1e-6)
+
+    def test_buffered_previous_field(self):
+        initialtime = datetime(2020, 2, 20, 0)
+        validtimes = [initialtime + timedelta(hours=i) for i in range(0, 7)]
+        points = surfex.netcdf.Netcdf.points
+        with tempfile.TemporaryDirectory() as tmpdir:
+            var_dict = self.write_accumulated_netcdf(tmpdir, initialtime)
+            # The previous field is taken from the buffer even if the cache does not keep it
+            with mock.patch.object(surfex.netcdf.Netcdf, "points", autospec=True, side_effect=points) as reads:
+                buffered = self.read_netcdf(var_dict, validtimes, clean=True)
+            # One read per time step and one for the first field of the next forecast
+            self.assertEqual(reads.call_count, len(validtimes) + 1)
+
+            with mock.patch.object(Variable, "buffered_field", return_value=None):
+                cached = self.read_netcdf(var_dict, validtimes)
+                with mock.patch.object(surfex.netcdf.Netcdf, "points", autospec=True, side_effect=points) as reads:
+                    unbuffered = self.read_netcdf(var_dict, validtimes, clean=True)
+                self.assertGreater(reads.call_count, len(validtimes))
+
+        np.testing.assert_array_equal(buffered, cached)
+        np.testing.assert_array_equal(buffered, unbuffered)
+
+    def test_deaccumulate(self):
+
+        def scalar_deaccumulate(field, previous_field, instant, warnings):
+            """ Deaccumulate with the loop used before it was vectorized """
+            field = np.subtract(field, previous_field)
+            if any(field[field < 0.]):
+                neg = []
+                for i in range(0, field.shape[0]):
+                    if field[i] < 0.:
+                        neg.append(field[i])
+                neg = np.asarray(neg)
+                warnings.append("Deaccumulated field has " + str(neg.shape[0]) + " negative lowest:"
+                                + str(np.nanmin(neg)) + " mean: " + str(np.nanmean(neg)))
+            field[field < 0.] = 0
+            if float(instant) != 0.:
+                field = np.divide(field, float(instant))
+            return field
+
+        previous_field = np.array([1., 5., 2.5, 7., 0.], dtype=np.float32)
+        cases = [np.array([3., 4., 2.5, 10., 0.], dtype=np.float32), np.array([3., 6., 2.5, 10., 1.]),
+                 np.array([3, 4, 2, 10, 0]), np.array([0., 1., 2., 3., 4.], dtype=np.float32)]
+        for field in cases:
+            for instant in [0., 3600.]:
+                with self.subTest(dtype=field.dtype, instant=instant):
+                    scalar_warnings = []
+                    expected = scalar_deaccumulate(field.copy(), previous_field, instant, scalar_warnings)
+                    warnings = []
+                    with mock.patch("surfex.variable.warning", side_effect=warnings.append):
+                        deaccumulated = Variable.deaccumulate(field.copy(), previous_field, instant)
+                    self.assertEqual(deaccumulated.dtype, expected.dtype)
+                    np.testing.assert_array_equal(deaccumulated, expected)
+                    self.assertEqual(warnings, scalar_warnings)
+
 
 if __name__ == "__main__":
     unittest.main()